@@ -1,4 +1,5 @@
 import os
+import sys
 import glob
 import logging
 import csv
@@ -9,6 +10,10 @@ import time
 from dotenv import load_dotenv
 from splitapiclient.main import get_client
 
+# Share the Admin API rate limiter of the admin tool
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_admin_api_tool'))
+import rate_limit_utils
+
 # Set up logging
 #logging.basicConfig(level=logging.DEBUG)
 logging.basicConfig(
@@ -25,6 +30,8 @@ APPROVER_KEY = os.environ.get("APPROVER_API_KEY")
 
 # Initialize the client connection
 client = get_client({'apikey': API_KEY})
+rate_limit_utils.install(client)
+limiter = rate_limit_utils.get_limiter()
 
 #workspace = "Split App"
 environment = "Production"
@@ -108,7 +115,7 @@ def submit_remove_segment_keys_change_request(workspace_id, environment_id, segm
         "comment": "Some CR Comment",
         "approvers": approvers
     }
-    response = requests.post(url, headers=headers, data=json.dumps(data))
+    response = limiter.send(lambda: requests.post(url, headers=headers, data=json.dumps(data)))
     response_data = response.json()
     print(response_data)
     open_change_request_id = response_data['id']
@@ -128,7 +135,7 @@ def submit_add_members_change_request(workspace_id, environment_id, segment_name
         "comment": "Some CR Comment",
         "approvers": approvers
     }
-    response = requests.post(url, headers=headers, json=data)
+    response = limiter.send(lambda: requests.post(url, headers=headers, json=data))
     response_data = response.json()
     print(response_data)
     open_change_request_id = response_data['id']
@@ -140,7 +147,7 @@ def get_change_request_status(change_request_id):
     headers = {
         'Authorization': f'Bearer {API_KEY}'
     }
-    response = requests.get(url, headers=headers)
+    response = limiter.send(lambda: requests.get(url, headers=headers))
     response_data = response.json()
     return response_data['status']
 
@@ -155,7 +162,7 @@ def approve_change_request(change_request_id):
         "status": "APPROVED",
         "comment": "withdrawing from Admin API"
     }
-    requests.put(url, headers=headers, data=json.dumps(data))
+    limiter.send(lambda: requests.put(url, headers=headers, data=json.dumps(data)))
 
 segments_sync()
 
@@ -1,20 +1,114 @@
+import sys
 import argparse
+import batch_utils
 import cache_utils
+import cache_store
+import columnar_utils
 import menu_utils
 import data_utils
+import export_utils
+import fetch_utils
+import index_utils
+import rate_limit_utils
+import stream_utils
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Admin Tool")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    parser.add_argument("--workers", type=int, help="Number of concurrent API requests when fetching data")
+    parser.add_argument("--rate-limit", type=float,
+                        help="Maximum Admin API requests per second (by default it adapts to the API's throttling)")
+    parser.add_argument("--backend", choices=["sync", "async"], default="sync",
+                        help="Fetch data with the splitapiclient client (sync) or the asyncio backend (async, requires aiohttp)")
+    parser.add_argument("--prefetch-segment-keys", action="store_true", help="Fetch the keys of every segment when loading the cache")
+    parser.add_argument("--export-format", choices=export_utils.EXPORT_FORMATS, default="json",
+                        help="Export data as one JSON document per file (json) or as JSON Lines, one entry per line (jsonl)")
+    parser.add_argument("--json-encoder", choices=stream_utils.ENCODERS,
+                        help="Encode exported JSON with the standard library (json, the default) or orjson (faster, requires orjson)")
+    parser.add_argument("--compression", choices=stream_utils.COMPRESSIONS, default="none",
+                        help="Compress the exported files with gzip or zstd (requires zstandard)")
+    parser.add_argument("--compression-level", type=int, help="Compression level (1-9 for gzip, 1-22 for zstd)")
+    parser.add_argument("--table-format", choices=columnar_utils.TABLE_FORMATS, default="parquet",
+                        help="Export tables as Parquet or Arrow IPC files (requires pyarrow)")
+    parser.add_argument("--export-all", nargs="?", const="", metavar="DIRECTORY",
+                        help="Export every dataset to DIRECTORY (a timestamped directory by default) without the menu")
+    parser.add_argument("--export-segments-keys", nargs="?", const="", metavar="DIRECTORY",
+                        help="Export the keys of every segment to DIRECTORY (segment_keys by default), one CSV file per segment, without the menu")
+    parser.add_argument("--export-targeted-keys", nargs="?", const="", metavar="FILE",
+                        help="Export the keys individually targeted by every feature flag to FILE (targeted_keys.csv by default) without the menu")
+    parser.add_argument("--delta", nargs="?", const="latest", metavar="BASE",
+                        help="With --export-all, only export the changes since the export in BASE (the latest export by default)")
+    parser.add_argument("--assemble", metavar="DIRECTORY", help="Rebuild the full data of a delta export, without the menu")
+    parser.add_argument("--batch", nargs="?", const="-", metavar="FILE",
+                        help="Answer the queries of FILE (or stdin) without the menu, one JSON result per line on stdout")
     args = parser.parse_args()
 
     if args.debug:
         import logging
         logging.basicConfig(level=logging.DEBUG)
 
+    batch_utils.configure_logging(args.debug)
     cache_utils.configure_logging(args.debug)
+    cache_store.configure_logging(args.debug)
+    columnar_utils.configure_logging(args.debug)
     menu_utils.configure_logging(args.debug)
     data_utils.configure_logging(args.debug)
+    export_utils.configure_logging(args.debug)
+    fetch_utils.configure_logging(args.debug)
+    index_utils.configure_logging(args.debug)
+    rate_limit_utils.configure_logging(args.debug)
+    stream_utils.configure_logging(args.debug)
 
-    cache_utils.load_cache(data_utils.get_all_splits_definitions, data_utils.get_all_segments_definitions)
+    if args.workers:
+        fetch_utils.set_max_workers(args.workers)
+    if args.rate_limit:
+        rate_limit_utils.set_rate_limit(args.rate_limit)
+    export_utils.set_export_format(args.export_format)
+    columnar_utils.set_table_format(args.table_format)
+    if args.json_encoder:
+        stream_utils.set_encoder(args.json_encoder)
+    stream_utils.set_compression(args.compression, args.compression_level)
+
+    if args.backend == "async":
+        import async_backend
+        async_backend.configure_logging(args.debug)
+        if args.workers:
+            async_backend.set_concurrency(args.workers)
+        menu_utils.cache_loaders = (async_backend.get_all_splits_definitions, async_backend.get_all_segments_definitions)
+
+    # In batch mode stdout only gets the results, the messages go to stderr
+    output = sys.stdout
+    if args.batch:
+        sys.stdout = sys.stderr
+
+    if args.assemble:
+        export_utils.assemble_export(args.assemble)
+        sys.exit()
+
+    cache_utils.load_cache(*menu_utils.cache_loaders)
+    if args.prefetch_segment_keys:
+        if args.backend == "async":
+            async_backend.load_org_data(include_segment_keys=True)
+        else:
+            data_utils.prefetch_segments_keys(data_utils.get_all_segments_definitions())
+    index_utils.build_indexes()
+    if args.export_all is not None:
+        since = export_utils.latest_export() if args.delta == "latest" else args.delta
+        if args.delta and since is None:
+            print("No previous export found, exporting all data.")
+        export_utils.export_all(args.export_all or None, since=since)
+        cache_utils.quit_tool()
+    if args.export_segments_keys is not None:
+        export_utils.export_all_segments_keys(args.export_segments_keys or None)
+        cache_utils.quit_tool()
+    if args.export_targeted_keys is not None:
+        export_utils.export_targeted_keys(args.export_targeted_keys or None)
+        cache_utils.quit_tool()
+    if args.batch:
+        if args.batch == "-":
+            batch_utils.run_batch(sys.stdin, output)
+        else:
+            with open(args.batch, encoding="utf-8") as f:
+                batch_utils.run_batch(f, output)
+        cache_utils.quit_tool()
     menu_utils.main_menu()
\ No newline at end of file
@@ -0,0 +1,290 @@
+import json
+import time
+import asyncio
+import logging
+import cache
+import cache_utils
+import data_utils
+import rate_limit_utils
+from key_set import KeySet
+from tqdm import tqdm
+from splitapiclient.resources import Workspace, Environment, Split, SplitDefinition, Segment, SegmentDefinition, User, Group
+from splitapiclient.util.exceptions import HTTPResponseError, HTTPNotFoundError, HTTPUnauthorizedError, \
+    HTTPIncorrectParametersError
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+def configure_logging(debug=False):
+    if debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.WARNING)
+
+DEFAULT_BASE_URL = "https://api.split.io/internal/api/v2"
+DEFAULT_CONCURRENCY = 64
+_concurrency = None
+
+def set_concurrency(concurrency):
+    """
+    Override the number of concurrent requests (and pooled connections) used by the asyncio backend.
+    """
+    global _concurrency
+    _concurrency = max(1, int(concurrency))
+
+def get_concurrency():
+    return _concurrency or DEFAULT_CONCURRENCY
+
+class AdminApi:
+    """
+    A small asyncio client for the Admin API read endpoints, sharing one pooled aiohttp session.
+    Every request goes through the shared rate limiter, and errors are raised with the same exception types
+    as the splitapiclient client.
+    """
+
+    def __init__(self, session, base_url, api_key, limiter=None):
+        self._session = session
+        self._base_url = base_url.rstrip("/")
+        self._headers = {"Authorization": f"Bearer {api_key}"}
+        self._limiter = limiter or rate_limit_utils.get_limiter()
+        self.requests = 0
+        self.throttled = 0
+
+    async def get(self, path):
+        url = f"{self._base_url}/{path}"
+        attempt = 0
+        while True:
+            await self._limiter.acquire_async()
+            try:
+                async with self._session.get(url, headers=self._headers) as response:
+                    self.requests += 1
+                    text = await response.text()
+            except Exception:
+                self._limiter.release()
+                raise
+            delay = self._limiter.release(response.status, response.headers.get("Retry-After"), attempt)
+            if delay is not None:
+                self.throttled += 1
+            if delay is not None and attempt < self._limiter.max_retries:
+                logger.debug(f"RESPONSE CODE: 429, retrying {url} in {delay:.1f} seconds")
+                attempt += 1
+                continue
+            if response.status not in (200, 201, 204):
+                errors = {404: HTTPNotFoundError, 401: HTTPUnauthorizedError, 400: HTTPIncorrectParametersError}
+                raise errors.get(response.status, HTTPResponseError)(f"HTTP {response.status}: {text}", response)
+            logger.debug(f"GET {url}")
+            return json.loads(text)
+
+    async def get_all(self, path, limit, items_key="objects", total_key="totalCount"):
+        """
+        Fetches every page of an offset-paginated endpoint. The first page gives the total count,
+        then the remaining pages are requested concurrently.
+        """
+        separator = "&" if "?" in path else "?"
+        first = await self.get(f"{path}{separator}limit={limit}&offset=0")
+        items = list(first[items_key])
+        limit = int(first["limit"])
+        pages = await asyncio.gather(*(
+            self.get(f"{path}{separator}limit={limit}&offset={offset}")
+            for offset in range(limit, int(first[total_key]), limit)
+        ))
+        for page in pages:
+            items.extend(page[items_key])
+        return items
+
+    async def get_users(self, status):
+        """
+        Fetches the users with a status. This endpoint uses a cursor, so its pages are sequential.
+        """
+        response = await self.get(f"users?limit=200&status={status}")
+        users = list(response["data"])
+        while response["nextMarker"] is not None:
+            response = await self.get(f"users?limit=200&after={response['nextMarker']}&status={status}")
+            users.extend(response["data"])
+        return users
+
+    async def get_segment_keys(self, segment_name, environment_id):
+        keys = await self.get_all(f"segments/{environment_id}/{segment_name}/keys", 100, items_key="keys", total_key="count")
+        return [item["key"] for item in keys]
+
+async def _crawl_topology(api):
+    ws_items = await api.get_all("workspaces", 20)
+    env_lists = await asyncio.gather(*(api.get(f"environments/ws/{ws['id']}") for ws in ws_items))
+    environments_by_workspace = {
+        ws["id"]: [Environment(item, ws["id"]) for item in envs]
+        for ws, envs in zip(ws_items, env_lists)
+    }
+    return data_utils.build_topology([Workspace(item) for item in ws_items], environments_by_workspace)
+
+async def _crawl(api, include_segment_keys):
+    """
+    Fetches every cache section that is still empty and fills it with the same structures as the
+    data_utils getters.
+    """
+    if cache.cache_data["topology"] is None or cache_utils.is_expired("topology"):
+        cache.cache_data["topology"] = await _crawl_topology(api)
+        cache_utils.mark_dirty("topology")
+        cache_utils.touch("topology")
+    workspaces = data_utils.get_workspaces()
+    if cache.cache_data["segments_definitions"] is None:
+        cache.cache_data["segments_definitions"] = {}
+    expired_splits_definitions = data_utils.environments_to_fetch(
+        "splits_definitions", lambda workspace_name: cache.cache_data["splits_definitions"]
+    )
+    expired_segments_definitions = data_utils.environments_to_fetch(
+        "segments_definitions", lambda workspace_name: cache.cache_data["segments_definitions"].get(workspace_name, {})
+    )
+    fetch_users = not cache.cache_data["users"] or cache_utils.is_expired("users")
+    fetch_splits = not cache.cache_data["splits"] or cache_utils.is_expired("splits")
+    fetch_segments = cache.cache_data["segments"] is None or cache_utils.is_expired("segments")
+
+    jobs = {}
+    if cache.cache_data["groups"] is None or cache_utils.is_expired("groups"):
+        jobs["groups"] = api.get_all("groups", 200)
+    if fetch_users:
+        for status in ["ACTIVE", "DEACTIVATED", "PENDING"]:
+            jobs[("users", status)] = api.get_users(status)
+    if fetch_splits:
+        for workspace_id in workspaces:
+            jobs[("splits", workspace_id)] = api.get_all(f"splits/ws/{workspace_id}", 20)
+    if fetch_segments:
+        for workspace_id in workspaces:
+            jobs[("segments", workspace_id)] = api.get_all(f"segments/ws/{workspace_id}", 50)
+    for env, workspace_id, workspace_name in expired_splits_definitions:
+        jobs[("split_definitions", env["id"])] = api.get_all(f"splits/ws/{workspace_id}/environments/{env['id']}", 20)
+    for env, workspace_id, workspace_name in expired_segments_definitions:
+        jobs[("segment_definitions", env["id"])] = api.get_all(f"segments/ws/{workspace_id}/environments/{env['id']}", 50)
+
+    results = {}
+    with tqdm(total=len(jobs), desc="Fetching org data", ncols=100) as pbar:
+        async def run(job, coroutine):
+            results[job] = await coroutine
+            pbar.update(1)
+        await asyncio.gather(*(run(job, coroutine) for job, coroutine in jobs.items()))
+
+    if "groups" in results:
+        cache.cache_data["groups"] = {group._id: group._name for group in map(Group, results["groups"])}
+        cache_utils.mark_dirty("groups")
+        cache_utils.touch("groups")
+    if fetch_users:
+        groups_dict = data_utils.get_groups()
+        users = {}
+        for status in ["ACTIVE", "DEACTIVATED", "PENDING"]:
+            for user in map(User, results[("users", status)]):
+                users[user._name] = data_utils.user_to_dict(user, groups_dict)
+        cache.cache_data["users"] = users
+        cache_utils.mark_dirty("users")
+        cache_utils.touch("users")
+    if fetch_splits:
+        user_id_to_data = {user_data["ID"]: user_data for user_data in data_utils.get_all_users().values()}
+        splits = {}
+        for workspace_id, workspace_name in workspaces.items():
+            for item in results[("splits", workspace_id)]:
+                split = Split(item, workspace_id)
+                splits.setdefault(split.name, []).append(
+                    data_utils.split_to_dict(split, workspace_id, workspace_name, user_id_to_data)
+                )
+        cache.cache_data["splits"] = splits
+        cache_utils.mark_dirty("splits")
+        cache_utils.touch("splits")
+    if fetch_segments:
+        cache.cache_data["segments"] = {
+            workspace_name: {
+                segment.name: data_utils.segment_to_dict(segment)
+                for segment in map(Segment, results[("segments", workspace_id)])
+            }
+            for workspace_id, workspace_name in workspaces.items()
+        }
+        cache_utils.mark_dirty("segments")
+        cache_utils.touch("segments")
+    for env, workspace_id, workspace_name in expired_splits_definitions:
+        cache_key = f"{workspace_name}:{env['id']}"
+        cache.cache_data["splits_definitions"][cache_key] = {
+            f"{item['name']}.{env['id']}.{workspace_id}": data_utils.split_definition_to_dict(
+                SplitDefinition(item, env["id"], workspace_id), workspace_name
+            )
+            for item in results[("split_definitions", env["id"])]
+        }
+        cache_utils.touch("splits_definitions", cache_key)
+    for env, workspace_id, workspace_name in expired_segments_definitions:
+        cache_key = f"{workspace_name}:{env['id']}"
+        cache.cache_data["segments_definitions"].setdefault(workspace_name, {})[cache_key] = {
+            f"{item['name']}.{env['id']}.{workspace_id}": data_utils.segment_definition_to_dict(
+                SegmentDefinition(item), env["id"], workspace_id, env["name"], workspace_name
+            )
+            for item in results[("segment_definitions", env["id"])]
+        }
+        cache_utils.touch("segments_definitions", cache_key)
+    cache_utils.mark_dirty("splits_definitions", "segments_definitions")
+
+    # Nothing is left to fetch, this (re)builds the maps of all the definitions
+    if expired_splits_definitions:
+        cache.cache_data["all_splits_definitions"] = None
+    if expired_segments_definitions:
+        cache.cache_data["all_segments_definitions"] = None
+    data_utils.get_all_splits_definitions()
+    data_utils.get_all_segments_definitions()
+
+    if include_segment_keys:
+        missing = [
+            (segment_key, definition)
+            for segment_key, definition in cache.cache_data["all_segments_definitions"].items()
+            if segment_key not in cache.cache_data["segment_keys"] or cache_utils.is_segment_keys_expired(segment_key)
+        ]
+        with tqdm(total=len(missing), desc="Fetching segment keys", ncols=100) as pbar:
+            async def fetch_keys(segment_key, definition):
+                keys = await api.get_segment_keys(definition["name"], definition["environment"]["id"])
+                cache.cache_data["segment_keys"][segment_key] = KeySet(keys)
+                pbar.update(1)
+            await asyncio.gather(*(fetch_keys(segment_key, definition) for segment_key, definition in missing))
+
+async def _load(base_url, api_key, include_segment_keys):
+    concurrency = get_concurrency()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        api = AdminApi(session, base_url, api_key)
+        start = time.monotonic()
+        await _crawl(api, include_segment_keys)
+        elapsed = time.monotonic() - start
+    print(f"Fetched org data with {api.requests} requests in {elapsed:.1f}s "
+          f"({api.requests / elapsed if elapsed else 0:.0f} requests/s, {concurrency} connections, "
+          f"{api.throttled} throttled)")
+
+def load_org_data(include_segment_keys=False):
+    """
+    Fetches every empty cache section (topology, groups, users, feature flags, segments, and feature flag and
+    segment definitions) in one asyncio crawl over a pooled connection set, then saves the cache.
+
+    Args:
+        include_segment_keys (bool): Also fetch the keys of every segment that are not cached yet.
+    """
+    if aiohttp is None:
+        raise ImportError("The asyncio backend requires aiohttp, install it with: pip install aiohttp")
+    base_url = data_utils.BASE_URL or DEFAULT_BASE_URL
+    asyncio.run(_load(base_url, data_utils.API_KEY, include_segment_keys))
+    cache_utils.save_cache()
+
+def get_all_splits_definitions():
+    """
+    Same as data_utils.get_all_splits_definitions(), fetching through the asyncio backend on a cache miss.
+    """
+    if not cache.cache_data["all_splits_definitions"] or data_utils.environments_to_fetch(
+        "splits_definitions", lambda workspace_name: cache.cache_data["splits_definitions"]
+    ):
+        load_org_data()
+    return data_utils.get_all_splits_definitions()
+
+def get_all_segments_definitions():
+    """
+    Same as data_utils.get_all_segments_definitions(), fetching through the asyncio backend on a cache miss.
+    """
+    if cache.cache_data["segments_definitions"] is None or not cache.cache_data["all_segments_definitions"] \
+            or data_utils.environments_to_fetch(
+                "segments_definitions", lambda workspace_name: cache.cache_data["segments_definitions"].get(workspace_name, {})
+            ):
+        load_org_data()
+    return data_utils.get_all_segments_definitions()
@@ -0,0 +1,164 @@
+import sys
+import json
+import time
+import logging
+import contextlib
+import data_utils
+import index_utils
+
+logger = logging.getLogger(__name__)
+
+def configure_logging(debug=False):
+    if debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.WARNING)
+
+def query_feature_flag(name):
+    splits = data_utils.get_splits().get(name)
+    definitions = index_utils.splits_definitions_by_name().get(name, [])
+    return {"feature_flags": splits, "definitions": definitions} if splits or definitions else None
+
+def query_segment(name):
+    segments = [
+        dict(segment_data, workspace=workspace_name)
+        for workspace_name, workspace_segments in data_utils.get_segments().items()
+        for segment_name, segment_data in workspace_segments.items()
+        if segment_name == name
+    ]
+    definitions = index_utils.segments_definitions_by_name().get(name, [])
+    return {"segments": segments, "definitions": definitions} if segments or definitions else None
+
+def query_user(email):
+    return index_utils.find_user(email)
+
+def query_environment(name):
+    return index_utils.find_environments(name) or None
+
+def query_workspace(name):
+    return index_utils.find_workspace(name)
+
+def query_group(name):
+    group = index_utils.find_group(name)
+    return dict(group, users=index_utils.group_users(group["id"])) if group else None
+
+_key_index = None
+
+def query_key(key):
+    # The key index is brought up to date once per batch, not once per key
+    global _key_index
+    if _key_index is None:
+        _key_index = index_utils.update_key_index()
+    memberships = [
+        {"type": entity_type, "name": name, "workspace": workspace_name, "environment": environment_name, "treatment": treatment}
+        for entity_type, name, workspace_name, environment_name, treatment in sorted(_key_index.lookup(key), key=str)
+    ]
+    return memberships or None
+
+def query_references(name):
+    references = [
+        {"type": entity_type, "workspace": workspace_name, "environment": environment_name, "feature_flag": flag_name, "reference": how}
+        for entity_type in ["segment", "feature flag"]
+        for workspace_name, environment_name, flag_name, how in sorted(index_utils.references(entity_type, name), key=str)
+    ]
+    return references or None
+
+def query_rules(text):
+    rules = [
+        {"match": kind, "workspace": workspace_name, "environment": environment_name, "feature_flag": flag_name,
+         "rule": rule_number, "matcher": matcher_type, "attribute": attribute, "values": list(values)}
+        for kind, workspace_name, environment_name, flag_name, rule_number, matcher_type, attribute, values in index_utils.rule_matches(text)
+    ]
+    return rules or None
+
+def query_search(text):
+    return [
+        {"type": item["type"], "name": item["name"], "workspace": item["workspace"], "score": round(score, 3)}
+        for item, score in index_utils.fuzzy_search(text)
+    ] or None
+
+# Query type -> function answering it, None when nothing is found
+QUERIES = {
+    "flag": query_feature_flag,
+    "segment": query_segment,
+    "user": query_user,
+    "environment": query_environment,
+    "workspace": query_workspace,
+    "group": query_group,
+    "key": query_key,
+    "references": query_references,
+    "rules": query_rules,
+    "search": query_search,
+}
+ALIASES = {"feature_flag": "flag", "split": "flag", "email": "user", "env": "environment"}
+
+def parse_query(line):
+    """
+    Parses a query line, either a JSON object such as {"type": "flag", "query": "checkout"}, or the type
+    and the query separated by whitespace such as "flag checkout".
+
+    Raises ValueError if the line is invalid JSON, or if its type or query is not a string.
+
+    Returns:
+        tuple: (type, query).
+    """
+    if line.startswith("{"):
+        data = json.loads(line)
+        query_type, query = data.get("type"), data.get("query")
+        for field, value in (("type", query_type), ("query", query)):
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f'"{field}" must be a string, not {type(value).__name__}')
+    else:
+        query_type, _, query = line.partition(" ")
+        if "\t" in query_type:
+            query_type, _, rest = query_type.partition("\t")
+            query = f"{rest} {query}" if query else rest
+    query_type = (query_type or "").strip().lower()
+    query_type = ALIASES.get(query_type, query_type)
+    return query_type, (query or "").strip()
+
+def run_query(line):
+    """
+    Answers one query line.
+
+    Returns:
+        dict: The "type" and "query", whether it was "found", and the "result" (or the "error").
+    """
+    try:
+        query_type, query = parse_query(line)
+    except ValueError as e:
+        return {"query": line, "error": f"Invalid query: {e}"}
+    if query_type not in QUERIES:
+        return {"type": query_type, "query": query, "error": f"Unknown query type, expected one of: {', '.join(QUERIES)}"}
+    try:
+        result = QUERIES[query_type](query)
+    except Exception as e:
+        logger.debug(f"Query {line} failed", exc_info=True)
+        return {"type": query_type, "query": query, "error": str(e)}
+    return {"type": query_type, "query": query, "found": result is not None, "result": result}
+
+def run_batch(input_file, output_file):
+    """
+    Answers the queries of a file, one per line (see parse_query), and writes one JSON result per line.
+    Blank lines and lines starting with # are skipped. Anything else the tool prints (progress, messages)
+    goes to stderr, so the output is only JSON Lines.
+
+    Args:
+        input_file: A text file open for reading, e.g. sys.stdin.
+        output_file: A text file open for writing, e.g. sys.stdout.
+
+    Returns:
+        int: The number of queries answered.
+    """
+    count = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        for line in input_file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            output_file.write(json.dumps(run_query(line), default=str) + "\n")
+            output_file.flush()
+            count += 1
+    logger.debug(f"Answered {count} queries in {time.perf_counter() - started:.2f}s")
+    return count
@@ -1,30 +1,48 @@
 cache_data = {
-    "workspaces": None,
-    "workspace_data": None,
-    "environments": None,
-    "environments_data": None,
+    "topology": None,
     "groups": None,
     "segments": None,
     "segments_definitions" : None,
     "all_segments_definitions" : None,
+    "segment_keys": {},
     "splits": None,
     "splits_definitions": {},
     "all_splits_definitions": None,
     "users": None,
+    "fetched_at": {},
 }
 
 def default_cache_data():
     return {
-        "workspaces": None,
-        "workspace_data": None,
-        "environments": None,
-        "environments_data": None,
+        "topology": None,
         "groups": None,
         "segments": None,
         "segments_definitions" : None,
         "all_segments_definitions" : None,
+        "segment_keys": {},
         "splits": None,
         "splits_definitions": {},
         "all_splits_definitions": None,
         "users": None,
-    }
\ No newline at end of file
+        "fetched_at": {},
+    }
+
+# Seconds after which each type of cached data is fetched again, None to keep it until the cache is updated.
+# The definitions are timed per environment and the segment keys per segment.
+# Each can be overridden with a CACHE_TTL_<TYPE> environment variable, e.g. CACHE_TTL_USERS=3600 (0 for no expiry).
+cache_ttl = {
+    "topology": 7 * 24 * 3600,
+    "groups": 24 * 3600,
+    "users": 4 * 3600,
+    "splits": 24 * 3600,
+    "segments": 24 * 3600,
+    "splits_definitions": 24 * 3600,
+    "segments_definitions": 24 * 3600,
+    "segment_keys": 24 * 3600,
+}
+
+# Maximum number of segment keys kept in memory and in the cache database. Beyond that, the keys of the
+# least recently used segments are dropped, and fetched again when needed.
+# Each can be overridden with a CACHE_<LIMIT> environment variable, e.g. CACHE_SEGMENT_KEYS_DISK_LIMIT=100000000 (0 for no limit).
+segment_keys_memory_limit = 1_000_000
+segment_keys_disk_limit = 10_000_000
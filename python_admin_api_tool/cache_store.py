@@ -0,0 +1,581 @@
+import time
+import queue
+import pickle
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from key_set import KeySet
+
+logger = logging.getLogger(__name__)
+
+def configure_logging(debug=False):
+    if debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.WARNING)
+
+# Bumped when the tables change, the cache is then rebuilt
+SCHEMA_VERSION = 2
+
+# Table name -> indexed columns stored next to the key and the pickled row.
+TABLES = {
+    "sections": (),
+    "fetched_at": ("fetched_at",),
+    "workspaces": ("position", "name"),
+    "environments": ("workspace_id", "position", "name"),
+    "groups": ("name",),
+    "users": ("id", "email", "status"),
+    "splits": ("name", "workspace_id"),
+    "split_definition_sets": (),
+    "split_definitions": ("section", "name", "environment_id", "workspace_id", "last_update_time"),
+    "segments": ("workspace_name", "name"),
+    "segment_definition_sets": ("workspace_name",),
+    "segment_definitions": ("section", "workspace_name", "name", "environment_id", "workspace_id"),
+    "segment_keys": ("count", "fetched_at", "used_at"),
+}
+
+INDEXES = {
+    "workspaces": ("name",),
+    "environments": ("workspace_id", "name"),
+    "groups": ("name",),
+    "users": ("id", "email"),
+    "splits": ("name",),
+    "split_definitions": ("section", "name"),
+    "segments": ("name",),
+    "segment_definitions": ("section", "name"),
+    "segment_keys": ("used_at",),
+}
+
+def _topology_rows(topology):
+    workspaces = {
+        ws_id: ((position, ws["name"]), ws)
+        for position, (ws_id, ws) in enumerate(topology["workspaces"].items())
+    }
+    environments = {}
+    for ws_id, env_ids in topology["workspace_environments"].items():
+        for position, env_id in enumerate(env_ids):
+            env = topology["environments"][env_id]
+            environments[env_id] = ((ws_id, position, env["name"]), env)
+    return {"workspaces": workspaces, "environments": environments}
+
+def _build_topology(rows):
+    workspaces = {ws_id: ws for ws_id, _, ws in sorted(rows["workspaces"], key=lambda row: row[1][0])}
+    environments = {}
+    workspace_environments = {ws_id: [] for ws_id in workspaces}
+    for env_id, (ws_id, _, _), env in sorted(rows["environments"], key=lambda row: row[1][1]):
+        environments[env_id] = env
+        workspace_environments.setdefault(ws_id, []).append(env_id)
+    return {"workspaces": workspaces, "environments": environments, "workspace_environments": workspace_environments}
+
+def _split_rows(splits):
+    return {"splits": {
+        f"{name}.{split['workspace_id']}": ((name, split["workspace_id"]), split)
+        for name, split_list in splits.items()
+        for split in split_list
+    }}
+
+def _build_splits(rows):
+    splits = {}
+    for _, (name, _), split in rows["splits"]:
+        splits.setdefault(name, []).append(split)
+    return splits
+
+def _split_definition_rows(splits_definitions):
+    sets = {}
+    definitions = {}
+    for section, env_definitions in splits_definitions.items():
+        sets[section] = ((), env_definitions)
+        for split_key, definition in env_definitions.items():
+            _, environment_id, workspace_id = split_key.rsplit(".", 2)
+            definitions[split_key] = (
+                (section, definition["name"], environment_id, workspace_id, definition.get("lastUpdateTime")),
+                definition,
+            )
+    return {"split_definition_sets": sets, "split_definitions": definitions}
+
+def _build_split_definitions(rows):
+    splits_definitions = {section: {} for section, _, _ in rows["split_definition_sets"]}
+    for split_key, (section, *_), definition in rows["split_definitions"]:
+        splits_definitions.setdefault(section, {})[split_key] = definition
+    return splits_definitions
+
+def _segment_rows(segments):
+    return {"segments": {
+        f"{workspace_name}:{name}": ((workspace_name, name), segment)
+        for workspace_name, workspace_segments in segments.items()
+        for name, segment in workspace_segments.items()
+    }}
+
+def _build_segments(rows):
+    segments = {}
+    for _, (workspace_name, name), segment in rows["segments"]:
+        segments.setdefault(workspace_name, {})[name] = segment
+    return segments
+
+def _segment_definition_rows(segments_definitions):
+    sets = {}
+    definitions = {}
+    for workspace_name, sections in segments_definitions.items():
+        for section, env_definitions in sections.items():
+            sets[section] = ((workspace_name,), env_definitions)
+            for segment_key, definition in env_definitions.items():
+                _, environment_id, workspace_id = segment_key.rsplit(".", 2)
+                definitions[segment_key] = (
+                    (section, workspace_name, definition["name"], environment_id, workspace_id),
+                    definition,
+                )
+    return {"segment_definition_sets": sets, "segment_definitions": definitions}
+
+def _build_segment_definitions(rows):
+    segments_definitions = {}
+    for section, (workspace_name,), _ in rows["segment_definition_sets"]:
+        segments_definitions.setdefault(workspace_name, {})[section] = {}
+    for segment_key, (section, workspace_name, *_), definition in rows["segment_definitions"]:
+        segments_definitions.setdefault(workspace_name, {}).setdefault(section, {})[segment_key] = definition
+    return segments_definitions
+
+_EMPTY = {
+    "topology": {"workspaces": {}, "environments": {}, "workspace_environments": {}},
+    "groups": {},
+    "users": {},
+    "splits": {},
+    "splits_definitions": {},
+    "segments": {},
+    "segments_definitions": {},
+    "fetched_at": {},
+}
+
+# Cache section -> (function splitting it into table rows, function building it back from the rows).
+# Rows are {key: (indexed columns, object)}, the object being pickled into the row unless the table
+# has no data (the *_sets tables only record which environments were fetched, even if empty).
+SECTIONS = {
+    "topology": (_topology_rows, _build_topology),
+    "groups": (
+        lambda groups: {"groups": {group_id: ((name,), name) for group_id, name in groups.items()}},
+        lambda rows: {group_id: name for group_id, _, name in rows["groups"]},
+    ),
+    "users": (
+        lambda users: {"users": {
+            name: ((user.get("ID"), user.get("Email"), user.get("Status")), user) for name, user in users.items()
+        }},
+        lambda rows: {name: user for name, _, user in rows["users"]},
+    ),
+    "splits": (_split_rows, _build_splits),
+    "splits_definitions": (_split_definition_rows, _build_split_definitions),
+    "segments": (_segment_rows, _build_segments),
+    "segments_definitions": (_segment_definition_rows, _build_segment_definitions),
+    "fetched_at": (
+        lambda times: {"fetched_at": {key: ((fetched_at,), fetched_at) for key, fetched_at in times.items()}},
+        lambda rows: {key: fetched_at for key, (fetched_at,), _ in rows["fetched_at"]},
+    ),
+}
+
+NO_DATA_TABLES = {"sections", "fetched_at", "split_definition_sets", "segment_definition_sets"}
+
+# Stands for a row whose deletion failed to be written, so it's deleted again by the next save
+_UNSAVED = object()
+
+class SegmentKeys(MutableMapping):
+    """
+    The segment_keys cache section backed by the store: the keys of a segment are read from the database
+    the first time they are used, and only the segments set or deleted since the last save are written.
+    The keys of each segment are held as a compact KeySet.
+
+    At most memory_limit keys are kept in memory. Beyond that, the least recently used segments are
+    dropped from memory (not from the database, they are read again when needed).
+
+    The segments set or read are pinned until unpin() is called at the end of the operation: they are
+    never evicted from the database meanwhile, so the operation can read them again.
+    """
+
+    def __init__(self, store, memory_limit=None):
+        self._store = store
+        self._memory_limit = memory_limit
+        self._keys = OrderedDict()
+        self._fetched_at = {}
+        self._count = 0
+        # Segments last used since the last save -> time, to evict the least recently used from the database
+        self._used = {}
+        # Segments set since the last save, and segments saved but not written yet -> their keys
+        self._dirty = set()
+        self._unwritten = {}
+        self._deleted = set()
+        self._pinned = set()
+
+    def _remember(self, segment_key, keys, fetched_at):
+        if segment_key in self._keys:
+            self._count -= len(self._keys[segment_key])
+        self._keys[segment_key] = keys
+        self._keys.move_to_end(segment_key)
+        self._fetched_at[segment_key] = fetched_at
+        self._count += len(keys)
+        if self._memory_limit is None:
+            return
+        for old_key in list(self._keys):
+            if self._count <= self._memory_limit:
+                break
+            if old_key == segment_key or old_key in self._dirty or old_key in self._unwritten:
+                continue
+            self._count -= len(self._keys.pop(old_key))
+            self._fetched_at.pop(old_key, None)
+
+    def __getitem__(self, segment_key):
+        with self._store._lock:
+            if segment_key in self._deleted:
+                raise KeyError(segment_key)
+            if segment_key in self._keys:
+                self._keys.move_to_end(segment_key)
+            else:
+                row = self._store.read_segment_keys(segment_key)
+                if row is None:
+                    raise KeyError(segment_key)
+                self._remember(segment_key, *row)
+            self._used[segment_key] = time.time()
+            self._pinned.add(segment_key)
+            return self._keys[segment_key]
+
+    def __contains__(self, segment_key):
+        if segment_key in self._deleted:
+            return False
+        return segment_key in self._keys or self._store.has_row("segment_keys", segment_key)
+
+    def __setitem__(self, segment_key, keys):
+        if not isinstance(keys, KeySet):
+            keys = KeySet(keys)
+        with self._store._lock:
+            self._dirty.add(segment_key)
+            self._deleted.discard(segment_key)
+            self._remember(segment_key, keys, time.time())
+            self._used[segment_key] = self._fetched_at[segment_key]
+            self._pinned.add(segment_key)
+
+    def __delitem__(self, segment_key):
+        with self._store._lock:
+            if segment_key not in self:
+                raise KeyError(segment_key)
+            if segment_key in self._keys:
+                self._count -= len(self._keys.pop(segment_key))
+            self._fetched_at.pop(segment_key, None)
+            self._used.pop(segment_key, None)
+            self._dirty.discard(segment_key)
+            self._pinned.discard(segment_key)
+            self._deleted.add(segment_key)
+
+    def __iter__(self):
+        stored = [key for key in self._store.row_keys("segment_keys") if key not in self._deleted]
+        stored_keys = set(stored)
+        return iter(stored + [key for key in self._keys if key not in stored_keys])
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def unpin(self):
+        """
+        Lets the segments set or read so far be evicted from the database again.
+        """
+        with self._store._lock:
+            self._pinned.clear()
+
+    def fetched_at(self, segment_key):
+        """
+        Returns when the keys of a segment were fetched (a time.time() timestamp), None if they are not cached.
+        """
+        if segment_key in self._deleted:
+            return None
+        if segment_key in self._fetched_at:
+            return self._fetched_at[segment_key]
+        return self._store.segment_keys_fetched_at(segment_key)
+
+class CacheStore:
+    """
+    Persists the cache sections in a SQLite database, with one table per entity type (workspaces,
+    environments, groups, users, feature flags and their definitions, segments, their definitions and
+    their keys). Each row holds one pickled entity, so only the rows that changed are written, and the
+    segment keys, the bulk of the cache, are only read when they are used.
+    """
+
+    def __init__(self, path, segment_keys_memory_limit=None, segment_keys_disk_limit=None):
+        """
+        Args:
+            path (str): The database file.
+            segment_keys_memory_limit (int): Most segment keys kept in memory, None for no limit.
+            segment_keys_disk_limit (int): Most segment keys kept in the database, None for no limit.
+                The keys of the least recently used segments are deleted first.
+        """
+        self.path = path
+        self.segment_keys_memory_limit = segment_keys_memory_limit
+        self.segment_keys_disk_limit = segment_keys_disk_limit
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                # A cache from another version of the tool, start over
+                tables = self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+                for table, in tables:
+                    self._conn.execute(f"DROP TABLE {table}")
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            for table, columns in TABLES.items():
+                column_defs = "".join(f", {column}" for column in columns)
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY{column_defs}, data BLOB)")
+            for table, columns in INDEXES.items():
+                for column in columns:
+                    self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} ({column})")
+        # The objects last written to or read from each row, to only write the rows that changed
+        self._saved = {table: {} for table in TABLES}
+        # Rows are written by a background thread, in the order they were saved
+        self._queue = queue.Queue()
+        self._thread = None
+        # Tables whose rows failed to be written, compared again by the next save whatever the sections
+        self._retry = set()
+
+    def close(self):
+        """
+        Waits until the queued rows are written, then closes the database.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._conn.close()
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM sections LIMIT 1").fetchone() is None
+
+    def has_row(self, table, key):
+        with self._lock:
+            return self._conn.execute(f"SELECT 1 FROM {table} WHERE key = ?", (key,)).fetchone() is not None
+
+    def read_row(self, table, key):
+        with self._lock:
+            row = self._conn.execute(f"SELECT data FROM {table} WHERE key = ?", (key,)).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def read_segment_keys(self, segment_key):
+        """
+        Returns the keys of a segment and when they were fetched, or None if they are not in the database.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT data, fetched_at FROM segment_keys WHERE key = ?", (segment_key,)).fetchone()
+        if row is None:
+            return None
+        keys = pickle.loads(row[0])
+        # Rows written by older versions hold plain lists
+        return (keys if isinstance(keys, KeySet) else KeySet(keys)), row[1]
+
+    def segment_keys_fetched_at(self, segment_key):
+        with self._lock:
+            row = self._conn.execute("SELECT fetched_at FROM segment_keys WHERE key = ?", (segment_key,)).fetchone()
+        return None if row is None else row[0]
+
+    def row_keys(self, table):
+        with self._lock:
+            return [key for key, in self._conn.execute(f"SELECT key FROM {table} ORDER BY rowid")]
+
+    def _read_table(self, table):
+        columns = "".join(f", {column}" for column in TABLES[table])
+        rows = []
+        for key, *values, data in self._conn.execute(f"SELECT key{columns}, data FROM {table} ORDER BY rowid"):
+            rows.append((key, tuple(values), None if data is None else pickle.loads(data)))
+        return rows
+
+    def load(self):
+        """
+        Reads every cache section except the segment keys, which are read on demand.
+
+        Returns:
+            dict: The cache sections found in the database, plus a lazy segment_keys mapping and
+            the all_splits_definitions and all_segments_definitions maps rebuilt from the definitions.
+        """
+        with self._lock:
+            present = set(self.row_keys("sections"))
+            data = {}
+            for section, (rows, build) in SECTIONS.items():
+                if section not in present:
+                    continue
+                tables = {table: self._read_table(table) for table in rows(_EMPTY[section])}
+                data[section] = build(tables)
+                # Remember what was read, so saving the unchanged sections doesn't rewrite them
+                for table, table_rows in rows(data[section]).items():
+                    self._saved[table] = {key: obj for key, (_, obj) in table_rows.items()}
+            self._saved["sections"] = {section: True for section in present}
+        if "splits_definitions" in data:
+            data["all_splits_definitions"] = {
+                split_key: definition
+                for env_definitions in data["splits_definitions"].values()
+                for split_key, definition in env_definitions.items()
+            }
+        if "segments_definitions" in data:
+            data["all_segments_definitions"] = {
+                segment_key: definition
+                for sections in data["segments_definitions"].values()
+                for env_definitions in sections.values()
+                for segment_key, definition in env_definitions.items()
+            }
+        data["segment_keys"] = SegmentKeys(self, self.segment_keys_memory_limit)
+        return data
+
+    def _table_changes(self, table, table_rows):
+        saved = self._saved[table]
+        upserts = [(key, columns, obj) for key, (columns, obj) in table_rows.items() if saved.get(key) is not obj]
+        removed = [key for key in saved if key not in table_rows]
+        self._saved[table] = {key: obj for key, (_, obj) in table_rows.items()}
+        return (table, False, upserts, removed)
+
+    def _segment_keys_changes(self, cache_data):
+        segment_keys = cache_data["segment_keys"]
+        clear = not isinstance(segment_keys, SegmentKeys) or segment_keys._store is not self
+        if clear:
+            # A plain dictionary (e.g. a freshly reset cache) replaces all the stored keys,
+            # and is swapped for a store backed mapping
+            cache_data["segment_keys"] = SegmentKeys(self, self.segment_keys_memory_limit)
+            cache_data["segment_keys"].update(segment_keys)
+            segment_keys = cache_data["segment_keys"]
+        upserts = []
+        for key in segment_keys._dirty:
+            keys = segment_keys._keys[key]
+            upserts.append((key, (len(keys), segment_keys._fetched_at[key], segment_keys._used.pop(key, None)), keys))
+            # Kept in memory until written
+            segment_keys._unwritten[key] = keys
+        segment_keys._dirty.clear()
+        # Deleted keys stay hidden by the mapping until the rows are actually deleted
+        removed = list(segment_keys._deleted)
+        used = [(used_at, key) for key, used_at in segment_keys._used.items()]
+        segment_keys._used = {}
+        return ("segment_keys", clear, upserts, removed), used, segment_keys
+
+    def _evict_segment_keys(self, pinned):
+        """
+        Deletes the keys of the least recently used segments beyond segment_keys_disk_limit keys,
+        except the pinned segments (used by the current operation).
+        """
+        if self.segment_keys_disk_limit is None:
+            return []
+        total = self._conn.execute("SELECT COALESCE(SUM(count), 0) FROM segment_keys").fetchone()[0]
+        if total <= self.segment_keys_disk_limit:
+            return []
+        kept = 0
+        evicted = []
+        for key, count in self._conn.execute("SELECT key, count FROM segment_keys ORDER BY used_at DESC").fetchall():
+            kept += count
+            if kept > self.segment_keys_disk_limit and key not in pinned:
+                evicted.append(key)
+        self._conn.executemany("DELETE FROM segment_keys WHERE key = ?", [(key,) for key in evicted])
+        logger.debug(f"Evicted the keys of {len(evicted)} segments from {self.path}")
+        return evicted
+
+    def _write(self, changes, used_segment_keys, segment_keys):
+        # Pickling is the slow part, do it before taking the lock so reads aren't blocked
+        statements = []
+        for table, clear, upserts, removed in changes:
+            if clear:
+                statements.append((f"DELETE FROM {table}", [()]))
+            if upserts:
+                columns = ("key",) + TABLES[table] + ("data",)
+                updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+                statements.append((
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT(key) DO UPDATE SET {updates}",
+                    [
+                        (key, *values, None if table in NO_DATA_TABLES else pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+                        for key, values, obj in upserts
+                    ],
+                ))
+            if removed:
+                statements.append((f"DELETE FROM {table} WHERE key = ?", [(key,) for key in removed]))
+        if used_segment_keys:
+            statements.append(("UPDATE segment_keys SET used_at = ? WHERE key = ?", used_segment_keys))
+        with self._lock, self._conn:
+            for statement, parameters in statements:
+                self._conn.executemany(statement, parameters)
+            self._evict_segment_keys(segment_keys._pinned)
+            for table, _, upserts, removed in changes:
+                if table == "segment_keys":
+                    segment_keys._deleted.difference_update(removed)
+                    for key, _, keys in upserts:
+                        if segment_keys._unwritten.get(key) is keys:
+                            del segment_keys._unwritten[key]
+        logger.debug(f"Saved {sum(len(upserts) + len(removed) for _, _, upserts, removed in changes)} "
+                     f"changed rows to {self.path}")
+
+    def _unsave(self, changes, segment_keys):
+        """
+        Marks the rows of changes that failed to be written as not saved, so the next save writes them again.
+        """
+        with self._lock:
+            for table, _, upserts, removed in changes:
+                if table == "segment_keys":
+                    # The deleted segments stay in segment_keys._deleted until they are deleted
+                    for key, _, keys in upserts:
+                        if segment_keys._unwritten.get(key) is keys:
+                            segment_keys._dirty.add(key)
+                    continue
+                saved = self._saved[table]
+                for key, _, obj in upserts:
+                    if saved.get(key) is obj:
+                        del saved[key]
+                for key in removed:
+                    saved.setdefault(key, _UNSAVED)
+                self._retry.add(table)
+
+    def _writer(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._write(*job)
+            except Exception as e:
+                logger.error(f"Failed to save the cache to {self.path}, it will be saved again: {e}")
+                self._unsave(job[0], job[2])
+            finally:
+                self._queue.task_done()
+
+    def save(self, cache_data, sections=None, wait=True):
+        """
+        Finds the rows of the cache sections that changed since they were last read or written, and has the
+        background writer thread write them to the database in one transaction.
+
+        Rows are compared by identity: the cache getters replace the entities they refetch rather than
+        modifying them in place. The changed segment keys are always written, and so are the rows that
+        failed to be written by a previous save.
+
+        Args:
+            cache_data (dict): The cache data.
+            sections (iterable): The names of the cache sections that may have changed, all of them by default.
+            wait (bool): Whether to wait until everything queued so far is written.
+
+        Returns:
+            int: The number of rows queued for writing.
+        """
+        with self._lock:
+            changes = []
+            present = dict(self._saved["sections"])
+            retry, self._retry = self._retry, set()
+            for section, (rows, _) in SECTIONS.items():
+                if sections is not None and section not in sections and not retry.intersection(rows(_EMPTY[section])):
+                    continue
+                value = cache_data.get(section)
+                for table, table_rows in rows(_EMPTY[section] if value is None else value).items():
+                    changes.append(self._table_changes(table, table_rows))
+                if value is None:
+                    present.pop(section, None)
+                else:
+                    present[section] = True
+            changes.append(self._table_changes("sections", {section: ((), True) for section in present}))
+            segment_keys_changes, used_segment_keys, segment_keys = self._segment_keys_changes(cache_data)
+            changes.append(segment_keys_changes)
+        changes = [change for change in changes if change[1] or change[2] or change[3]]
+        if changes or used_segment_keys:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, name="cache-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((changes, used_segment_keys, segment_keys))
+        if wait:
+            self._queue.join()
+        return sum(len(upserts) + len(removed) for _, _, upserts, removed in changes)
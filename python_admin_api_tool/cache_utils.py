@@ -1,6 +1,8 @@
 import os
+import time
 import pickle
 import cache
+import cache_store
 
 import logging
 logger = logging.getLogger(__name__)
@@ -11,23 +13,44 @@ def configure_logging(debug=False):
     else:
         logger.setLevel(logging.WARNING)
 
-CACHE_FILE = ".split_cache.pkl"
-def load_cache(get_all_splits_definitions, get_all_segments_definitions):
+CACHE_FILE = ".split_cache.db"
+# Seconds between two writes of the changed cache sections during a long fetch
+FLUSH_INTERVAL = 5
+_dirty_sections = set()
+_last_flush = 0.0
+# The cache file of the previous versions, imported into the database once
+LEGACY_CACHE_FILE = ".split_cache.pkl"
+store = None
+
+def open_store():
     """
-    Loads cached data from a file if it exists, and populates the cache with data for all splits and segments
-    if they are not already in the cache. The cache is then saved to a file.
+    Opens the cache database, creating it if needed, and imports the legacy pickle cache file if there is one.
     """
+    global store
+    if store is None:
+        store = cache_store.CacheStore(CACHE_FILE, get_limit("segment_keys_memory_limit"), get_limit("segment_keys_disk_limit"))
+    if os.path.exists(LEGACY_CACHE_FILE) and store.is_empty():
+        print(f"Importing the cache file '{LEGACY_CACHE_FILE}'")
+        try:
+            with open(LEGACY_CACHE_FILE, "rb") as f:
+                legacy_data = cache.default_cache_data()
+                legacy_data.update(pickle.load(f))
+            store.save(legacy_data)
+            os.remove(LEGACY_CACHE_FILE)
+        except (EOFError, pickle.UnpicklingError, KeyError) as e:
+            print(f"Failed to load cache file '{LEGACY_CACHE_FILE}': {e}")
+    return store
 
-    if os.path.exists(CACHE_FILE):
+def load_cache(get_all_splits_definitions, get_all_segments_definitions):
+    """
+    Loads cached data from the cache database if it exists (the segment keys are read on demand), and populates
+    the cache with data for all splits and segments if they are not already in the cache. The cache is then saved.
+    """
+    if not open_store().is_empty():
         print(f"cached file exists")
-        try:
-            with open(CACHE_FILE, "rb") as f:
-                loaded_data = pickle.load(f)
-            cache.cache_data.update(loaded_data)
-        except (EOFError, pickle.UnpicklingError) as e:
-            print(f"Failed to load cache file '{CACHE_FILE}': {e}")
     else:
         print("Cache not found, will be fetched.")
+    cache.cache_data.update(store.load())
     # Populate the cache with all_splits_definitions if it's not already in the cache
     if not cache.cache_data["all_splits_definitions"]:
         #print(f"Caching split definitions on the first script run or update.")
@@ -43,30 +66,148 @@ def update_cache(get_all_splits_definitions, get_all_segments_definitions):
     """
     Updates the cache with the latest data for all splits and segments and saves it to a file.
     """
-    try:
-        os.remove(CACHE_FILE)
-        #print(f"Cache file '{CACHE_FILE}' removed.")
-        print(f"Cache removed.")
-    except OSError as e:
-        #print(e)
-        pass
+    global store
+    if store is not None:
+        store.close()
+        store = None
+    for path in [CACHE_FILE, f"{CACHE_FILE}-wal", f"{CACHE_FILE}-shm", LEGACY_CACHE_FILE]:
+        try:
+            os.remove(path)
+            #print(f"Cache file '{CACHE_FILE}' removed.")
+        except OSError as e:
+            #print(e)
+            pass
+    print(f"Cache removed.")
     cache.cache_data = cache.default_cache_data()
     # Load the cache with fresh data
     print(f"Fetching latest data.")
     load_cache(get_all_splits_definitions, get_all_segments_definitions)
     print(f"Cache updated with latest data.")
 
+def refresh_cache(refresh_splits_definitions):
+    """
+    Refreshes only the feature flag definitions that were added, changed or removed since they were cached,
+    and prints a summary of the changes.
+    """
+    print(f"Refreshing feature flag definitions.")
+    previous = dict(cache.cache_data["all_splits_definitions"] or {})
+    changes = refresh_splits_definitions()
+    for change, split_keys in changes.items():
+        print(f"{len(split_keys)} feature flag definitions {change}.")
+        for split_key in sorted(split_keys):
+            definition = cache.cache_data["all_splits_definitions"].get(split_key) or previous[split_key]
+            print(f"  - {definition['name']} in environment {definition['environment']['name']}, workspace {definition['workspace']}")
+    print(f"Cache refreshed.")
+
+def get_ttl(section):
+    """
+    Returns the time to live in seconds of a type of cached data: the CACHE_TTL_<SECTION> environment variable
+    if set, otherwise cache.cache_ttl. None means the data doesn't expire.
+    """
+    value = os.environ.get(f"CACHE_TTL_{section.upper()}")
+    if value:
+        try:
+            return float(value) or None
+        except ValueError:
+            logger.warning(f"Invalid CACHE_TTL_{section.upper()} value, using the default")
+    return cache.cache_ttl.get(section)
+
+def get_limit(name):
+    """
+    Returns a segment keys limit ("segment_keys_memory_limit" or "segment_keys_disk_limit"): the CACHE_<NAME>
+    environment variable if set, e.g. CACHE_SEGMENT_KEYS_DISK_LIMIT, otherwise cache.<name>. None means no limit.
+    """
+    value = os.environ.get(f"CACHE_{name.upper()}")
+    if value:
+        try:
+            return int(value) or None
+        except ValueError:
+            logger.warning(f"Invalid CACHE_{name.upper()} value, using the default")
+    return getattr(cache, name)
+
+def is_expired(section, entry=None, fetched_at=None):
+    """
+    Returns whether cached data is older than the time to live of its section.
+
+    Args:
+        section (str): The cache section, e.g. "users" or "splits_definitions".
+        entry (str): The entry within the section timed on its own, e.g. an environment's "workspace:environment_id".
+        fetched_at (float): When the data was fetched, looked up in the cache if not given.
+
+    Returns:
+        bool: True if the data expired, or if it's not known when it was fetched.
+    """
+    ttl = get_ttl(section)
+    if ttl is None:
+        return False
+    if fetched_at is None:
+        fetched_at = cache.cache_data["fetched_at"].get(section if entry is None else f"{section}/{entry}")
+    return fetched_at is None or time.time() - fetched_at > ttl
+
+def is_segment_keys_expired(segment_key):
+    """
+    Returns whether the cached keys of a segment ("segment.environment_id.workspace_id") are expired.
+    """
+    segment_keys = cache.cache_data["segment_keys"]
+    fetched_at = segment_keys.fetched_at(segment_key) if isinstance(segment_keys, cache_store.SegmentKeys) else None
+    return is_expired("segment_keys", fetched_at=fetched_at)
+
+def touch(section, entry=None):
+    """
+    Records that cached data was just fetched, to time its expiry.
+    """
+    cache.cache_data["fetched_at"][section if entry is None else f"{section}/{entry}"] = time.time()
+    mark_dirty("fetched_at")
+
+def forget(section, entry):
+    """
+    Removes the fetch time of an entry that is no longer cached.
+    """
+    if cache.cache_data["fetched_at"].pop(f"{section}/{entry}", None) is not None:
+        mark_dirty("fetched_at")
+
+def mark_dirty(*sections):
+    """
+    Records that cache sections changed. They are written to the cache database at the next checkpoint.
+    """
+    _dirty_sections.update(sections)
+
+def checkpoint(force=False):
+    """
+    Writes the changed rows of the dirty cache sections (and the changed segment keys) in the background,
+    if FLUSH_INTERVAL seconds went by since the last write, or if force is set.
+    """
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < FLUSH_INTERVAL:
+        return
+    sections = set(_dirty_sections)
+    _dirty_sections.clear()
+    open_store().save(cache.cache_data, sections, wait=False)
+    _last_flush = now
+
+def unpin_segment_keys():
+    """
+    Ends an operation: the segment keys it used may be evicted from the cache database again.
+    """
+    segment_keys = cache.cache_data["segment_keys"]
+    if isinstance(segment_keys, cache_store.SegmentKeys):
+        segment_keys.unpin()
+
 def save_cache():
     """
-    Saves the cache to a file.
+    Saves the cache rows that changed, in any cache section, to the cache database and waits until they are written.
     """
-    with open(CACHE_FILE, "wb") as f:
-        pickle.dump(cache.cache_data, f)
+    global _last_flush
+    _dirty_sections.clear()
+    open_store().save(cache.cache_data)
+    _last_flush = time.monotonic()
 
 def quit_tool():
     """
     Saves the cache and exits the script.
     """
     save_cache()
+    store.close()
     print("Goodbye!")
     exit()
\ No newline at end of file
@@ -0,0 +1,230 @@
+import os
+import json
+import logging
+import data_utils
+import index_utils
+import stream_utils
+from tqdm import tqdm
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+def configure_logging(debug=False):
+    if debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.WARNING)
+
+# Format of the exported tables: "parquet" files, or "arrow" IPC files which can be memory-mapped
+TABLE_FORMATS = ["parquet", "arrow"]
+table_format = "parquet"
+TABLES_DIRECTORY = "tables"
+# Rows per record batch (and Parquet row group)
+BATCH_ROWS = 65536
+# Segments whose keys are fetched and written at once
+SEGMENTS_CHUNK = 100
+
+def set_table_format(format):
+    """
+    Sets the format of the exported tables, "parquet" or "arrow".
+    """
+    global table_format
+    if format not in TABLE_FORMATS:
+        raise ValueError(f"Unknown table format {format}, expected one of: {', '.join(TABLE_FORMATS)}")
+    table_format = format
+
+def _schemas():
+    # Workspace, environment and other low cardinality columns are dictionary encoded
+    category = pa.dictionary(pa.int32(), pa.string())
+    timestamp = pa.timestamp("ms")
+    location = [("workspace", category), ("environment", category)]
+    return {
+        "feature_flags": pa.schema([
+            ("workspace", category), ("flag", pa.string()), ("id", pa.string()), ("description", pa.string()),
+            ("traffic_type", category), ("rollout_status", category), ("creation_time", timestamp),
+            ("tags", pa.list_(pa.string())), ("owners", pa.list_(pa.string())),
+        ]),
+        "flag_definitions": pa.schema(location + [
+            ("flag", pa.string()), ("traffic_type", category), ("killed", pa.bool_()), ("default_treatment", category),
+            ("baseline_treatment", category), ("traffic_allocation", pa.int32()), ("rules", pa.int32()),
+            ("creation_time", timestamp), ("last_update_time", timestamp),
+        ]),
+        "flag_treatments": pa.schema(location + [
+            ("flag", pa.string()), ("treatment", category), ("description", pa.string()), ("configurations", pa.string()),
+            ("keys", pa.int32()), ("segments", pa.int32()),
+        ]),
+        "flag_targets": pa.schema(location + [
+            ("flag", pa.string()), ("treatment", category), ("target_type", category), ("target", pa.string()),
+        ]),
+        "flag_matchers": pa.schema(location + [
+            ("flag", pa.string()), ("rule", pa.int32()), ("matcher", pa.int32()), ("type", category),
+            ("attribute", category), ("negate", pa.bool_()), ("values", pa.list_(pa.string())),
+        ]),
+        "flag_buckets": pa.schema(location + [
+            ("flag", pa.string()), ("rule", pa.int32()), ("treatment", category), ("size", pa.int32()),
+        ]),
+        "segments": pa.schema(location + [
+            ("segment", pa.string()), ("traffic_type", category), ("creation_time", timestamp), ("keys", pa.int64()),
+        ]),
+        "segment_keys": pa.schema(location + [("segment", category), ("key", pa.string())]),
+        "users": pa.schema([
+            ("id", pa.string()), ("name", pa.string()), ("email", pa.string()), ("status", category),
+            ("type", category), ("groups", pa.list_(pa.string())),
+        ]),
+    }
+
+def _plain_schema(schema):
+    # An IPC file can't replace a dictionary between batches, so its categories are plain strings
+    return pa.schema([
+        pa.field(field.name, field.type.value_type) if pa.types.is_dictionary(field.type) else field
+        for field in schema
+    ])
+
+class TableWriter:
+    """
+    Writes the rows of a table to a Parquet or Arrow IPC file in record batches of BATCH_ROWS rows,
+    each batch being written as soon as it's full, so only one batch of rows is held at a time.
+    """
+
+    def __init__(self, path, schema, format):
+        self.path = path
+        self.schema = schema if format == "parquet" else _plain_schema(schema)
+        self.format = format
+        self.rows = 0
+        self._columns = [[] for _ in schema]
+        # The files are compressed internally, so their names don't change. Parquet files always are (with zstd
+        # unless gzip is chosen), IPC files only if a compression is chosen (with zstd, the only codec in common),
+        # as they can't be memory-mapped without a copy then
+        compression, level = stream_utils.get_compression(), stream_utils.get_compression_level()
+        if format == "parquet":
+            codec = "gzip" if compression == "gzip" else "zstd"
+            self._writer = pq.ParquetWriter(path, self.schema, compression=codec, compression_level=level)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=pa.Codec("zstd", level) if compression != "none" else None)
+            self._sink = pa.OSFile(path, "wb")
+            self._writer = pa.ipc.new_file(self._sink, self.schema, options=options)
+
+    def append(self, row):
+        for column, value in zip(self._columns, row):
+            column.append(value)
+        if len(self._columns[0]) >= BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self._columns[0]:
+            return
+        arrays = [pa.array(column, type=field.type) for column, field in zip(self._columns, self.schema)]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        self.rows += batch.num_rows
+        self._columns = [[] for _ in self.schema]
+        self._writer.write_batch(batch)
+
+    def close(self):
+        """
+        Writes the remaining rows and closes the file.
+
+        Returns:
+            int: The number of rows written.
+        """
+        self.flush()
+        self._writer.close()
+        if self.format != "parquet":
+            self._sink.close()
+        return self.rows
+
+def _names(items, field):
+    return [item.get(field) if isinstance(item, dict) else str(item) for item in items or []]
+
+def _flag_rows(writers, definition):
+    location = (definition["workspace"], definition["environment"]["name"])
+    flag = definition["name"]
+    rules = definition.get("rules") or []
+    writers["flag_definitions"].append(location + (
+        flag, (definition.get("trafficType") or {}).get("name"), definition.get("killed"),
+        definition.get("defaultTreatment"), definition.get("baselineTreatment"), definition.get("trafficAllocation"),
+        len(rules), definition.get("creationTime"), definition.get("lastUpdateTime"),
+    ))
+    for treatment in definition.get("treatments") or []:
+        keys, segments = treatment.get("keys") or [], treatment.get("segments") or []
+        configurations = treatment.get("configurations")
+        if configurations is not None and not isinstance(configurations, str):
+            configurations = json.dumps(configurations)
+        writers["flag_treatments"].append(location + (
+            flag, treatment["name"], treatment.get("description"), configurations, len(keys), len(segments),
+        ))
+        for target_type, targets in (("key", keys), ("segment", segments)):
+            for target in targets:
+                writers["flag_targets"].append(location + (flag, treatment["name"], target_type, target))
+    for rule_number, rule in enumerate(rules, 1):
+        for matcher_number, matcher in enumerate((rule.get("condition") or {}).get("matchers") or [], 1):
+            writers["flag_matchers"].append(location + (
+                flag, rule_number, matcher_number, matcher.get("type"), index_utils.matcher_attribute(matcher),
+                bool(matcher.get("negate")), index_utils.matcher_values(matcher),
+            ))
+        for bucket in rule.get("buckets") or []:
+            writers["flag_buckets"].append(location + (flag, rule_number, bucket.get("treatment"), bucket.get("size")))
+    # The default rule is rule 0
+    for bucket in definition.get("defaultRule") or []:
+        writers["flag_buckets"].append(location + (flag, 0, bucket.get("treatment"), bucket.get("size")))
+
+def export_tables(directory=None, format=None):
+    """
+    Exports the cached feature flags, their definitions (flattened into definitions, treatments, individual
+    targets, rule matchers and buckets), the segment definitions and keys, and the users as typed tables,
+    one Parquet or Arrow IPC file per table. The keys of the segments that are not cached are fetched.
+
+    Args:
+        directory (str): The directory to write the files to, TABLES_DIRECTORY by default.
+        format (str): "parquet" or "arrow", table_format by default.
+
+    Returns:
+        dict: The number of rows of each table.
+    """
+    if pa is None:
+        raise ImportError("The columnar export requires pyarrow, install it with: pip install pyarrow")
+    directory = directory or TABLES_DIRECTORY
+    format = format or table_format
+    os.makedirs(directory, exist_ok=True)
+    extension = "parquet" if format == "parquet" else "arrow"
+    writers = {
+        name: TableWriter(os.path.join(directory, f"{name}.{extension}"), schema, format)
+        for name, schema in _schemas().items()
+    }
+    try:
+        for flag_name, flags in data_utils.get_splits().items():
+            for flag in flags:
+                writers["feature_flags"].append((
+                    flag.get("workspace_name"), flag_name, flag.get("id"), flag.get("description"),
+                    (flag.get("trafficType") or {}).get("name"), (flag.get("rolloutStatus") or {}).get("name"),
+                    flag.get("creationTime"), _names(flag.get("tags"), "name"), _names(flag.get("owners"), "email"),
+                ))
+        for definition in data_utils.get_all_splits_definitions().values():
+            _flag_rows(writers, definition)
+
+        segments_definitions = data_utils.get_all_segments_definitions()
+        segment_keys = list(segments_definitions)
+        for start in tqdm(range(0, len(segment_keys), SEGMENTS_CHUNK), desc="Exporting segments", ncols=100, leave=False):
+            chunk = {segment_key: segments_definitions[segment_key] for segment_key in segment_keys[start:start + SEGMENTS_CHUNK]}
+            for segment_key, keys in data_utils.get_segments_keys(chunk):
+                definition = chunk[segment_key]
+                location = (definition["workspace"]["name"], definition["environment"]["name"])
+                writers["segments"].append(location + (
+                    definition["name"], (definition.get("trafficType") or {}).get("name"), definition.get("creationTime"), len(keys),
+                ))
+                for key in keys:
+                    writers["segment_keys"].append(location + (definition["name"], key))
+
+        for user in data_utils.get_all_users().values():
+            writers["users"].append((
+                user.get("ID"), user.get("Name"), user.get("Email"), user.get("Status"), user.get("Type"),
+                _names(user.get("Groups"), "Name"),
+            ))
+    finally:
+        rows = {name: writer.close() for name, writer in writers.items()}
+    return rows
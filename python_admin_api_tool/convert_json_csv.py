@@ -1,56 +1,98 @@
-import csv
-import json
 import os
+import csv
 import glob
+import pickle
+import argparse
+import tempfile
+import stream_utils
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+def iter_rows(entries):
+    # The rows of a dictionary of objects (or of lists of objects, like the feature flags by name) are
+    # the objects, the rows of a list are its objects or its strings
+    for key, value in entries:
+        if key is None:
+            if isinstance(value, (dict, str)):
+                yield value
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    yield item
+        elif isinstance(value, dict):
+            yield value
 
 def json_to_csv(json_file, csv_file):
-    with open(json_file, "r") as file:
-        data = json.load(file)
-
-    if isinstance(data, dict):
-        keys = set()
-        for obj in data.values():
-            if isinstance(obj, list):
-                for item in obj:
-                    if isinstance(item, dict):
-                        keys.update(item.keys())
-            elif isinstance(obj, dict):
-                keys.update(obj.keys())
-
-        with open(csv_file, "w", newline="") as output_file:
-            dict_writer = csv.DictWriter(output_file, fieldnames=keys)
-            dict_writer.writeheader()
-
-            for obj in data.values():
-                if isinstance(obj, list):
-                    for item in obj:
-                        if isinstance(item, dict):
-                            dict_writer.writerow(item)
-                elif isinstance(obj, dict):
-                    dict_writer.writerow(obj)
-                    
-    elif isinstance(data, list):
-        if all(isinstance(x, dict) for x in data): 
-            keys = set()
-            for item in data:
-                keys.update(item.keys())
-
-            with open(csv_file, "w", newline="") as output_file:
-                dict_writer = csv.DictWriter(output_file, fieldnames=keys)
-                dict_writer.writeheader()
-                for item in data:
-                    dict_writer.writerow(item)
-
-        elif all(isinstance(x, str) for x in data):
-            with open(csv_file, "w", newline="") as output_file:
-                csv_writer = csv.writer(output_file)
-                for item in data:
-                    csv_writer.writerow([item])
-
-def convert_all_json_to_csv():
-    for json_file in glob.glob("*.json"):
-        csv_file = os.path.splitext(json_file)[0] + ".csv"
-        json_to_csv(json_file, csv_file)
-        print(f"Converted {json_file} to {csv_file}")
-
-convert_all_json_to_csv()
\ No newline at end of file
+    """
+    Converts a JSON (or JSON Lines, possibly compressed) file to CSV in a single pass, in memory that doesn't depend on the size
+    of the file: the rows are read one at a time and spilled to a temporary file while the columns are
+    collected, in the order they first appear, then the CSV file is written from the temporary file.
+    A list of strings is written as a single column without header.
+
+    Returns:
+        int: The number of rows written.
+    """
+    columns = {}
+    rows = 0
+    strings = None
+    with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(csv_file))) as spill:
+        for row in iter_rows(stream_utils.read_entries(json_file)):
+            if strings is None:
+                strings = isinstance(row, str)
+            if strings != isinstance(row, str):
+                continue
+            if not strings:
+                columns.update(dict.fromkeys(row))
+            pickle.dump(row, spill, pickle.HIGHEST_PROTOCOL)
+            rows += 1
+
+        spill.seek(0)
+        with open(csv_file, "w", newline="", encoding="utf-8") as output_file:
+            if strings:
+                writer = csv.writer(output_file)
+                write = lambda row: writer.writerow([row])
+            else:
+                writer = csv.DictWriter(output_file, fieldnames=list(columns))
+                writer.writeheader()
+                write = writer.writerow
+            for _ in range(rows):
+                write(pickle.load(spill))
+    return rows
+
+def _convert(json_file):
+    csv_file = os.path.splitext(stream_utils.input_name(json_file))[0] + ".csv"
+    return json_file, csv_file, json_to_csv(json_file, csv_file)
+
+def convert_all_json_to_csv(json_files=None, workers=None):
+    """
+    Converts JSON files (by default every .json and .jsonl file of the current directory, possibly compressed
+    with gzip or zstd) to CSV files of the same name, several at a time in worker processes.
+
+    Args:
+        json_files (list): The files to convert.
+        workers (int): The number of worker processes, the number of CPUs by default.
+    """
+    if json_files is None:
+        json_files = sorted(
+            file_name for extension in ["json", "jsonl"] for suffix in stream_utils.COMPRESSIONS.values()
+            for file_name in glob.glob(f"*.{extension}{suffix}")
+        )
+    if not json_files:
+        print("No JSON files to convert")
+        return
+    workers = min(len(json_files), workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(workers) as executor:
+        futures = {executor.submit(_convert, json_file): json_file for json_file in json_files}
+        for future in as_completed(futures):
+            try:
+                json_file, csv_file, rows = future.result()
+            except (OSError, ValueError) as e:
+                print(f"Failed to convert {futures[future]}: {e}")
+                continue
+            print(f"Converted {json_file} to {csv_file} ({rows} rows)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert JSON and JSON Lines files to CSV")
+    parser.add_argument("files", nargs="*", help="The files to convert, every .json and .jsonl file of the current directory by default")
+    parser.add_argument("--workers", type=int, help="Number of files converted at once (the number of CPUs by default)")
+    args = parser.parse_args()
+    convert_all_json_to_csv(args.files or None, args.workers)
@@ -1,7 +1,10 @@
 import os
 import cache 
 import cache_utils
+import fetch_utils
+import rate_limit_utils
 import logging
+from key_set import KeySet
 from tqdm import tqdm
 from dotenv import load_dotenv
 from splitapiclient.main import get_client
@@ -9,9 +12,12 @@ from splitapiclient.main import get_client
 load_dotenv()
 # Load API key from .env file
 API_KEY = os.environ.get("ADMIN_API_KEY")
-# Initialize the client connection
-
-client = get_client({'apikey': API_KEY})
+# Optional Admin API base URL, e.g. to run against the local mock_admin_api.py server
+BASE_URL = os.environ.get("ADMIN_API_BASE_URL")
+# Initialize the client connection, shared by all the modules
+# All its requests go through the shared rate limiter
+client = get_client({'apikey': API_KEY, 'base_url': BASE_URL} if BASE_URL else {'apikey': API_KEY})
+rate_limit_utils.install(client)
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +27,102 @@ def configure_logging(debug=False):
     else:
         logger.setLevel(logging.WARNING)
 
+def environment_to_dict(env, workspace_name):
+    """
+    Convert an environment returned by the API into the dictionary stored in the topology index.
+    """
+    env_dict = {
+        'workspaceId': env._workspace_id,
+        'WorkspaceName': workspace_name,
+        'creationTime': env._creationTime,
+        'production': env._production,
+        'dataExportPermissions': {},
+        'environmentType': env._type,
+        'name': env._name,
+        'changePermissions': {},
+        'id': env._id,
+        'status': env._status
+    }
+    if env._dataExportPermissions:
+        env_dict['dataExportPermissions'] = {
+            'areExportersRestricted': env._dataExportPermissions.get('areExportersRestricted'),
+            'exporters': env._dataExportPermissions.get('exporters', [])
+        }
+    if env._changePermissions:
+        env_dict['changePermissions'] = {
+            'areApproversRestricted': env._changePermissions.get('areApproversRestricted'),
+            'allowKills': env._changePermissions.get('allowKills'),
+            'areEditorsRestricted': env._changePermissions.get('areEditorsRestricted'),
+            'areApprovalsRequired': env._changePermissions.get('areApprovalsRequired'),
+            'approvers': env._changePermissions.get('approvers', []),
+            'editors': env._changePermissions.get('editors', [])
+        }
+    return env_dict
+
+def build_topology(ws_list, environments_by_workspace):
+    """
+    Build the topology index (see get_topology) from the workspaces returned by the API and a dictionary
+    of workspace ID -> environments returned by the API.
+    """
+    workspaces = {
+        ws.id: {
+            "id": ws.id,
+            "name": ws.name,
+            "requiresTitleAndComments": ws._requiresTitleAndComments,
+        }
+        for ws in ws_list
+    }
+    environments = {}
+    workspace_environments = {ws_id: [] for ws_id in workspaces}
+    for ws_id in workspaces:
+        for env in environments_by_workspace.get(ws_id, []):
+            environments[env.id] = environment_to_dict(env, workspaces[ws_id]["name"])
+            workspace_environments[ws_id].append(env.id)
+
+    return {
+        "workspaces": workspaces,
+        "environments": environments,
+        "workspace_environments": workspace_environments,
+    }
+
+def get_topology():
+    """
+    Crawl the org once, listing the workspaces and the environments of each workspace, and build a
+    normalized index that every workspace and environment getter is derived from.
+
+    Returns:
+        dict: A dictionary with the following keys:
+            "workspaces": workspace ID -> {"id", "name", "requiresTitleAndComments"}
+            "environments": environment ID -> environment data (see environment_to_dict)
+            "workspace_environments": workspace ID -> list of environment IDs
+    """
+    if cache.cache_data["topology"] is not None and not cache_utils.is_expired("topology"):
+        return cache.cache_data["topology"]
+
+    ws_list = client.workspaces.list()
+    environments_by_workspace = {
+        ws_id: envs
+        for (ws_id,), envs in fetch_utils.fetch_all(
+            client.environments.list, [(ws.id,) for ws in ws_list], "Fetching environments", leave=False
+        )
+    }
+    topology = build_topology(ws_list, environments_by_workspace)
+    cache.cache_data["topology"] = topology
+    cache_utils.mark_dirty("topology")
+    cache_utils.touch("topology")
+    cache_utils.checkpoint()
+    return topology
+
+def get_workspace_environments(workspace_id):
+    """
+    Returns the environments of a workspace from the topology index, in API order.
+
+    Returns:
+        list: A list of environment data dictionaries.
+    """
+    topology = get_topology()
+    return [topology["environments"][env_id] for env_id in topology["workspace_environments"].get(workspace_id, [])]
+
 def get_workspaces():
     """
     Retrieve a dictionary of workspaces, where the keys are the workspace IDs
@@ -29,14 +131,7 @@ def get_workspaces():
     Returns:
         dict: A dictionary of workspace IDs and names.
     """
-    if cache.cache_data["workspaces"] is None:
-        workspace_dict = {ws.id: ws.name for ws in client.workspaces.list()}
-        cache.cache_data["workspaces"] = workspace_dict
-        cache_utils.save_cache()
-    else:
-        workspace_dict = cache.cache_data["workspaces"]
-
-    return workspace_dict
+    return {ws_id: ws["name"] for ws_id, ws in get_topology()["workspaces"].items()}
 
 def get_workspace_data():
     """
@@ -47,19 +142,13 @@ def get_workspace_data():
     Returns:
         dict: A dictionary of workspace data.
     """
-    if cache.cache_data["workspace_data"] is not None:
-        return cache.cache_data["workspace_data"]
-    else:
-        workspace_data = {
-            ws.id: {
-                "Name": ws.name,
-                "Requires Title And Comments": ws._requiresTitleAndComments,
-            }
-            for ws in client.workspaces.list()
+    return {
+        ws_id: {
+            "Name": ws["name"],
+            "Requires Title And Comments": ws["requiresTitleAndComments"],
         }
-        cache.cache_data["workspace_data"] = workspace_data
-        cache_utils.save_cache()
-        return workspace_data
+        for ws_id, ws in get_topology()["workspaces"].items()
+    }
     
 def get_environments():
     """
@@ -68,26 +157,13 @@ def get_environments():
     Returns:
         dict: A dictionary of environment name, id, and workspace.
     """
-    if cache.cache_data["environments"] is None:
-        environments = {}
-        workspaces = get_workspaces()
-        total_workspaces = len(workspaces)
-
-        with tqdm(total=total_workspaces, desc="Fetching environments", ncols=100) as pbar:
-            for ws_id, ws_name in workspaces.items():
-                for env in client.environments.list(ws_id):
-                    environments[env.id] = {
-                        "name": env.name,
-                        "workspace": ws_name
-                    }
-                pbar.update(1)
-
-        cache.cache_data["environments"] = environments
-        cache_utils.save_cache()
-    else:
-        environments = cache.cache_data["environments"]
-
-    return environments
+    return {
+        env_id: {
+            "name": env["name"],
+            "workspace": env["WorkspaceName"]
+        }
+        for env_id, env in get_topology()["environments"].items()
+    }
 
 def get_environments_data():
     """
@@ -97,49 +173,26 @@ def get_environments_data():
         dict: A dictionary with keys as workspace names and values as dictionaries containing information
         about all environments of the respective workspace.
     """
-
-    if cache.cache_data['environments_data'] is not None:
-        return cache.cache_data['environments_data']
-    
     all_envs = {}
-    workspaces = get_workspaces()
-    for ws_id, ws_name in tqdm(workspaces.items(), desc="Fetching environments", ncols=100, leave=False):
-        environments = client.environments.list(ws_id)
-        envs_for_ws = {}
-        for env in environments:
-            env_dict = {
-                'workspaceId': env._workspace_id,
-                'WorkspaceName': ws_name,
-                'creationTime': env._creationTime,
-                'production': env._production,
-                'dataExportPermissions': {},
-                'environmentType': env._type,
-                'name': env._name,
-                'changePermissions': {},
-                'id': env._id,
-                'status': env._status
-            }
-            if env._dataExportPermissions:
-                env_dict['dataExportPermissions'] = {
-                    'areExportersRestricted': env._dataExportPermissions.get('areExportersRestricted'),
-                    'exporters': env._dataExportPermissions.get('exporters', [])
-                }
-            if env._changePermissions:
-                env_dict['changePermissions'] = {
-                    'areApproversRestricted': env._changePermissions.get('areApproversRestricted'),
-                    'allowKills': env._changePermissions.get('allowKills'),
-                    'areEditorsRestricted': env._changePermissions.get('areEditorsRestricted'),
-                    'areApprovalsRequired': env._changePermissions.get('areApprovalsRequired'),
-                    'approvers': env._changePermissions.get('approvers', []),
-                    'editors': env._changePermissions.get('editors', [])
-                }
-            envs_for_ws[env._name] = env_dict
-        all_envs["Workspace: " + ws_name] = envs_for_ws
-    
-    cache.cache_data['environments_data'] = all_envs
-    cache_utils.save_cache()
+    for ws_id, ws_name in get_workspaces().items():
+        all_envs["Workspace: " + ws_name] = {env["name"]: env for env in get_workspace_environments(ws_id)}
     return all_envs
 
+def segment_to_dict(segment):
+    """
+    Convert a segment returned by the API into the dictionary stored in the cache.
+    """
+    return {
+        "name": segment.name,
+        "description": segment.description,
+        "trafficType": {
+            "id": segment._trafficType.id,
+            "name": segment._trafficType.name
+        },
+        "tags": [{"name": tag_name} for tag_name in (segment._tags if segment._tags is not None else [])],
+        "creationTime": segment._creationTime
+    }
+
 def get_segments():
     """
     Get all segments in all environments across all workspaces.
@@ -147,7 +200,7 @@ def get_segments():
     Returns:
         A dictionary containing all segments, grouped by workspace.
     """
-    if cache.cache_data['segments'] is not None:
+    if cache.cache_data['segments'] is not None and not cache_utils.is_expired("segments"):
         return cache.cache_data['segments']
 
     segments_data = {}
@@ -157,75 +210,185 @@ def get_segments():
             segments_data[workspace_name] = {}
 
         for segment in client.segments.list(workspace_id):
-            segment_info = {
-                "name": segment.name,
-                "description": segment.description,
-                "trafficType": {
-                    "id": segment._trafficType.id,
-                    "name": segment._trafficType.name
-                },
-                "tags": [{"name": tag_name} for tag_name in (segment._tags if segment._tags is not None else [])],
-                "creationTime": segment._creationTime
-            }
-            segments_data[workspace_name][segment.name] = segment_info
+            segments_data[workspace_name][segment.name] = segment_to_dict(segment)
 
     cache.cache_data['segments'] = segments_data
+    cache_utils.mark_dirty("segments")
+    cache_utils.touch("segments")
+    cache_utils.checkpoint()
     return segments_data
 
+def segment_definition_to_dict(segDef, environment_id, workspace_id, environment_name, workspace_name):
+    """
+    Convert a segment definition returned by the API into the dictionary stored in the cache.
+    """
+    return {
+        "name": segDef.name,
+        "environment": {
+            "id": environment_id,
+            "name": environment_name
+        },
+        "workspace": {
+            "id": workspace_id,
+            "name": workspace_name
+        },
+        "trafficType": {
+            "id": segDef._trafficType._id,
+            "name": segDef._trafficType._name
+        },
+        "creationTime": segDef._creationTime
+    }
+
+def fetch_segment_definitions(environment_id, workspace_id, environment_name, workspace_name):
+    """
+    Fetch the segment definitions of one environment from the API, without touching the cache.
+
+    Returns:
+        A dictionary of segment definitions keyed by "segment.environment_id.workspace_id".
+    """
+    definitions = {}
+    for segDef in client.segment_definitions.list(environment_id, workspace_id):
+        definitions[f"{segDef.name}.{environment_id}.{workspace_id}"] = segment_definition_to_dict(
+            segDef, environment_id, workspace_id, environment_name, workspace_name
+        )
+    return definitions
+
 def get_segment_definitions(environment_id, workspace_id, environment_name, workspace_name):
     if cache.cache_data["segments_definitions"] is None:
         cache.cache_data["segments_definitions"] = {}
         
     cache_key = f"{workspace_name}:{environment_id}"
-    if cache.cache_data["segments_definitions"].get(workspace_name, {}).get(cache_key):
+    if (cache.cache_data["segments_definitions"].get(workspace_name, {}).get(cache_key)
+            and not cache_utils.is_expired("segments_definitions", cache_key)):
         return cache.cache_data["segments_definitions"][workspace_name][cache_key]
 
-    definitions = {}
-    for segDef in client.segment_definitions.list(environment_id, workspace_id):
-        segment_info = {
-            "name": segDef.name,
-            "environment": {
-                "id": environment_id,
-                "name": environment_name
-            },
-            "workspace": {
-                "id": workspace_id,
-                "name": workspace_name
-            },
-            "trafficType": {
-                "id": segDef._trafficType._id,
-                "name": segDef._trafficType._name
-            },
-            "creationTime": segDef._creationTime
-        }
+    definitions = fetch_segment_definitions(environment_id, workspace_id, environment_name, workspace_name)
+    cache.cache_data["segments_definitions"].setdefault(workspace_name, {})[cache_key] = definitions
+    # Rebuilt with the new definitions on the next get_all_segments_definitions()
+    cache.cache_data["all_segments_definitions"] = None
+    cache_utils.mark_dirty("segments_definitions")
+    cache_utils.touch("segments_definitions", cache_key)
+    cache_utils.checkpoint()
+    return definitions
+
+def get_segment_keys(segment_name, environment_id, workspace_id):
+    """
+    Get the keys of a segment in an environment. Segment definitions only hold metadata, so the keys
+    are fetched the first time they are needed and then kept in the segment keys store.
 
-        segment_info["keys"] = client.segment_definitions.find(segDef.name, environment_id, workspace_id).get_keys()
+    Returns:
+        KeySet: The keys of the segment.
+    """
+    segment_key = f"{segment_name}.{environment_id}.{workspace_id}"
+    if segment_key in cache.cache_data["segment_keys"] and not cache_utils.is_segment_keys_expired(segment_key):
+        return cache.cache_data["segment_keys"][segment_key]
 
-        definitions[f"{segDef.name}.{environment_id}.{workspace_id}"] = segment_info
+    keys = KeySet(client.segment_definitions.get_keys(segment_name, environment_id))
+    cache.cache_data["segment_keys"][segment_key] = keys
+    cache_utils.checkpoint()
+    return keys
 
-    cache.cache_data["segments_definitions"].setdefault(workspace_name, {}).setdefault(cache_key, definitions)
-    cache_utils.save_cache()
-    return definitions
+def get_segments_keys(segment_definitions):
+    """
+    Get the keys of several segments at once, fetching the ones not in the segment keys store (or expired)
+    concurrently. The keys are handed over as they are read or fetched, rather than read back from the store,
+    which may have dropped them meanwhile to stay within its limits.
+
+    Args:
+        segment_definitions (dict): Segment definitions keyed by "segment.environment_id.workspace_id",
+            as returned by get_all_segments_definitions().
+
+    Returns:
+        A generator of (segment key, KeySet) tuples, one per segment of segment_definitions: the cached
+        segments first, then the fetched ones as they arrive.
+    """
+    tasks = {}
+    for segment_key, definition in segment_definitions.items():
+        if segment_key in cache.cache_data["segment_keys"] and not cache_utils.is_segment_keys_expired(segment_key):
+            try:
+                keys = cache.cache_data["segment_keys"][segment_key]
+            except KeyError:
+                # Evicted since it was checked, fetched again below
+                pass
+            else:
+                yield segment_key, keys
+                continue
+        tasks[(definition["name"], definition["environment"]["id"])] = segment_key
+    if tasks:
+        for task, keys in fetch_utils.fetch_all(client.segment_definitions.get_keys, tasks, "Fetching segment keys", leave=False):
+            keys = KeySet(keys)
+            cache.cache_data["segment_keys"][tasks[task]] = keys
+            cache_utils.checkpoint()
+            yield tasks[task], keys
+        cache_utils.checkpoint(force=True)
+
+def prefetch_segments_keys(segment_definitions):
+    """
+    Fetches the keys of the segments that are not in the segment keys store (or expired), without holding them.
+    """
+    for _ in get_segments_keys(segment_definitions):
+        pass
+
+def environments_to_fetch(section, cached_sections):
+    """
+    Returns the environments whose definitions are not cached, or expired.
+
+    Args:
+        section (str): "splits_definitions" or "segments_definitions".
+        cached_sections (function): Returns the cached definitions of a workspace name, keyed by "workspace:environment_id".
+
+    Returns:
+        list: (environment data, workspace ID, workspace name) tuples.
+    """
+    return [
+        (env, workspace_id, workspace_name)
+        for workspace_id, workspace_name in get_workspaces().items()
+        for env in get_workspace_environments(workspace_id)
+        if f"{workspace_name}:{env['id']}" not in cached_sections(workspace_name)
+        or cache_utils.is_expired(section, f"{workspace_name}:{env['id']}")
+    ]
 
 def get_all_segments_definitions():
-    if cache.cache_data["all_segments_definitions"]:
+    if cache.cache_data["segments_definitions"] is None:
+        cache.cache_data["segments_definitions"] = {}
+    def cached_sections(workspace_name):
+        return cache.cache_data["segments_definitions"].get(workspace_name, {})
+    expired = environments_to_fetch("segments_definitions", cached_sections)
+    if cache.cache_data["all_segments_definitions"] and not expired:
         return cache.cache_data["all_segments_definitions"]
 
     workspaces = get_workspaces()
-    definitions = {}
 
-    total_environments = sum(len(client.environments.list(workspace_id)) for workspace_id in workspaces)
+    # Environments already cached and not expired are reused, the rest are fetched concurrently
+    tasks = [(env["id"], workspace_id, env["name"], workspace_name) for env, workspace_id, workspace_name in expired]
+    for (environment_id, workspace_id, environment_name, workspace_name), segment_definitions in fetch_utils.fetch_all(
+        fetch_segment_definitions, tasks, "Fetching segment definitions"
+    ):
+        cache_key = f"{workspace_name}:{environment_id}"
+        cache.cache_data["segments_definitions"].setdefault(workspace_name, {})[cache_key] = segment_definitions
+        cache_utils.mark_dirty("segments_definitions")
+        cache_utils.touch("segments_definitions", cache_key)
+        cache_utils.checkpoint()
 
-    with tqdm(total=total_environments, desc="Fetching segment definitions", ncols=100) as pbar:
-        for workspace_id, workspace_name in workspaces.items():
-            for env in client.environments.list(workspace_id):
-                segment_definitions = get_segment_definitions(env.id, workspace_id, env.name, workspace_name)
-                for segment_key, segment_definition in segment_definitions.items():
-                    definitions[segment_key] = segment_definition
-                pbar.update(1)
+    definitions = {}
+    current = set()
+    for workspace_id, workspace_name in workspaces.items():
+        for env in get_workspace_environments(workspace_id):
+            cache_key = f"{workspace_name}:{env['id']}"
+            current.add(cache_key)
+            definitions.update(cache.cache_data["segments_definitions"].get(workspace_name, {}).get(cache_key, {}))
+
+    # Drop the definitions of the environments that no longer exist
+    for workspace_name, sections in list(cache.cache_data["segments_definitions"].items()):
+        for cache_key in [cache_key for cache_key in sections if cache_key not in current]:
+            del sections[cache_key]
+            cache_utils.forget("segments_definitions", cache_key)
+            cache_utils.mark_dirty("segments_definitions")
+        if not sections:
+            del cache.cache_data["segments_definitions"][workspace_name]
 
     cache.cache_data["all_segments_definitions"] = definitions
-    cache_utils.save_cache()
+    cache_utils.checkpoint(force=True)
     return definitions
 
 def get_groups():
@@ -235,15 +398,37 @@ def get_groups():
     Returns:
         dict: A dictionary where the keys are the group IDs and the values are the group names.
     """
-    if cache.cache_data["groups"] is not None:
+    if cache.cache_data["groups"] is not None and not cache_utils.is_expired("groups"):
         return cache.cache_data["groups"]
 
     groups = {group._id: group._name for group in client.groups.list()}
     cache.cache_data["groups"] = groups
-    cache_utils.save_cache()
+    cache_utils.mark_dirty("groups")
+    cache_utils.touch("groups")
+    cache_utils.checkpoint()
 
     return groups
 
+def user_to_dict(user, groups_dict):
+    """
+    Convert a user returned by the API into the dictionary stored in the cache.
+    """
+    return {
+        "Type": user._type,
+        "Name": user._name,
+        "Email": user.email,
+        "Status": user._status,
+        "ID" : user._id,
+        "Groups": [
+            {
+                "type": group["type"],
+                "ID": group["id"],
+                "Name": groups_dict[group["id"]]
+            }
+            for group in user._groups
+        ]
+    }
+
 def get_all_users():
     """
     Retrieves all active Split users and their associated group memberships.
@@ -253,7 +438,7 @@ def get_all_users():
         including name, email, status, and a list of groups to which the user belongs.
 
     """
-    if cache.cache_data["users"]:
+    if cache.cache_data["users"] and not cache_utils.is_expired("users"):
         return cache.cache_data["users"]
     
     groups_dict = get_groups()
@@ -261,25 +446,12 @@ def get_all_users():
     statuses = ["ACTIVE", "DEACTIVATED", "PENDING"]
     for status in tqdm(statuses, desc="Fetching users", ncols=100, leave=False):
         for user in client.users.list(status):
-            user_data = {
-                "Type": user._type,
-                "Name": user._name,
-                "Email": user.email,
-                "Status": user._status,
-                "ID" : user._id,
-                "Groups": [
-                    {
-                        "type": group["type"],
-                        "ID": group["id"],
-                        "Name": groups_dict[group["id"]]
-                    }
-                    for group in user._groups
-                ]
-            }
-            users[user._name] = user_data
+            users[user._name] = user_to_dict(user, groups_dict)
     
     cache.cache_data["users"] = users
-    cache_utils.save_cache()
+    cache_utils.mark_dirty("users")
+    cache_utils.touch("users")
+    cache_utils.checkpoint()
     return users
 
 def get_groups_users():
@@ -301,9 +473,31 @@ def get_groups_users():
                     group_users.append(user_name)
                     break
         groups_data[group_name] = {"Group": group_name, "Users": group_users}
-    cache_utils.save_cache()
     return groups_data
 
+def split_to_dict(split, workspace_id, workspace_name, user_id_to_data):
+    """
+    Convert a split returned by the API into the dictionary stored in the cache, adding the owners' names
+    and emails from user_id_to_data (user ID -> user data, as returned by get_all_users()).
+    """
+    split_data = split.to_dict()
+    split_data["rolloutStatus"] = split._rolloutStatus
+    split_data["trafficType"] = split._trafficType.to_dict()
+    split_data["tags"] = split._tags
+    # Add user names to the 'owners' structure
+    split_data["owners"] = [
+        {
+            "id": owner["id"],
+            "type": owner["type"],
+            "name": user_id_to_data[owner["id"]]["Name"] if owner["type"] == "user" and owner["id"] in user_id_to_data else None,
+            "email": user_id_to_data[owner["id"]]["Email"] if owner["type"] == "user" and owner["id"] in user_id_to_data else None
+        }
+        for owner in split._owners
+    ]
+    split_data["workspace_id"] = workspace_id
+    split_data["workspace_name"] = workspace_name
+    return split_data
+
 def get_splits():
     """
     Get data for all splits across all workspaces.
@@ -311,7 +505,7 @@ def get_splits():
     Returns:
         A dictionary containing information on all splits, grouped by split name.
     """
-    if cache.cache_data["splits"]:
+    if cache.cache_data["splits"] and not cache_utils.is_expired("splits"):
         return cache.cache_data["splits"]
     else:
         # Create a dictionary mapping user IDs to user names
@@ -322,30 +516,48 @@ def get_splits():
         splits = {}
         for workspace_id, workspace_name in tqdm(workspaces.items(), desc="Fetching splits", ncols=100, leave=False):
             for split in client.splits.list(workspace_id):
-                split_data = split.to_dict()
-                split_data["rolloutStatus"] = split._rolloutStatus
-                split_data["trafficType"] = split._trafficType.to_dict()
-                split_data["tags"] = split._tags
-                # Add user names to the 'owners' structure
-                split_data["owners"] = [
-                    {
-                        "id": owner["id"],
-                        "type": owner["type"],
-                        "name": user_id_to_data[owner["id"]]["Name"] if owner["type"] == "user" and owner["id"] in user_id_to_data else None,
-                        "email": user_id_to_data[owner["id"]]["Email"] if owner["type"] == "user" and owner["id"] in user_id_to_data else None
-                    }
-                    for owner in split._owners
-                ]
-                split_data["workspace_id"] = workspace_id
-                split_data["workspace_name"] = workspace_name
+                split_data = split_to_dict(split, workspace_id, workspace_name, user_id_to_data)
                 if split.name not in splits:
                     splits[split.name] = [split_data]
                 else:
                     splits[split.name].append(split_data)
         cache.cache_data["splits"] = splits
-        cache_utils.save_cache()
+        cache_utils.mark_dirty("splits")
+        cache_utils.touch("splits")
+        cache_utils.checkpoint()
         return splits
 
+def split_definition_to_dict(split_def, workspace_name):
+    """
+    Convert a Split definition returned by the API into the dictionary stored in the cache.
+    """
+    data = split_def.to_dict()
+    data["workspace"] = workspace_name
+    data["rules"] = [rule.export_dict() for rule in split_def._rules]
+    data["defaultRule"] = [def_rule.export_dict() for def_rule in split_def._default_rule]
+    data["treatments"] = [treatment.export_dict() for treatment in split_def._treatments]
+    data["killed"] = split_def._killed
+    data["defaultTreatment"] = split_def._default_treatment
+    data["baselineTreatment"] = split_def._baseline_treatment
+    data["trafficAllocation"] = split_def._traffic_allocation
+    data["environment"] = {"id": split_def._environment.id, "name": split_def._environment.name}
+    data["trafficType"] = split_def._trafficType.to_dict()
+    data["creationTime"] = split_def._creationTime
+    data["lastUpdateTime"] = split_def._lastUpdateTime
+    return data
+
+def fetch_split_definitions(environment_id, workspace_id, workspace_name):
+    """
+    Fetch the Split definitions of one environment from the API, without touching the cache.
+
+    Returns:
+        A dictionary of Split definitions keyed by "split.environment_id.workspace_id".
+    """
+    definitions = {}
+    for split_def in client.split_definitions.list(environment_id, workspace_id):
+        definitions[f"{split_def.name}.{environment_id}.{workspace_id}"] = split_definition_to_dict(split_def, workspace_name)
+    return definitions
+
 def get_split_definitions(environment_id, workspace_id, workspace_name):
     """
     Get data for all Split definitions in a specific environment and workspace.
@@ -362,79 +574,111 @@ def get_split_definitions(environment_id, workspace_id, workspace_name):
     cache_key = f"{workspace_name}:{environment_id}"
     #if cache.cache_data["splits_definitions"].get(workspace_name, {}).get(cache_key):
         #return cache.cache_data["splits_definitions"][workspace_name][cache_key]
-    if cache.cache_data["splits_definitions"].get(cache_key):
+    if (cache.cache_data["splits_definitions"].get(cache_key)
+            and not cache_utils.is_expired("splits_definitions", cache_key)):
         return cache.cache_data["splits_definitions"][cache_key]
 
-    definitions = {}
-    for split_def in client.split_definitions.list(environment_id, workspace_id):
-        split_name = split_def.name
-        data = split_def.to_dict()
-        data["workspace"] = workspace_name
-        data["rules"] = [rule.export_dict() for rule in split_def._rules]
-        data["defaultRule"] = [def_rule.export_dict() for def_rule in split_def._default_rule]
-        data["treatments"] = [treatment.export_dict() for treatment in split_def._treatments]
-        data["killed"] = split_def._killed
-        data["defaultTreatment"] = split_def._default_treatment
-        data["baselineTreatment"] = split_def._baseline_treatment
-        data["trafficAllocation"] = split_def._traffic_allocation
-        data["environment"] = {"id": split_def._environment.id, "name": split_def._environment.name}
-        data["trafficType"] = split_def._trafficType.to_dict()
-        data["creationTime"] = split_def._creationTime
-        data["lastUpdateTime"] = split_def._lastUpdateTime
-
-        definitions[f"{split_name}.{environment_id}.{workspace_id}"] = data
+    definitions = fetch_split_definitions(environment_id, workspace_id, workspace_name)
     #cache.cache_data["splits_definitions"].setdefault(cache_key, definitions)
     cache.cache_data["splits_definitions"][cache_key] = definitions
-    cache_utils.save_cache()
+    # Rebuilt with the new definitions on the next get_all_splits_definitions()
+    cache.cache_data["all_splits_definitions"] = None
+    cache_utils.mark_dirty("splits_definitions")
+    cache_utils.touch("splits_definitions", cache_key)
+    cache_utils.checkpoint()
     return definitions
 
 def get_all_splits_definitions():
-    if cache.cache_data["all_splits_definitions"]:
+    expired = environments_to_fetch("splits_definitions", lambda workspace_name: cache.cache_data["splits_definitions"])
+    if cache.cache_data["all_splits_definitions"] and not expired:
         return cache.cache_data["all_splits_definitions"]
 
     workspaces = get_workspaces()
-    definitions = {}
 
-    total_environments = sum(len(client.environments.list(workspace_id)) for workspace_id in workspaces)
+    # Environments already cached and not expired are reused, the rest are fetched concurrently
+    tasks = [(env["id"], workspace_id, workspace_name) for env, workspace_id, workspace_name in expired]
+    for (environment_id, workspace_id, workspace_name), split_definitions in fetch_utils.fetch_all(
+        fetch_split_definitions, tasks, "Fetching feature flags definitions"
+    ):
+        cache.cache_data["splits_definitions"][f"{workspace_name}:{environment_id}"] = split_definitions
+        cache_utils.mark_dirty("splits_definitions")
+        cache_utils.touch("splits_definitions", f"{workspace_name}:{environment_id}")
+        cache_utils.checkpoint()
 
-    with tqdm(total=total_environments, desc="Fetching feature flags definitions", ncols=100) as pbar:
-        for workspace_id, workspace_name in workspaces.items():
-            for env in client.environments.list(workspace_id):
-                split_definitions = get_split_definitions(env.id, workspace_id, workspace_name).values()
-                for split_definition in split_definitions:
-                    split_key = f"{split_definition['name']}.{env.id}.{workspace_id}"
-                    definitions[split_key] = split_definition
-                pbar.update(1)
+    definitions = {}
+    current = set()
+    for workspace_id, workspace_name in workspaces.items():
+        for env in get_workspace_environments(workspace_id):
+            current.add(f"{workspace_name}:{env['id']}")
+            split_definitions = cache.cache_data["splits_definitions"].get(f"{workspace_name}:{env['id']}", {}).values()
+            for split_definition in split_definitions:
+                split_key = f"{split_definition['name']}.{env['id']}.{workspace_id}"
+                definitions[split_key] = split_definition
+
+    # Drop the definitions of the environments that no longer exist
+    for cache_key in [cache_key for cache_key in cache.cache_data["splits_definitions"] if cache_key not in current]:
+        del cache.cache_data["splits_definitions"][cache_key]
+        cache_utils.forget("splits_definitions", cache_key)
+        cache_utils.mark_dirty("splits_definitions")
 
     cache.cache_data["all_splits_definitions"] = definitions
-    cache_utils.save_cache()
+    cache_utils.checkpoint(force=True)
     return definitions
 
-def get_all_splits_definitions_bk():
+def refresh_splits_definitions():
     """
-    Get all Split definitions across all workspaces and environments.
+    Refresh the cached Split definitions in place instead of refetching the whole org. The topology is
+    crawled again and every environment's definitions are listed, but only the definitions that are new,
+    or whose creationTime or lastUpdateTime changed, are converted and replaced. Definitions that no longer
+    exist, including those of deleted environments, are removed.
 
     Returns:
-        A dictionary containing information on all Split definitions, grouped by Split name.
+        dict: The keys ("split.environment_id.workspace_id") of the definitions that were "added",
+        "changed" and "removed".
     """
-    if cache.cache_data["all_splits_definitions"]:
-        return cache.cache_data["all_splits_definitions"]
-
+    previous = get_all_splits_definitions()
+    cache.cache_data["topology"] = None
     workspaces = get_workspaces()
-    definitions = {}
-
-    #total_workspaces = len(workspaces)
-    total_environments = sum(len(client.environments.list(workspace_id)) for workspace_id in workspaces)
-
-    with tqdm(total=total_environments, desc="Fetching split definitions", ncols=100) as pbar:
-        for workspace_id, workspace_name in workspaces.items():
-            for env in client.environments.list(workspace_id):
-                #split_definitions = get_split_definitions(env.id, workspace_id, workspace_name)
-                split_definitions = get_split_definitions(env.id, workspace_id, workspace_name).values()
-                for split_key, split_definition in split_definitions:
-                    definitions[split_key] = split_definition
-                pbar.update(1)
 
+    tasks = [
+        (env["id"], workspace_id)
+        for workspace_id in workspaces
+        for env in get_workspace_environments(workspace_id)
+    ]
+    changes = {"added": [], "changed": [], "removed": []}
+    splits_definitions = {}
+    definitions = {}
+    for (environment_id, workspace_id), split_defs in fetch_utils.fetch_all(
+        client.split_definitions.list, tasks, "Refreshing feature flags definitions"
+    ):
+        workspace_name = workspaces[workspace_id]
+        env_definitions = {}
+        for split_def in split_defs:
+            split_key = f"{split_def.name}.{environment_id}.{workspace_id}"
+            cached = previous.get(split_key)
+            if cached is None:
+                changes["added"].append(split_key)
+            elif (cached["lastUpdateTime"] != split_def._lastUpdateTime
+                    or cached["creationTime"] != split_def._creationTime
+                    or cached["workspace"] != workspace_name):
+                changes["changed"].append(split_key)
+            else:
+                env_definitions[split_key] = cached
+                continue
+            env_definitions[split_key] = split_definition_to_dict(split_def, workspace_name)
+        splits_definitions[f"{workspace_name}:{environment_id}"] = env_definitions
+        cache_utils.touch("splits_definitions", f"{workspace_name}:{environment_id}")
+        definitions.update(env_definitions)
+
+    changes["removed"] = [split_key for split_key in previous if split_key not in definitions]
+    for cache_key in cache.cache_data["splits_definitions"]:
+        if cache_key not in splits_definitions:
+            cache_utils.forget("splits_definitions", cache_key)
+
+    cache.cache_data["splits_definitions"] = splits_definitions
     cache.cache_data["all_splits_definitions"] = definitions
-    cache_utils.save_cache()
-    return definitions
\ No newline at end of file
+    if changes["added"] or changes["removed"]:
+        cache.cache_data["splits"] = None
+    cache_utils.mark_dirty("topology", "splits_definitions", "splits")
+    cache_utils.checkpoint(force=True)
+    return changes
@@ -1,5 +1,21 @@
+import os
+import re
+import sys
 import json
+import time
+import shutil
+import tempfile
+import hashlib
+import datetime
+import multiprocessing
+from collections.abc import Mapping, Set
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import cache
+import cache_utils
 import data_utils
+import columnar_utils
+import stream_utils
+from key_set import KeySet
 import csv
 import logging
 
@@ -11,15 +27,32 @@ def configure_logging(debug=False):
     else:
         logger.setLevel(logging.WARNING)
 
+# Format of the exported data files: "json" (one JSON document) or "jsonl" (JSON Lines, one entry per line)
+EXPORT_FORMATS = ["json", "jsonl"]
+export_format = "json"
+
+def set_export_format(format):
+    """
+    Sets the format of the files written by the export_* actions, "json" or "jsonl".
+    """
+    global export_format
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {format}, expected one of: {', '.join(EXPORT_FORMATS)}")
+    export_format = format
+
+def _treatment_keys(treatments):
+    # The individually targeted keys of every treatment that has some, by treatment name
+    return {treatment["name"]: treatment["keys"] for treatment in treatments if treatment.get("keys")}
+
 def export_treatment_keys_to_json(treatments, file_name):
-    keys = []
-    for treatment in treatments:
-        if "keys" in treatment and treatment["keys"]:
-            keys = [key for key in treatment["keys"]]
-            break
+    """
+    Exports the individually targeted keys of a feature flag definition to a JSON file, by treatment.
+    Returns:
+        None
+    """
+    keys = _treatment_keys(treatments)
     if keys:
-        with open(file_name, "w") as file:
-            file.write(json.dumps(keys, indent=4))
+        stream_utils.export_json(keys, file_name)
         print(f"Feature Flag's treatment keys exported successfully!")
     else:
         print(f"Keys are empty, no export")
@@ -27,26 +60,37 @@ def export_treatment_keys_to_json(treatments, file_name):
 
 def export_treatment_keys_to_csv(treatments, file_name):
     """
-    Exports treatment keys to CSV file.
+    Exports the individually targeted keys of a feature flag definition to a CSV file, with their treatment.
     Returns:
         None
     """
-    keys = []
-    for treatment in treatments:
-        if "keys" in treatment and treatment["keys"]:
-            keys = [key for key in treatment["keys"]]
-            break
+    keys = _treatment_keys(treatments)
     if keys:
-        with open(file_name, 'w', newline='') as file:
+        with stream_utils.open_output(file_name, newline='') as file:
             writer = csv.writer(file)
-            writer.writerow(["keys"])
-            for key in keys:
-                writer.writerow([key])
+            writer.writerow(["keys", "treatment"])
+            for treatment_name, treatment_keys in keys.items():
+                for key in treatment_keys:
+                    writer.writerow([key, treatment_name])
         print(f"Split treatment rules exported to csv successfully!")
     else:
         print(f"Keys are empty, no export")
         return
 
+def export_segment_keys_to_csv(keys, file_name):
+    """
+    Exports the keys of a segment to a CSV file, one key per row, in the same format as the
+    Admin API client's export_keys_to_csv but from the cached keys.
+
+    Args:
+        keys (KeySet): The keys of the segment, as returned by data_utils.get_segment_keys().
+        file_name (str): The CSV file to write.
+    """
+    with stream_utils.open_output(file_name, newline='') as file:
+        writer = csv.writer(file, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        for key in keys:
+            writer.writerow([key])
+
 def export_matcher_type_and_strings_to_json_bk(rules, file_name):
     if not rules:
         print("Rules are empty, no export.")
@@ -58,9 +102,8 @@ def export_matcher_type_and_strings_to_json_bk(rules, file_name):
                 type_and_strings.append({"type": matcher["type"], "strings": matcher["strings"]})
             elif "string" in matcher:
                 type_and_strings.append({"type": matcher["type"], "strings": [matcher["string"]]})
-    with open(file_name, "w") as file:
-        file.write(json.dumps(type_and_strings, indent=4))
-        print(f"Feature Flag's treatment rules exported to json successfully!")
+    stream_utils.export_json(type_and_strings, file_name)
+    print(f"Feature Flag's treatment rules exported to json successfully!")
 
 def export_matcher_type_and_strings_to_json(rules, file_name):
     if not rules:
@@ -81,9 +124,8 @@ def export_matcher_type_and_strings_to_json(rules, file_name):
             # Add other matcher types here
             type_and_strings.append(matcher_info)
 
-    with open(file_name, "w") as file:
-        file.write(json.dumps(type_and_strings, indent=4))
-        print(f"Feature Flag's treatment rules exported to json successfully!")
+    stream_utils.export_json(type_and_strings, file_name)
+    print(f"Feature Flag's treatment rules exported to json successfully!")
 
 
 def export_matcher_type_and_strings_to_csv(rules, file_name):
@@ -114,7 +156,7 @@ def export_matcher_type_and_strings_to_csv(rules, file_name):
     # Find the max number of rows
     max_rows = max([len(strings) for type_and_string in type_and_strings if "strings" in type_and_string for strings in type_and_string["strings"]])
 
-    with open(file_name, "w", newline='') as file:
+    with stream_utils.open_output(file_name, newline='') as file:
         csv_writer = csv.writer(file)
         # Write header
         headers = [f"{type_and_string['type']}_{idx}" for idx, type_and_string in enumerate(type_and_strings)]
@@ -131,8 +173,7 @@ def export_matcher_type_and_strings_to_csv(rules, file_name):
     print(f"Split treatment rules exported to csv successfully!")
 
 def export_split_definition_to_json(split_data, file_name):
-    with open(file_name, "w") as file:
-        file.write(json.dumps(split_data, indent=4))
+    stream_utils.export_json(split_data, file_name)
 
 def export_specific_split_definition(split_data):
     """
@@ -155,9 +196,16 @@ def export_specific_split_definition(split_data):
 
 
 def export_data_to_json(data_type, data_getter):
+    """
+    Exports data to "{data_type}_data.json", or "{data_type}_data.jsonl" with the jsonl export format,
+    streaming it entry by entry.
+
+    Returns:
+        int: The number of entries exported.
+    """
     data = data_getter()
-    with open(data_type + "_data" + ".json", "w") as file:
-        file.write(json.dumps(data, indent=4))
+    file_name = f"{data_type}_data.{export_format}"
+    return stream_utils.export_json(data, file_name, json_lines=export_format == "jsonl")
 
 
 def export_data(data_type, data_getter):
@@ -238,4 +286,434 @@ def export_feature_flags_definitions():
     Returns:
         Output to stdout
     """
-    export_data("flag_definitions", data_utils.get_all_splits_definitions)
\ No newline at end of file
+    export_data("flag_definitions", data_utils.get_all_splits_definitions)
+
+def export_tables():
+    """
+    Export the feature flags, their definitions, the segments and their keys, and the users as flattened typed
+    tables (Parquet or Arrow IPC files, requires pyarrow) to the "tables" directory.
+
+    Returns:
+        Output to stdout
+    """
+    print("Exporting tables, please wait...")
+    try:
+        rows = columnar_utils.export_tables()
+    except ImportError as e:
+        print(e)
+        return
+    for table_name, count in rows.items():
+        print(f"  - {table_name}: {count} rows")
+    print(f"Tables exported to the {columnar_utils.TABLES_DIRECTORY} directory successfully!")
+
+# File of the individually targeted keys inventory
+TARGETED_KEYS_FILE = "targeted_keys.csv"
+TARGETED_KEYS_COLUMNS = ["flag", "workspace", "environment", "treatment", "key"]
+
+def _write_targeted_keys(environment, part_file):
+    # Writes the targeted keys of the feature flag definitions of an environment (from the snapshot) to a part file
+    rows = 0
+    with open(part_file, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        for definition in _snapshot["targeted_keys"][environment]:
+            for treatment_name, keys in _treatment_keys(definition.get("treatments") or []).items():
+                writer.writerows((definition["name"], *environment, treatment_name, key) for key in keys)
+                rows += len(keys)
+    return rows
+
+def export_targeted_keys(file_name=None):
+    """
+    Export an inventory of the keys individually targeted by the feature flags of every workspace and
+    environment, one (flag, workspace, environment, treatment, key) row per key and treatment, to a CSV file.
+
+    Every cached feature flag definition is read once. The environments are written concurrently to part
+    files, which are then appended to the file in order, so it's streamed and its rows grouped by environment.
+
+    Args:
+        file_name (str): The CSV file to write, TARGETED_KEYS_FILE by default.
+
+    Returns:
+        int: The number of rows written.
+    """
+    file_name = file_name or TARGETED_KEYS_FILE
+    print(f"Exporting the individually targeted keys of all feature flags to {stream_utils.output_name(file_name)}, please wait...")
+    environments = {}
+    for definition in data_utils.get_all_splits_definitions().values():
+        environments.setdefault((definition["workspace"], definition["environment"]["name"]), []).append(definition)
+
+    rows = 0
+    _snapshot["targeted_keys"] = environments
+    try:
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(file_name))) as parts, \
+                _executor(max(1, min(len(environments), os.cpu_count() or 1))) as executor:
+            part_files = [os.path.join(parts, f"{index}.csv") for index in range(len(environments))]
+            futures = [executor.submit(_write_targeted_keys, environment, part_file) for environment, part_file in zip(environments, part_files)]
+            with stream_utils.open_output(file_name, newline='') as file:
+                csv.writer(file).writerow(TARGETED_KEYS_COLUMNS)
+                for future, part_file in zip(futures, part_files):
+                    rows += future.result()
+                    with open(part_file, newline="", encoding="utf-8") as part:
+                        shutil.copyfileobj(part, file, stream_utils.READ_SIZE)
+    finally:
+        _snapshot.pop("targeted_keys", None)
+    print(f"{rows} targeted keys of {len(environments)} environments exported successfully!")
+    return rows
+
+# Directory of the partitioned segment keys export, one CSV file per segment under <workspace>/<environment>/
+SEGMENT_KEYS_DIRECTORY = "segment_keys"
+SEGMENT_KEYS_INDEX = "index.csv"
+
+def _partition_name(name):
+    # Workspace, environment and segment names as directory and file names
+    return re.sub(r"[^\w.-]", "_", name)
+
+class _PartitionNames:
+    # Unique directory and file names within each directory. Names that only differ by the characters
+    # _partition_name replaces, or by case (for case-insensitive file systems), get the ID of the workspace or
+    # environment appended, or a number for segments, which have none
+    def __init__(self, reserved=()):
+        self._names = {}
+        self._taken = {("", name.lower()) for name in reserved}
+
+    def name(self, parent, name, id=None, extension=""):
+        if (parent, id or name) not in self._names:
+            base = _partition_name(name)
+            suffixes = ([f"_{_partition_name(id)}"] if id else []) + [f"_{number}" for number in range(2, len(self._names) + 3)]
+            for candidate in [base] + [base + suffix for suffix in suffixes]:
+                if (parent, (candidate + extension).lower()) not in self._taken:
+                    break
+            self._taken.add((parent, (candidate + extension).lower()))
+            self._names[(parent, id or name)] = candidate + extension
+        return self._names[(parent, id or name)]
+
+    def path(self, definition):
+        """
+        Returns the path of the keys file of a segment, relative to the export directory.
+        """
+        workspace_name = self.name("", definition["workspace"]["name"], definition["workspace"]["id"])
+        environment_name = self.name(workspace_name, definition["environment"]["name"], definition["environment"]["id"])
+        parent = os.path.join(workspace_name, environment_name)
+        return os.path.join(parent, self.name(parent, definition["name"], extension=".csv"))
+
+def _write_segment_keys_partition(definition, keys, directory, path):
+    os.makedirs(os.path.dirname(os.path.join(directory, path)), exist_ok=True)
+    file_name = os.path.join(directory, path)
+    export_segment_keys_to_csv(keys, file_name)
+    file_name = stream_utils.output_name(file_name)
+    return (definition["workspace"]["name"], definition["environment"]["name"], definition["name"], len(keys),
+            os.path.relpath(file_name, directory))
+
+def export_all_segments_keys(directory=None):
+    """
+    Export the keys of every segment of every workspace and environment, one CSV file per segment
+    (in the format of Export Segments Keys) under <workspace>/<environment>/ in the "segment_keys" directory,
+    with an index.csv listing the segments, their number of keys and their files.
+
+    The keys come from the segment keys store: only the segments that are not cached (or expired) are fetched,
+    a chunk at a time, while the files of the previous chunks are being written.
+
+    Args:
+        directory (str): The directory to write the files to, SEGMENT_KEYS_DIRECTORY by default.
+
+    Returns:
+        list: (workspace, environment, segment, keys, file) of each segment.
+    """
+    directory = directory or SEGMENT_KEYS_DIRECTORY
+    print(f"Exporting the keys of all segments to {directory}, please wait...")
+    segments_definitions = data_utils.get_all_segments_definitions()
+    segment_keys = list(segments_definitions)
+    futures = []
+    names = _PartitionNames(reserved=[SEGMENT_KEYS_INDEX])
+    # Writing and compressing the files releases the GIL for the most part, and the segment keys store
+    # is shared with the fetching thread, so the files are written by threads
+    with ThreadPoolExecutor(os.cpu_count() or 1) as executor:
+        for start in range(0, len(segment_keys), SEGMENT_KEYS_CHUNK):
+            chunk = {segment_key: segments_definitions[segment_key] for segment_key in segment_keys[start:start + SEGMENT_KEYS_CHUNK]}
+            for segment_key, keys in data_utils.get_segments_keys(chunk):
+                futures.append(executor.submit(
+                    _write_segment_keys_partition, chunk[segment_key], keys, directory, names.path(chunk[segment_key])
+                ))
+        partitions = sorted(future.result() for future in futures)
+
+    # The index itself is never compressed
+    with open(os.path.join(directory, SEGMENT_KEYS_INDEX), "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["workspace", "environment", "segment", "keys", "file"])
+        writer.writerows(partitions)
+    print(f"{sum(partition[3] for partition in partitions)} keys of {len(partitions)} segments exported to {directory} successfully!")
+    return partitions
+
+# Datasets written by export_all, as by their own export action: name -> getter
+DATASETS = {
+    "environments": data_utils.get_environments_data,
+    "feature_flags": data_utils.get_splits,
+    "flag_definitions": data_utils.get_all_splits_definitions,
+    "groups": data_utils.get_groups_users,
+    "segments_definitions": data_utils.get_all_segments_definitions,
+    "users": data_utils.get_all_users,
+    "workspaces": data_utils.get_workspace_data,
+}
+# Segments whose keys are fetched at once by export_all
+SEGMENT_KEYS_CHUNK = 100
+MANIFEST_FILE = "manifest.json"
+HASHES_FILE = "hashes.json"
+# The datasets being exported by export_all, and the entity hashes of the previous export for a delta export,
+# read by the worker processes (forked after they're set)
+_snapshot = {}
+_previous_hashes = {}
+
+class _SegmentKeysSnapshot(Mapping):
+    # The keys of the segments, read from the segment keys store one segment at a time while they are written
+    def __init__(self, segment_keys):
+        self._segment_keys = segment_keys
+
+    def __getitem__(self, segment_key):
+        return cache.cache_data["segment_keys"][segment_key]
+
+    def __iter__(self):
+        return iter(self._segment_keys)
+
+    def __len__(self):
+        return len(self._segment_keys)
+
+def _hash_default(value):
+    if isinstance(value, Set):
+        return sorted(value, key=str)
+    return str(value)
+
+def entity_hash(value):
+    """
+    Returns the content hash (hex) of an exported entity, e.g. a feature flag definition or the keys of a segment.
+    It doesn't depend on the order of the dictionary keys, nor on the export format, encoder or compression.
+    """
+    if isinstance(value, KeySet):
+        return value.digest()
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=_hash_default)
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+
+def _entries(data):
+    if isinstance(data, Mapping):
+        return data.items()
+    return ((str(index), item) for index, item in enumerate(data))
+
+def _export_dataset(data_type, directory):
+    # Writes a dataset (only its entities added or changed since the previous export for a delta export)
+    # while hashing its entities, in a single pass
+    started = time.perf_counter()
+    previous = _previous_hashes.get(data_type)
+    hashes = {}
+
+    def changed_entries():
+        for key, value in _entries(_snapshot[data_type]):
+            hashes[key] = entity_hash(value)
+            if previous is None or previous.get(key) != hashes[key]:
+                yield key, value
+
+    file_name = os.path.join(directory, f"{data_type}_data.{export_format}")
+    entries = stream_utils.export_json(stream_utils.Items(changed_entries()), file_name, json_lines=export_format == "jsonl")
+    file_name = stream_utils.output_name(file_name)
+    dataset = {
+        "file": os.path.basename(file_name),
+        "entries": entries,
+        "bytes": os.path.getsize(file_name),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    if previous is not None:
+        dataset["added"] = sum(1 for key in hashes if key not in previous)
+        dataset["changed"] = entries - dataset["added"]
+        dataset["deleted"] = sorted(key for key in previous if key not in hashes)
+    return data_type, dataset, hashes
+
+def _export_segment_keys(segments_definitions, directory):
+    # Fetch the keys that are not cached (or expired) a chunk at a time, then stream them from the store
+    segment_keys = list(segments_definitions)
+    for start in range(0, len(segment_keys), SEGMENT_KEYS_CHUNK):
+        chunk = segment_keys[start:start + SEGMENT_KEYS_CHUNK]
+        data_utils.prefetch_segments_keys({segment_key: segments_definitions[segment_key] for segment_key in chunk})
+    _snapshot["segment_keys"] = _SegmentKeysSnapshot(segment_keys)
+    return _export_dataset("segment_keys", directory)
+
+def _executor(workers):
+    # Encoding is CPU bound, so on Linux the datasets are written by forked processes, which share the snapshot
+    # without copying it. Elsewhere fork is unavailable or unsafe (macOS), and threads are used.
+    if sys.platform.startswith("linux"):
+        # The workers are forked on the first submit: the cache writer thread must be idle then, as a lock
+        # it holds would stay held in the workers
+        cache_utils.save_cache()
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+    return ThreadPoolExecutor(workers)
+
+def read_manifest(directory):
+    """
+    Returns the manifest of an export directory, None if it has none.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+def latest_export(parent="."):
+    """
+    Returns the most recent export directory (with a manifest) in a directory, None if there is none.
+    """
+    exports = []
+    for name in os.listdir(parent):
+        manifest = read_manifest(os.path.join(parent, name))
+        if manifest is not None:
+            exports.append((manifest["created_at"], os.path.join(parent, name)))
+    return max(exports)[1] if exports else None
+
+def _read_hashes(directory, manifest):
+    if not manifest.get("hashes"):
+        raise ValueError(f"The export {directory} has no entity hashes, a full export is needed first")
+    return dict(stream_utils.read_entries(os.path.join(directory, manifest["hashes"])))
+
+def export_all(directory=None, since=None):
+    """
+    Export every dataset (environments, feature flags and their definitions, groups, segment definitions and
+    keys, users and workspaces) at once, to a timestamped directory with a manifest.json listing the files
+    and a hashes.json with the content hash of every entity.
+
+    The data is taken from the cache at once (fetching what is expired), so the files are consistent with
+    each other, then the datasets are written concurrently.
+
+    With since, only the entities added or changed since that export are written (a delta export), and the
+    manifest lists the deleted ones. See assemble_export() to rebuild the full data.
+
+    Args:
+        directory (str): The directory to write the files to, "export_<date>_<time>" by default.
+        since (str): The directory of a previous (full or delta) export, to export the changes since.
+
+    Returns:
+        dict: The manifest.
+    """
+    started = time.perf_counter()
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    directory = directory or f"export_{created_at.astimezone():%Y%m%d_%H%M%S}"
+    _previous_hashes.clear()
+    if since is not None:
+        _previous_hashes.update(_read_hashes(since, read_manifest(since) or {}))
+    os.makedirs(directory, exist_ok=True)
+    print(f"Exporting {'the changes since ' + since if since else 'all data'} to {directory}, please wait...")
+
+    _snapshot.clear()
+    _snapshot.update({data_type: data_getter() for data_type, data_getter in DATASETS.items()})
+    datasets = {}
+    hashes = {}
+    try:
+        with ThreadPoolExecutor(1) as keys_executor, _executor(min(len(DATASETS), os.cpu_count() or 1)) as executor:
+            futures = [executor.submit(_export_dataset, data_type, directory) for data_type in DATASETS]
+            futures.append(keys_executor.submit(_export_segment_keys, _snapshot["segments_definitions"], directory))
+            for future in futures:
+                data_type, dataset, hashes[data_type] = future.result()
+                datasets[data_type] = dataset
+                if since is None:
+                    print(f"  - {data_type}: {dataset['entries']} entries")
+                else:
+                    print(f"  - {data_type}: {dataset['added']} added, {dataset['changed']} changed, {len(dataset['deleted'])} deleted")
+    finally:
+        _snapshot.clear()
+        _previous_hashes.clear()
+
+    hashes_file = os.path.join(directory, HASHES_FILE)
+    stream_utils.export_json(dict(sorted(hashes.items())), hashes_file, indent=None)
+    manifest = {
+        "created_at": created_at.isoformat(),
+        "type": "full" if since is None else "delta",
+        "format": export_format,
+        "encoder": stream_utils.get_encoder(),
+        "compression": stream_utils.get_compression(),
+        "seconds": round(time.perf_counter() - started, 3),
+        "hashes": os.path.basename(stream_utils.output_name(hashes_file)),
+        "datasets": dict(sorted(datasets.items())),
+    }
+    if since is not None:
+        # The previous export, relative to this one so they can be moved together
+        manifest["base"] = os.path.relpath(since, directory)
+    # The manifest itself is never compressed
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as file:
+        stream_utils.write_json(manifest, file)
+    print(f"{'Changes' if since else 'All data'} exported to {directory} successfully!")
+    return manifest
+
+def export_delta():
+    """
+    Export the entities added, changed or deleted since the latest export (full or delta) of the current
+    directory, or all data if there is none.
+
+    Returns:
+        Output to stdout
+    """
+    since = latest_export()
+    if since is None:
+        print("No previous export found, exporting all data.")
+    try:
+        export_all(since=since)
+    except ValueError as e:
+        print(e)
+
+def assemble_export(directory, output_directory=None):
+    """
+    Rebuilds the full data of a delta export, from it and the exports it's based on back to a full export,
+    reading each file once and writing each entity from the most recent export that has it.
+
+    Args:
+        directory (str): The delta (or full) export directory.
+        output_directory (str): Where to write the full export, "<directory>_full" by default.
+
+    Returns:
+        dict: The manifest of the full export.
+    """
+    chain = []
+    current = directory
+    while True:
+        manifest = read_manifest(current)
+        if manifest is None:
+            raise ValueError(f"{current} is not an export directory (no {MANIFEST_FILE})")
+        chain.append((current, manifest))
+        if manifest.get("type") != "delta":
+            break
+        current = os.path.normpath(os.path.join(current, manifest["base"]))
+    output_directory = output_directory or os.path.normpath(directory) + "_full"
+    os.makedirs(output_directory, exist_ok=True)
+    print(f"Assembling {directory} from {len(chain)} exports to {output_directory}, please wait...")
+
+    def entries(data_type):
+        # An entity deleted in an export is skipped in the older ones
+        seen, deleted = set(), set()
+        for export_directory, manifest in chain:
+            dataset = manifest["datasets"].get(data_type)
+            if dataset is None:
+                continue
+            for key, value in stream_utils.read_entries(os.path.join(export_directory, dataset["file"])):
+                if key not in seen and key not in deleted:
+                    seen.add(key)
+                    yield key, value
+            deleted.update(dataset.get("deleted", []))
+
+    datasets = {}
+    for data_type in chain[0][1]["datasets"]:
+        file_name = os.path.join(output_directory, f"{data_type}_data.{export_format}")
+        count = stream_utils.export_json(stream_utils.Items(entries(data_type)), file_name, json_lines=export_format == "jsonl")
+        file_name = stream_utils.output_name(file_name)
+        datasets[data_type] = {"file": os.path.basename(file_name), "entries": count, "bytes": os.path.getsize(file_name)}
+        print(f"  - {data_type}: {count} entries")
+
+    # The hashes of the delta export are those of all the data
+    hashes_file = os.path.join(output_directory, HASHES_FILE)
+    stream_utils.export_json(_read_hashes(directory, chain[0][1]), hashes_file, indent=None)
+    manifest = {
+        "created_at": chain[0][1]["created_at"],
+        "type": "full",
+        "format": export_format,
+        "encoder": stream_utils.get_encoder(),
+        "compression": stream_utils.get_compression(),
+        "hashes": os.path.basename(stream_utils.output_name(hashes_file)),
+        "datasets": datasets,
+        "assembled_from": [os.path.relpath(export_directory, output_directory) for export_directory, _ in chain],
+    }
+    with open(os.path.join(output_directory, MANIFEST_FILE), "w", encoding="utf-8") as file:
+        stream_utils.write_json(manifest, file)
+    print(f"Full export assembled in {output_directory} successfully!")
+    return manifest
@@ -0,0 +1,70 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+def configure_logging(debug=False):
+    if debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.WARNING)
+
+DEFAULT_MAX_WORKERS = 8
+_max_workers = None
+
+def set_max_workers(workers):
+    """
+    Override the number of concurrent API requests used when crawling the org.
+
+    Args:
+        workers (int): Number of worker threads, at least 1.
+    """
+    global _max_workers
+    _max_workers = max(1, int(workers))
+
+def get_max_workers():
+    """
+    Returns the configured worker count: the value set with set_max_workers(), then the
+    ADMIN_API_MAX_WORKERS environment variable, then DEFAULT_MAX_WORKERS.
+    """
+    if _max_workers is not None:
+        return _max_workers
+    try:
+        return max(1, int(os.environ.get("ADMIN_API_MAX_WORKERS", DEFAULT_MAX_WORKERS)))
+    except ValueError:
+        logger.warning("Invalid ADMIN_API_MAX_WORKERS value, using %s", DEFAULT_MAX_WORKERS)
+        return DEFAULT_MAX_WORKERS
+
+def fetch_all(fetch, tasks, desc, leave=True):
+    """
+    Calls fetch(*task) for every task on a bounded thread pool and yields (task, result) pairs
+    in completion order, advancing a progress bar as each task finishes.
+
+    The results are handed back to the calling thread so callers can update the cache without
+    any locking. If a task raises, the pending tasks are cancelled and the exception propagates.
+
+    Args:
+        fetch (function): The function doing the API calls for one task.
+        tasks (list): A list of argument tuples, one per call.
+        desc (str): The progress bar description.
+        leave (bool): Whether to keep the progress bar on screen once done.
+
+    Returns:
+        A generator of (task, result) tuples.
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return
+    workers = min(get_max_workers(), len(tasks)) or 1
+    logger.debug(f"Fetching {len(tasks)} tasks with {workers} workers: {desc}")
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        with tqdm(total=len(tasks), desc=desc, ncols=100, leave=leave) as pbar:
+            futures = {executor.submit(fetch, *task): task for task in tasks}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+                pbar.update(1)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,708 @@
+import re
+import heapq
+import logging
+import time
+from array import array
+from collections import Counter, defaultdict
+import cache
+import cache_utils
+import data_utils
+from key_set import KeySet
+
+logger = logging.getLogger(__name__)
+
+def configure_logging(debug=False):
+    if debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.WARNING)
+
+# Index name -> (the maps it was built from, the index)
+_indexes = {}
+
+def get_index(name, build, *sources):
+    """
+    Returns an index built from cached maps, building it again only if one of the maps was replaced since.
+
+    The cached maps (e.g. all_splits_definitions, splits or users) are never changed in place: loading,
+    fetching expired data and refreshing the cache all build new maps. So an index stays up to date as
+    long as it was built from the current maps.
+
+    Args:
+        name (str): The index name.
+        build (function): Builds the index from the maps.
+        sources (dict): The maps the index is built from.
+
+    Returns:
+        The index.
+    """
+    cached = _indexes.get(name)
+    if cached is None or len(cached[0]) != len(sources) or any(a is not b for a, b in zip(cached[0], sources)):
+        started = time.perf_counter()
+        _indexes[name] = (sources, build(*sources))
+        logger.debug(f"Built the {name} index in {time.perf_counter() - started:.3f}s")
+    return _indexes[name][1]
+
+def build_name_index(definitions):
+    """
+    Groups definitions by flag or segment name.
+
+    Args:
+        definitions (dict): Definitions keyed by "name.environment_id.workspace_id".
+
+    Returns:
+        dict: The list of the definitions (across workspaces and environments) of each name.
+    """
+    index = {}
+    for definition in definitions.values():
+        index.setdefault(definition["name"], []).append(definition)
+    return index
+
+def splits_definitions_by_name():
+    """
+    Returns the feature flag definitions of every environment grouped by flag name.
+    """
+    return get_index("splits_definitions_by_name", build_name_index, data_utils.get_all_splits_definitions())
+
+def segments_definitions_by_name():
+    """
+    Returns the segment definitions of every environment grouped by segment name.
+    """
+    return get_index("segments_definitions_by_name", build_name_index, data_utils.get_all_segments_definitions())
+
+_SEPARATORS = re.compile(r"[\W_]+")
+
+def trigrams(text):
+    """
+    Returns the trigrams of a text, lowercased and with punctuation and underscores read as spaces,
+    padded so the start and the end of the text (and of each word) have trigrams of their own.
+    """
+    text = "  " + _SEPARATORS.sub(" ", text.lower()).strip() + " "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TrigramIndex:
+    """
+    A fuzzy search index: every item is indexed under the trigrams of its name and, separately, of its other
+    texts (e.g. description, tags, email). A search only scores the items whose name is closest to the query
+    by shared trigrams, plus those sharing the most trigrams with it in their other texts, so it takes
+    milliseconds even with hundreds of thousands of items. It tolerates typos since a typo only changes a
+    few trigrams.
+    """
+
+    def __init__(self):
+        self._items = []
+        self._name_sizes = array("I")
+        self._name_postings = defaultdict(list)
+        self._text_postings = defaultdict(list)
+        # Texts are often shared (tags, owners), their trigrams are only computed once
+        self._trigrams = {}
+
+    def _text_trigrams(self, text):
+        if text not in self._trigrams:
+            self._trigrams[text] = trigrams(text)
+        return self._trigrams[text]
+
+    def add(self, item, name, texts=()):
+        """
+        Args:
+            item: What a search returns for this entry.
+            name (str): The name the entry is mainly searched by.
+            texts (list): Other texts it can be found by.
+        """
+        name = (name or "").lower()
+        texts = [text.lower() for text in texts if text]
+        item_id = len(self._items)
+        self._items.append((item, name, texts))
+        name_trigrams = trigrams(name)
+        self._name_sizes.append(len(name_trigrams))
+        for trigram in name_trigrams:
+            self._name_postings[trigram].append(item_id)
+        text_trigrams = set()
+        for text in texts:
+            text_trigrams |= self._text_trigrams(text)
+        for trigram in text_trigrams:
+            self._text_postings[trigram].append(item_id)
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def _similarity(query, query_trigrams, text):
+        if query == text:
+            return 1.0
+        if query in text:
+            # Substrings score between 0.6 and 0.9, the more of the text they cover the better
+            return 0.6 + 0.3 * len(query) / len(text)
+        text_trigrams = trigrams(text)
+        return 0.6 * len(query_trigrams & text_trigrams) / len(query_trigrams | text_trigrams)
+
+    def score(self, query, query_trigrams, name, texts):
+        """
+        Scores an entry between 0 and 1: 1 for its exact name, then substrings of the name, then names sharing
+        trigrams with the query (typos). A match on the other texts counts for less than one on the name.
+        """
+        score = self._similarity(query, query_trigrams, name)
+        for text in texts:
+            score = max(score, 0.8 * self._similarity(query, query_trigrams, text))
+        return score
+
+    def _candidates(self, query_trigrams, count):
+        name_shared = Counter()
+        text_shared = Counter()
+        for trigram in query_trigrams:
+            name_shared.update(self._name_postings.get(trigram, ()))
+            text_shared.update(self._text_postings.get(trigram, ()))
+        size = len(query_trigrams)
+        sizes = self._name_sizes
+        # The names closest to the query (Jaccard index of their trigrams), and the items with the most
+        # trigrams of the query in their other texts
+        candidates = set(heapq.nlargest(
+            count, name_shared, key=lambda item_id: name_shared[item_id] / (size + sizes[item_id] - name_shared[item_id])
+        ))
+        candidates.update(item_id for item_id, _ in text_shared.most_common(count))
+        return candidates
+
+    def search(self, query, limit=20, min_score=0.15, accept=None):
+        """
+        Returns the best matches of a query, best first.
+
+        Args:
+            query (str): A name, part of a name (or of another text), possibly misspelled.
+            limit (int): The maximum number of matches.
+            min_score (float): The lowest score returned.
+            accept (function): Filters the items, e.g. to search only one type of item.
+
+        Returns:
+            list: (item, score) tuples.
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        query_trigrams = trigrams(query)
+        matches = []
+        for item_id in self._candidates(query_trigrams, max(200, 10 * limit)):
+            item, name, texts = self._items[item_id]
+            if accept is not None and not accept(item):
+                continue
+            score = self.score(query, query_trigrams, name, texts)
+            if score >= min_score:
+                matches.append((score, name, item_id))
+        matches.sort(key=lambda match: (-match[0], match[1], match[2]))
+        return [(self._items[item_id][0], score) for score, _, item_id in matches[:limit]]
+
+def _tag_names(tags):
+    return [tag["name"] if isinstance(tag, dict) else str(tag) for tag in tags or []]
+
+def build_search_index(splits, segments, users, topology):
+    """
+    Builds the fuzzy search index of the feature flags (by name, description, tags and owners' emails),
+    segments (by name, description and tags), users (by name and email) and environments (by name).
+
+    Returns:
+        TrigramIndex: The items are dictionaries with the "type", "name" and "workspace" of the entity,
+        and its cached "data".
+    """
+    index = TrigramIndex()
+    for split_name, split_data_list in splits.items():
+        for split_data in split_data_list:
+            texts = [split_data.get("description")] + _tag_names(split_data.get("tags"))
+            texts += [owner["email"] for owner in split_data.get("owners", []) if owner.get("email")]
+            item = {"type": "feature flag", "name": split_name, "workspace": split_data.get("workspace_name"), "data": split_data}
+            index.add(item, split_name, texts)
+    for workspace_name, workspace_segments in segments.items():
+        for segment_name, segment_data in workspace_segments.items():
+            texts = [segment_data.get("description")] + _tag_names(segment_data.get("tags"))
+            item = {"type": "segment", "name": segment_name, "workspace": workspace_name, "data": segment_data}
+            index.add(item, segment_name, texts)
+    for user_name, user_data in users.items():
+        item = {"type": "user", "name": user_name, "workspace": None, "data": user_data}
+        index.add(item, user_name, [user_data.get("Email")])
+    for environment_data in topology["environments"].values():
+        item = {"type": "environment", "name": environment_data["name"], "workspace": environment_data["WorkspaceName"], "data": environment_data}
+        index.add(item, environment_data["name"])
+    return index
+
+def search_index():
+    """
+    Returns the fuzzy search index of the cached flags, segments, users and environments.
+    """
+    return get_index(
+        "search", build_search_index,
+        data_utils.get_splits(), data_utils.get_segments(), data_utils.get_all_users(), data_utils.get_topology(),
+    )
+
+def fuzzy_search(query, types=None, limit=20):
+    """
+    Searches the flags, segments, users and environments whose name (or description, tags, email)
+    matches the query exactly, partially or with typos.
+
+    Args:
+        query (str): What to search.
+        types (set): Only return these types of entities ("feature flag", "segment", "user", "environment").
+        limit (int): The maximum number of results.
+
+    Returns:
+        list: (item, score) tuples, best first, see build_search_index() for the items.
+    """
+    accept = None if types is None else (lambda item: item["type"] in types)
+    return search_index().search(query, limit=limit, accept=accept)
+
+class KeyMembershipIndex:
+    """
+    A reverse index from a key (e.g. a user ID) to everything that contains it: segments, and feature flag
+    treatments that target it individually.
+
+    Every source (a segment in an environment, or a flag definition) is indexed under a version, and only the
+    sources whose version changed are read again on update(). Their keys go to a small delta (a KeySet per
+    reference), and the references they replace are marked dead. When the delta grows, it is merged with the
+    main index: a KeySet of all the keys, with the IDs of the references of each key in one array (the keys
+    are stored once, however many references they have).
+    """
+
+    def __init__(self, max_delta_keys=200000, max_delta_sets=100):
+        self.max_delta_keys = max_delta_keys
+        self.max_delta_sets = max_delta_sets
+        # Reference ID -> reference, the IDs being renumbered on merge() to drop the dead references
+        self._refs = []
+        # Source -> (version, its reference IDs)
+        self._sources = {}
+        self._keys = KeySet()
+        self._ref_offsets = array("I", [0])
+        self._ref_ids = array("I")
+        self._delta = {}
+        self._delta_keys = 0
+        self._dead = set()
+
+    def versions(self):
+        """
+        Returns the version of every indexed source.
+        """
+        return {source: version for source, (version, _) in self._sources.items()}
+
+    def update(self, changed, removed=()):
+        """
+        Indexes new or changed sources, and drops removed ones.
+
+        Args:
+            changed (dict): Source -> (version, [(reference, keys)]).
+            removed (iterable): The sources that no longer exist.
+        """
+        for source in list(removed) + list(changed):
+            if source in self._sources:
+                _, ref_ids = self._sources.pop(source)
+                self._dead.update(ref_ids)
+                for ref_id in ref_ids:
+                    self._delta_keys -= len(self._delta.pop(ref_id, ()))
+        for source, (version, members) in changed.items():
+            ref_ids = []
+            for ref, keys in members:
+                keys = keys if isinstance(keys, KeySet) else KeySet(keys)
+                if not keys:
+                    continue
+                ref_ids.append(len(self._refs))
+                self._refs.append(ref)
+                self._delta[ref_ids[-1]] = keys
+                self._delta_keys += len(keys)
+            self._sources[source] = (version, ref_ids)
+        if (self._delta_keys > self.max_delta_keys or len(self._delta) > self.max_delta_sets
+                or len(self._dead) > len(self._ref_ids) // 4 + self.max_delta_sets):
+            self.merge()
+
+    def merge(self):
+        """
+        Merges the delta into the main index, and drops the dead references from it. The live references
+        get new consecutive IDs, so the references don't grow with every update.
+        """
+        started = time.perf_counter()
+        dead = self._dead
+        new_ids = {}
+        refs = []
+        for ref_id, ref in enumerate(self._refs):
+            if ref_id not in dead:
+                new_ids[ref_id] = len(refs)
+                refs.append(ref)
+        members = defaultdict(list)
+        ref_offsets, ref_ids = self._ref_offsets, self._ref_ids
+        for position, key in enumerate(self._keys):
+            for ref_id in ref_ids[ref_offsets[position]:ref_offsets[position + 1]]:
+                if ref_id not in dead:
+                    members[key].append(new_ids[ref_id])
+        for ref_id, keys in self._delta.items():
+            new_id = new_ids[ref_id]
+            for key in keys:
+                members[key].append(new_id)
+        self._keys = KeySet(members)
+        self._ref_offsets = array("I", [0])
+        self._ref_ids = array("I")
+        for key in self._keys:
+            self._ref_ids.extend(members[key])
+            self._ref_offsets.append(len(self._ref_ids))
+        self._refs = refs
+        self._sources = {
+            source: (version, [new_ids[ref_id] for ref_id in source_ref_ids])
+            for source, (version, source_ref_ids) in self._sources.items()
+        }
+        self._delta = {}
+        self._delta_keys = 0
+        self._dead = set()
+        logger.debug(f"Merged the key index ({len(self._keys)} keys, {len(self._ref_ids)} references) "
+                     f"in {time.perf_counter() - started:.3f}s")
+
+    def lookup(self, key):
+        """
+        Returns the references that contain a key.
+        """
+        refs = []
+        position = self._keys.index(key)
+        if position >= 0:
+            for ref_id in self._ref_ids[self._ref_offsets[position]:self._ref_offsets[position + 1]]:
+                if ref_id not in self._dead:
+                    refs.append(self._refs[ref_id])
+        for ref_id, keys in self._delta.items():
+            if key in keys:
+                refs.append(self._refs[ref_id])
+        return refs
+
+_key_index = KeyMembershipIndex()
+
+def _segment_keys_fetched_at(segment_key):
+    # When the cached keys of a segment were fetched, None if they are not cached
+    segment_keys = cache.cache_data["segment_keys"]
+    return segment_keys.fetched_at(segment_key) if hasattr(segment_keys, "fetched_at") else None
+
+def _is_segment_stale(segment_key, indexed_version):
+    # The index holds its own copy of the keys of a segment, versioned by when they were fetched: it's only
+    # stale once that expired, or if the keys were fetched again since. Segments dropped from the cache to
+    # stay within its limits don't count as changed.
+    if indexed_version is None or cache_utils.is_expired("segment_keys", fetched_at=indexed_version):
+        return True
+    fetched_at = _segment_keys_fetched_at(segment_key)
+    return fetched_at is not None and fetched_at != indexed_version
+
+def update_key_index():
+    """
+    Brings the key index up to date with the cached segment keys and feature flag definitions: indexes the
+    segments and flags added or changed since the last update, and the segments whose indexed keys expired
+    (fetching their keys only if the cached ones expired too, or were evicted).
+
+    Returns:
+        KeyMembershipIndex: The index.
+    """
+    indexed = _key_index.versions()
+    changed = {}
+
+    segments_definitions = data_utils.get_all_segments_definitions()
+    stale = {
+        segment_key: definition for segment_key, definition in segments_definitions.items()
+        if _is_segment_stale(segment_key, indexed.get(("segment", segment_key)))
+    }
+    for segment_key, keys in data_utils.get_segments_keys(stale):
+        definition = stale[segment_key]
+        ref = ("segment", definition["name"], definition["workspace"]["name"], definition["environment"]["name"], None)
+        changed[("segment", segment_key)] = (_segment_keys_fetched_at(segment_key), [(ref, keys)])
+
+    splits_definitions = data_utils.get_all_splits_definitions()
+    for split_key, definition in splits_definitions.items():
+        version = (definition.get("creationTime"), definition.get("lastUpdateTime"))
+        if indexed.get(("feature flag", split_key)) == version:
+            continue
+        changed[("feature flag", split_key)] = (version, [
+            (("feature flag", definition["name"], definition["workspace"], definition["environment"]["name"], treatment["name"]),
+             treatment.get("keys") or ())
+            for treatment in definition.get("treatments", [])
+        ])
+
+    current = {("segment", segment_key) for segment_key in segments_definitions}
+    current.update(("feature flag", split_key) for split_key in splits_definitions)
+    removed = [source for source in indexed if source not in current]
+    if changed or removed:
+        _key_index.update(changed, removed)
+        logger.debug(f"Key index: {len(changed)} sources indexed, {len(removed)} removed")
+    return _key_index
+
+def key_memberships(key):
+    """
+    Returns the segments that contain a key, and the feature flag treatments that target it individually,
+    across all workspaces and environments.
+
+    Args:
+        key (str): The key, e.g. a user ID.
+
+    Returns:
+        list: (type, name, workspace name, environment name, treatment) tuples, type being "segment" or
+        "feature flag" and treatment None for segments.
+    """
+    return update_key_index().lookup(key)
+
+def _matchers(definition):
+    for rule in definition.get("rules") or []:
+        for matcher in (rule.get("condition") or {}).get("matchers") or []:
+            yield matcher
+
+def build_dependency_index(definitions):
+    """
+    Builds the graph of what the feature flag definitions reference: the segments their rules (IN_SEGMENT and
+    IN_LARGE_SEGMENT matchers) and treatments (individually targeted segments) use, and the flags their rules
+    depend on (IN_SPLIT matchers).
+
+    Args:
+        definitions (dict): Feature flag definitions, as returned by data_utils.get_all_splits_definitions().
+
+    Returns:
+        dict: ("segment" or "feature flag", name) -> list of (workspace name, environment name, referencing
+        flag name, how it's referenced) tuples.
+    """
+    index = defaultdict(list)
+    for definition in definitions.values():
+        ref = (definition["workspace"], definition["environment"]["name"], definition["name"])
+        for matcher in _matchers(definition):
+            if matcher.get("type") in ("IN_SEGMENT", "IN_LARGE_SEGMENT"):
+                segment_names = matcher.get("strings") or [matcher.get("string")]
+                for segment_name in filter(None, segment_names):
+                    index[("segment", segment_name)].append(ref + (f"{matcher['type']} rule",))
+            elif matcher.get("depends"):
+                depends = matcher["depends"]
+                treatments = ", ".join(depends.get("treatments") or [])
+                index[("feature flag", depends.get("splitName"))].append(ref + (f"{matcher['type']} rule on treatments {treatments}",))
+        for treatment in definition.get("treatments") or []:
+            for segment_name in treatment.get("segments") or []:
+                index[("segment", segment_name)].append(ref + (f"treatment {treatment['name']} target",))
+    return dict(index)
+
+def dependency_index():
+    """
+    Returns the dependency graph of the cached feature flag definitions, see build_dependency_index().
+    """
+    return get_index("dependencies", build_dependency_index, data_utils.get_all_splits_definitions())
+
+def references(entity_type, name, workspace_name=None):
+    """
+    Returns the feature flag definitions that reference a segment or a feature flag.
+
+    Args:
+        entity_type (str): "segment" or "feature flag".
+        name (str): The segment or feature flag name.
+        workspace_name (str): Only return the references within this workspace.
+
+    Returns:
+        list: (workspace name, environment name, referencing flag name, how it's referenced) tuples.
+    """
+    refs = dependency_index().get((entity_type, name), [])
+    if workspace_name is not None:
+        refs = [ref for ref in refs if ref[0] == workspace_name]
+    return refs
+
+def matcher_values(matcher):
+    """
+    Returns the literal values a targeting rule matcher compares with, whatever their field, as strings.
+    """
+    values = []
+    for field in ("string", "bool", "number", "date"):
+        if matcher.get(field) is not None:
+            values.append(matcher[field])
+    for field in ("strings", "set"):
+        value = matcher.get(field)
+        if value is not None:
+            values.extend(value if isinstance(value, (list, tuple)) else [value])
+    between = matcher.get("between")
+    if isinstance(between, dict):
+        values.extend(value for value in between.values() if value is not None)
+    depends = matcher.get("depends")
+    if isinstance(depends, dict):
+        values.append(depends.get("splitName"))
+        values.extend(depends.get("treatments") or [])
+    return [str(value) for value in values if value is not None]
+
+def matcher_attribute(matcher):
+    """
+    Returns the attribute a targeting rule matcher uses, None for the key. It can be in the matcher itself,
+    or in its keySelector in older definitions.
+    """
+    return matcher.get("attribute") or (matcher.get("keySelector") or {}).get("attribute")
+
+def build_rule_index(definitions):
+    """
+    Builds the index of the targeting rules of the feature flag definitions: the matcher types, the attributes
+    and the literal values (strings, numbers, dates, segments and flags) they use, case insensitively.
+
+    Args:
+        definitions (dict): Feature flag definitions, as returned by data_utils.get_all_splits_definitions().
+
+    Returns:
+        dict: ("matcher", type), ("attribute", name) or ("value", value), all lowercase -> list of (workspace
+        name, environment name, flag name, rule number, matcher type, attribute, values) tuples.
+    """
+    index = defaultdict(list)
+    for definition in definitions.values():
+        for rule_number, rule in enumerate(definition.get("rules") or [], 1):
+            for matcher in (rule.get("condition") or {}).get("matchers") or []:
+                matcher_type = matcher.get("type")
+                attribute = matcher_attribute(matcher)
+                values = matcher_values(matcher)
+                hit = (definition["workspace"], definition["environment"]["name"], definition["name"], rule_number, matcher_type, attribute, tuple(values))
+                terms = {("value", value.lower()) for value in values}
+                if matcher_type:
+                    terms.add(("matcher", matcher_type.lower()))
+                if attribute:
+                    terms.add(("attribute", attribute.lower()))
+                for term in terms:
+                    index[term].append(hit)
+    return dict(index)
+
+def rule_index():
+    """
+    Returns the index of the targeting rules of the cached feature flag definitions, see build_rule_index().
+    """
+    return get_index("rules", build_rule_index, data_utils.get_all_splits_definitions())
+
+def rule_matches(text, kinds=("attribute", "value", "matcher")):
+    """
+    Returns the targeting rules, across all cached feature flag definitions, that use an attribute, compare
+    with a value, or use a type of matcher, e.g. the attribute plan, the string acme-corp or IN_SEGMENT.
+
+    Args:
+        text (str): The attribute, value or matcher type, case insensitive. It can be prefixed with "attribute:",
+            "value:" or "matcher:" to only search one of them.
+        kinds (tuple): What the text can be, among "attribute", "value" and "matcher".
+
+    Returns:
+        list: (what matched, workspace name, environment name, flag name, rule number, matcher type, attribute,
+        values) tuples, sorted.
+    """
+    index = rule_index()
+    kind, _, rest = text.partition(":")
+    if rest and kind.strip().lower() in kinds:
+        kinds, text = (kind.strip().lower(),), rest
+    text = text.strip().lower()
+    matches = [(kind,) + hit for kind in kinds for hit in index.get((kind, text), [])]
+    return sorted(matches, key=lambda match: match[:6] + (match[6] or "",))
+
+def build_catalog(topology, groups, users):
+    """
+    Builds the catalog of the org's workspaces, environments, groups and users, with the secondary indexes
+    used to look them up without calling the API.
+
+    Args:
+        topology (dict): As returned by data_utils.get_topology().
+        groups (dict): As returned by data_utils.get_groups().
+        users (dict): As returned by data_utils.get_all_users().
+
+    Returns:
+        dict: "users_by_email" (lowercased email -> user data), "workspaces_by_name" (name -> workspace data),
+        "groups_by_name" (name -> {"id", "name"}), "group_users" (group ID -> names of its users),
+        "environments_by_name" (name -> list of environment data) and "by_id" (ID -> (type, data)).
+    """
+    catalog = {
+        "users_by_email": {},
+        "workspaces_by_name": {},
+        "groups_by_name": {},
+        "group_users": defaultdict(list),
+        "environments_by_name": defaultdict(list),
+        "by_id": {},
+    }
+    for workspace in topology["workspaces"].values():
+        catalog["workspaces_by_name"][workspace["name"]] = workspace
+        catalog["by_id"][workspace["id"]] = ("workspace", workspace)
+    for environment in topology["environments"].values():
+        catalog["environments_by_name"][environment["name"]].append(environment)
+        catalog["by_id"][environment["id"]] = ("environment", environment)
+    for group_id, group_name in groups.items():
+        group = {"id": group_id, "name": group_name}
+        catalog["groups_by_name"][group_name] = group
+        catalog["by_id"][group_id] = ("group", group)
+    for user in users.values():
+        if user.get("Email"):
+            catalog["users_by_email"][user["Email"].lower()] = user
+        catalog["by_id"][user["ID"]] = ("user", user)
+        for group in user["Groups"]:
+            catalog["group_users"][group["ID"]].append(user["Name"])
+    catalog["environments_by_name"] = dict(catalog["environments_by_name"])
+    catalog["group_users"] = dict(catalog["group_users"])
+    return catalog
+
+def catalog():
+    """
+    Returns the catalog of the cached workspaces, environments, groups and users, see build_catalog().
+    """
+    return get_index("catalog", build_catalog, data_utils.get_topology(), data_utils.get_groups(), data_utils.get_all_users())
+
+def _stale(section):
+    # Something exists that the cache doesn't know about, fetch the section again next time
+    cache.cache_data[section] = None
+    cache_utils.mark_dirty(section)
+
+def find_user(email):
+    """
+    Finds a user by email (case insensitive) in the catalog, or with the API if it's not cached.
+
+    Returns:
+        dict: The user data (see data_utils.user_to_dict), None if there is no such user.
+    """
+    user = catalog()["users_by_email"].get(email.lower())
+    if user is None:
+        logger.debug(f"User {email} not cached, looking it up with the API")
+        found = data_utils.client.users.find(email)
+        if found:
+            user = data_utils.user_to_dict(found, data_utils.get_groups())
+            _stale("users")
+    return user
+
+def find_workspace(name):
+    """
+    Finds a workspace by name in the catalog, or with the API if it's not cached.
+
+    Returns:
+        dict: The workspace data ({"id", "name", "requiresTitleAndComments"}), None if there is no such workspace.
+    """
+    workspace = catalog()["workspaces_by_name"].get(name)
+    if workspace is None:
+        logger.debug(f"Workspace {name} not cached, looking it up with the API")
+        found = data_utils.client.workspaces.find(name)
+        if found:
+            workspace = {"id": found.id, "name": found.name, "requiresTitleAndComments": found._requiresTitleAndComments}
+            _stale("topology")
+    return workspace
+
+def find_group(name):
+    """
+    Finds a group by name in the catalog, or with the API if it's not cached.
+
+    Returns:
+        dict: The group {"id", "name"}, None if there is no such group.
+    """
+    group = catalog()["groups_by_name"].get(name)
+    if group is None:
+        logger.debug(f"Group {name} not cached, looking it up with the API")
+        found = data_utils.client.groups.find(name)
+        if found:
+            group = {"id": found._id, "name": found._name}
+            _stale("groups")
+    return group
+
+def group_users(group_id):
+    """
+    Returns the names of the users in a group, from the catalog.
+    """
+    return catalog()["group_users"].get(group_id, [])
+
+def find_environments(name):
+    """
+    Returns the environments with a name across all workspaces, from the catalog.
+    """
+    return catalog()["environments_by_name"].get(name, [])
+
+def find_by_id(entity_id):
+    """
+    Returns the (type, data) of the workspace, environment, group or user with an ID, None if it's not cached.
+    """
+    return catalog()["by_id"].get(entity_id)
+
+def build_indexes():
+    """
+    Builds the indexes of the cached data up front (e.g. once the cache is loaded or refreshed),
+    so the first search doesn't have to.
+    """
+    splits_definitions_by_name()
+    segments_definitions_by_name()
+    dependency_index()
+    rule_index()
@@ -0,0 +1,114 @@
+import zlib
+import hashlib
+from array import array
+from collections.abc import Set
+
+class KeySet(Set):
+    """
+    An immutable set of segment keys (strings) stored compactly.
+
+    The keys are sorted, deduplicated and concatenated in a single UTF-8 bytes string, with an array
+    of their offsets. That takes a fraction of the memory of a list of str (no object per key), and a
+    membership test is a binary search without creating any string. When pickled (e.g. in the cache
+    database), both are compressed.
+
+    It behaves like a read only set (len, in, iteration in sorted order, comparisons and set operations),
+    build a list with to_list() only when one is really needed.
+    """
+
+    __slots__ = ("_data", "_offsets")
+
+    def __init__(self, keys=()):
+        """
+        Args:
+            keys (iterable): The keys, in any order and possibly with duplicates.
+        """
+        # The UTF-8 bytes order is the same as the str order, so the keys can be searched as bytes
+        encoded = [key.encode("utf-8") for key in sorted(set(keys))]
+        self._data = b"".join(encoded)
+        self._offsets = array("I" if len(self._data) < 2 ** 32 else "Q", [0])
+        position = 0
+        for key in encoded:
+            position += len(key)
+            self._offsets.append(position)
+
+    @classmethod
+    def _from_iterable(cls, keys):
+        return cls(keys)
+
+    def _key(self, index):
+        return self._data[self._offsets[index]:self._offsets[index + 1]]
+
+    def index(self, key):
+        """
+        Returns the position of a key in the sorted keys, -1 if it's not in the set.
+        """
+        if not isinstance(key, str):
+            return -1
+        key = key.encode("utf-8")
+        low, high = 0, len(self._offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(self._offsets) - 1 and self._key(low) == key else -1
+
+    def __contains__(self, key):
+        return self.index(key) >= 0
+
+    def __iter__(self):
+        data, offsets = self._data, self._offsets
+        for index in range(len(offsets) - 1):
+            yield data[offsets[index]:offsets[index + 1]].decode("utf-8")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __eq__(self, other):
+        if isinstance(other, KeySet):
+            return self._data == other._data and list(self._offsets) == list(other._offsets)
+        return Set.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"KeySet({len(self)} keys)"
+
+    def __getstate__(self):
+        return self._offsets.typecode, zlib.compress(self._data, 1), zlib.compress(self._offsets.tobytes(), 1)
+
+    def __setstate__(self, state):
+        typecode, data, offsets = state
+        self._data = zlib.decompress(data)
+        self._offsets = array(typecode)
+        self._offsets.frombytes(zlib.decompress(offsets))
+
+    def digest(self):
+        """
+        Returns a hash of the keys (hex), computed from the compact representation without decoding any key.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self._data)
+        digest.update(array("Q", self._offsets).tobytes())
+        return digest.hexdigest()
+
+    def chunks(self, size):
+        """
+        Yields the keys in lists of at most size keys, e.g. to send them to the API in batches.
+        """
+        chunk = []
+        for key in self:
+            chunk.append(key)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def to_list(self):
+        """
+        Returns the keys as a sorted list.
+        """
+        return list(self)
@@ -72,11 +72,12 @@ def list_all_segments():
     print("")
     print("List of all segments\n")
     print("-------------------------------------------")
-    for segment_key, segment_data in segments_definitions.items():
+    for segment_key, segment_keys in data_utils.get_segments_keys(segments_definitions):
+        segment_data = segments_definitions[segment_key]
         print(f"Segment Name: {segment_data['name']}")
         print(f"Environment Name: {segment_data['environment']['name']}")
         print(f"Workspace Name: {segment_data['workspace']['name']}")
-        print(f"keys in this Segment: {segment_data['keys']}")
+        print(f"keys in this Segment: {', '.join(segment_keys)}")
         print("-------------------------------------------\n")
 
 def list_all_feature_flags():
@@ -8,14 +8,21 @@ def configure_logging(debug=False):
         logger.setLevel(logging.WARNING)
 
 
-import cache_utils, export_utils, list_utils, ops_utils, search_utils, re
-from data_utils import get_all_splits_definitions, get_all_segments_definitions
+import cache_utils, export_utils, index_utils, list_utils, ops_utils, search_utils, re
+from data_utils import get_all_splits_definitions, get_all_segments_definitions, refresh_splits_definitions
 
 formatted_text_cache = {}
 formatted_options_cache = {}
+# The getters used to (re)build the cache, replaced by admin_api_tool.py when another backend is selected
+cache_loaders = (get_all_splits_definitions, get_all_segments_definitions)
 
 def update_cache():
-    cache_utils.update_cache(get_all_splits_definitions, get_all_segments_definitions)
+    cache_utils.update_cache(*cache_loaders)
+    index_utils.build_indexes()
+
+def refresh_cache():
+    cache_utils.refresh_cache(refresh_splits_definitions)
+    index_utils.build_indexes()
 
 def format_text(text):
     """
@@ -78,9 +85,16 @@ def get_choice(options, menu_name):
         except KeyboardInterrupt:
             print("\nExiting...")
             cache_utils.quit_tool()
+        # Write what the action changed in the cache, and let the segment keys it used be evicted again
+        cache_utils.unpin_segment_keys()
+        cache_utils.checkpoint(force=True)
 
 def search():
     ops_list = [
+    search_utils.search_all,
+    search_utils.search_key,
+    search_utils.search_references,
+    search_utils.search_rules,
     search_utils.search_workspaces_or_groups,
     search_utils.search_environments,
     search_utils.search_users,
@@ -110,6 +124,9 @@ def list():
 
 def export_all_data():
     ops_list = [
+    export_utils.export_all,
+    export_utils.export_all_segments_keys,
+    export_utils.export_delta,
     export_utils.export_groups,
     export_utils.export_segments_definitions,
     ops_utils.export_segments_keys,
@@ -118,6 +135,8 @@ def export_all_data():
     export_utils.export_users,
     export_utils.export_workspaces,
     export_utils.export_environments,
+    export_utils.export_tables,
+    export_utils.export_targeted_keys,
     main_menu,
     cache_utils.quit_tool,
 ]
@@ -147,6 +166,7 @@ def main_menu():
         list, 
         export_all_data,
         operations,
+        refresh_cache,
         update_cache,
         cache_utils.quit_tool
     ]
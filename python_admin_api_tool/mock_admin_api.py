@@ -0,0 +1,298 @@
+"""
+A local stand-in for the read endpoints of the Split Admin API, serving a synthetic org so that the
+tool's data layer can be run and measured offline.
+
+Point the tool at it with ADMIN_API_BASE_URL=http://localhost:8000/internal/api/v2 (any API key works).
+"""
+import argparse
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+API_PREFIX = "/internal/api/v2"
+
+class MockOrg:
+    """
+    A deterministic synthetic org. Every workspace has the same number of environments, feature flags
+    and segments, and every flag and segment exists in every environment of its workspace.
+    """
+
+    def __init__(self, workspaces=3, environments=3, flags=50, segments=10, keys=250, users=100, groups=5):
+        self.groups = [{"id": f"group-{g}", "name": f"Group {g}", "type": "group"} for g in range(groups)]
+        self.users = [
+            {
+                "id": f"user-{u}",
+                "type": "user",
+                "name": f"User {u}",
+                "email": f"user{u}@example.com",
+                "status": "DEACTIVATED" if u % 10 == 8 else "PENDING" if u % 10 == 9 else "ACTIVE",
+                "groups": [{"id": f"group-{u % groups}", "type": "group"}] if groups else [],
+            }
+            for u in range(users)
+        ]
+        self.workspaces = [
+            {"id": f"ws-{w}", "name": f"Workspace {w}", "type": "workspace", "requiresTitleAndComments": False}
+            for w in range(workspaces)
+        ]
+        self.environments = {
+            ws["id"]: [
+                {
+                    "id": f"env-{w}-{e}",
+                    "name": "Production" if e == 0 else f"Environment {e}",
+                    "production": e == 0,
+                    "creationTime": 1600000000000 + e,
+                    "type": "environment",
+                    "status": "ACTIVE",
+                    "dataExportPermissions": None,
+                    "changePermissions": None,
+                }
+                for e in range(environments)
+            ]
+            for w, ws in enumerate(self.workspaces)
+        }
+        self.flags = [f"flag_{f}" for f in range(flags)]
+        self.segments = [f"segment_{s}" for s in range(segments)]
+        self.keys = keys
+        self.traffic_type = {"id": "tt-user", "name": "user"}
+
+    def split(self, name):
+        index = int(name.rsplit("_", 1)[1])
+        return {
+            "id": f"split-{index}",
+            "name": name,
+            "description": f"Synthetic feature flag {index}",
+            "trafficType": self.traffic_type,
+            "creationTime": 1600000000000 + index,
+            "rolloutStatus": {"id": "rs-1", "name": "Ramping"},
+            "rolloutStatusTimestamp": 1600000000000,
+            "tags": [{"name": f"team-{index % 4}"}],
+            "owners": [{"id": self.users[index % len(self.users)]["id"], "type": "user"}] if self.users else [],
+        }
+
+    def split_definition(self, name, environment):
+        index = int(name.rsplit("_", 1)[1])
+        matchers = [{"type": "IN_LIST_STRING", "attribute": "plan", "strings": ["enterprise", f"plan-{index % 7}"]}]
+        if self.segments:
+            matchers.append({"type": "IN_SEGMENT", "string": self.segments[index % len(self.segments)]})
+        rules = [{
+            "condition": {"combiner": "AND", "matchers": matchers},
+            "buckets": [{"treatment": "on", "size": 50}, {"treatment": "off", "size": 50}],
+        }]
+        if index > 0:
+            rules.append({
+                "condition": {"combiner": "AND", "matchers": [
+                    {"type": "IN_SPLIT", "depends": {"splitName": f"flag_{index - 1}", "treatments": ["on"]}}
+                ]},
+                "buckets": [{"treatment": "on", "size": 100}],
+            })
+        return {
+            "name": name,
+            "environment": {"id": environment["id"], "name": environment["name"]},
+            "trafficType": self.traffic_type,
+            "killed": False,
+            "treatments": [
+                {"name": "on", "keys": [f"key-{index}-{k}" for k in range(3)]},
+                {"name": "off", "keys": [f"key-{index}-off"]},
+            ],
+            "defaultTreatment": "off",
+            "baselineTreatment": "off",
+            "trafficAllocation": 100,
+            "rules": rules,
+            "defaultRule": [{"treatment": "off", "size": 100}],
+            "creationTime": 1600000000000 + index,
+            "lastUpdateTime": 1700000000000 + index,
+        }
+
+    def segment(self, name):
+        index = int(name.rsplit("_", 1)[1])
+        return {
+            "name": name,
+            "description": f"Synthetic segment {index}",
+            "trafficType": self.traffic_type,
+            "tags": [],
+            "creationTime": 1600000000000 + index,
+        }
+
+    def segment_definition(self, name, environment):
+        return {
+            "name": name,
+            "environment": {"id": environment["id"], "name": environment["name"]},
+            "trafficType": self.traffic_type,
+            "creationTime": 1600000000000,
+        }
+
+    def segment_keys(self, name):
+        index = int(name.rsplit("_", 1)[1])
+        return [{"key": f"key-{index}-{k}"} for k in range(self.keys)]
+
+    def environment(self, environment_id):
+        for environments in self.environments.values():
+            for environment in environments:
+                if environment["id"] == environment_id:
+                    return environment
+        return None
+
+
+def page(objects, query, default_limit):
+    """
+    Returns an offset-paginated response the way the Admin API does.
+    """
+    offset = int(query.get("offset", ["0"])[0])
+    limit = int(query.get("limit", [str(default_limit)])[0])
+    return {"objects": objects[offset:offset + limit], "offset": offset, "limit": limit, "totalCount": len(objects)}
+
+
+class MockAdminApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency)
+        url = urlparse(self.path)
+        path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+        with server.lock:
+            server.requests += 1
+            retry_after = server.throttle()
+        if retry_after is not None:
+            self.respond(429, {"code": 429, "message": "Rate limit exceeded"}, {"Retry-After": str(retry_after)})
+            return
+        try:
+            body = self.route(path.strip("/"), parse_qs(url.query))
+        except LookupError:
+            self.respond(404, {"code": 404, "message": f"Not found: {path}"})
+            return
+        self.respond(200, body)
+
+    def route(self, path, query):
+        org = self.server.org
+        match = re.fullmatch(r"workspaces", path)
+        if match:
+            return page(org.workspaces, query, 20)
+        match = re.fullmatch(r"environments/ws/([^/]+)", path)
+        if match:
+            return org.environments[match.group(1)]
+        match = re.fullmatch(r"splits/ws/([^/]+)", path)
+        if match:
+            org.environments[match.group(1)]
+            return page([org.split(name) for name in org.flags], query, 20)
+        match = re.fullmatch(r"splits/ws/([^/]+)/environments/([^/]+)", path)
+        if match:
+            environment = org.environment(match.group(2))
+            if environment is None:
+                raise LookupError(path)
+            return page([org.split_definition(name, environment) for name in org.flags], query, 20)
+        match = re.fullmatch(r"segments/ws/([^/]+)", path)
+        if match:
+            org.environments[match.group(1)]
+            return page([org.segment(name) for name in org.segments], query, 50)
+        match = re.fullmatch(r"segments/ws/([^/]+)/environments/([^/]+)", path)
+        if match:
+            environment = org.environment(match.group(2))
+            if environment is None:
+                raise LookupError(path)
+            return page([org.segment_definition(name, environment) for name in org.segments], query, 50)
+        match = re.fullmatch(r"segments/([^/]+)/([^/]+)/keys", path)
+        if match:
+            if org.environment(match.group(1)) is None or match.group(2) not in org.segments:
+                raise LookupError(path)
+            keys = page(org.segment_keys(match.group(2)), query, 100)
+            return {"keys": keys["objects"], "offset": keys["offset"], "limit": keys["limit"], "count": keys["totalCount"]}
+        match = re.fullmatch(r"users", path)
+        if match:
+            status = query.get("status", ["ACTIVE"])[0]
+            users = [user for user in org.users if user["status"] == status]
+            after = int(query.get("after", ["0"])[0])
+            limit = int(query.get("limit", ["200"])[0])
+            next_marker = after + limit if after + limit < len(users) else None
+            return {"data": users[after:after + limit], "nextMarker": next_marker}
+        match = re.fullmatch(r"groups", path)
+        if match:
+            return page(org.groups, query, 200)
+        raise LookupError(path)
+
+    def respond(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class MockAdminApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, org, latency=0.0, rate_limit=None, verbose=False):
+        ThreadingHTTPServer.__init__(self, address, MockAdminApiHandler)
+        self.org = org
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.verbose = verbose
+        self.requests = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+        self._window = None
+        self._window_requests = 0
+
+    def throttle(self):
+        """
+        Counts a request against the rate limit, one-second windows like the Admin API. Returns the
+        Retry-After seconds if it is over the limit, otherwise None. Must be called with the lock held.
+        """
+        if not self.rate_limit:
+            return None
+        now = time.monotonic()
+        window = math.floor(now)
+        if window != self._window:
+            self._window = window
+            self._window_requests = 0
+        self._window_requests += 1
+        if self._window_requests <= self.rate_limit:
+            return None
+        self.throttled += 1
+        return max(1, math.ceil(window + 1 - now))
+
+
+def make_server(org, host="127.0.0.1", port=8000, latency=0.0, rate_limit=None, verbose=False):
+    """
+    Creates (without starting) a threaded mock Admin API server for the given MockOrg.
+
+    Args:
+        latency (float): Seconds to wait before answering each request, to simulate the network.
+        rate_limit (int): Requests per second above which the server answers 429 with a Retry-After header.
+    """
+    return MockAdminApiServer((host, port), org, latency, rate_limit, verbose)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local mock of the Split Admin API read endpoints")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workspaces", type=int, default=3)
+    parser.add_argument("--environments", type=int, default=3, help="Environments per workspace")
+    parser.add_argument("--flags", type=int, default=50, help="Feature flags per workspace")
+    parser.add_argument("--segments", type=int, default=10, help="Segments per workspace")
+    parser.add_argument("--keys", type=int, default=250, help="Keys per segment")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds of simulated latency per request")
+    parser.add_argument("--rate-limit", type=int, help="Requests per second above which requests are throttled (429)")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    org = MockOrg(args.workspaces, args.environments, args.flags, args.segments, args.keys, args.users)
+    server = make_server(org, port=args.port, latency=args.latency, rate_limit=args.rate_limit,
+                         verbose=args.verbose)
+    print(f"Mock Admin API listening on http://127.0.0.1:{args.port}{API_PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{server.requests} requests served, {server.throttled} throttled.")
@@ -1,11 +1,11 @@
 import menu_utils
 import data_utils
-import os
+import export_utils
+import index_utils
 import cache
+import cache_utils
 import logging
 import pprint
-from dotenv import load_dotenv
-from splitapiclient.main import get_client
 from splitapiclient.util.exceptions import HTTPNotFoundError
 
 logger = logging.getLogger(__name__)
@@ -16,12 +16,7 @@ def configure_logging(debug=False):
     else:
         logger.setLevel(logging.WARNING)
 
-load_dotenv()
-# Load API key from .env file
-API_KEY = os.environ.get("ADMIN_API_KEY")
-# Initialize the client connection
-
-client = get_client({'apikey': API_KEY})
+client = data_utils.client
 
 def delete_groups():
     """
@@ -59,6 +54,7 @@ def delete_groups():
                 print(f"'{group_name}' has been deleted.")
                 print(f"Refreshing cache")
                 cache.cache_data["groups"] = None
+                cache_utils.mark_dirty("groups")
                 groups_data = data_utils.get_groups()
             else:
                 print(f"Failed to delete '{group_name}'.")
@@ -105,21 +101,35 @@ def delete_segments():
             segment_idx = int(segment_idx_input) - 1
             segment_name = segments[segment_idx]
 
+            # Warn if feature flags still use the segment
+            print_references("segment", segment_name, ws_name)
+
             # Confirm deletion
             confirm = input(f"Are you sure you want to delete '{segment_name}'? (yes/no): ")
             if confirm.lower() in ["yes", "y"]:
-                ws = client.workspaces.find(ws_name)
-                deleted = ws.delete_segment(segment_name)
+                ws = index_utils.find_workspace(ws_name)
+                deleted = client.segments.delete(segment_name, ws["id"])
                 if deleted:
                     print(f"'{segment_name}' has been deleted.")
                     print(f"Refreshing cache")
                     cache.cache_data["segments"] = None
+                    cache_utils.mark_dirty("segments")
                     segments_data = data_utils.get_segments()
                 else:
                     print(f"Failed to delete '{segment_name}'.")
             else:
                 print("Deletion cancelled")
 
+def print_references(entity_type, name, ws_name):
+    """
+    Prints the feature flag definitions of a workspace that reference a segment or a feature flag about to be deleted.
+    """
+    refs = index_utils.references(entity_type, name, ws_name)
+    if refs:
+        print(f"Warning: the {entity_type} '{name}' is referenced by {len(refs)} feature flag definitions in this workspace:")
+        for _, environment_name, flag_name, how in sorted(refs):
+            print(f"  - {flag_name} in environment {environment_name} ({how})")
+
 def delete_feature_flags():
     """
     Deletes a selected feature flag from a chosen workspace and updates the cache.
@@ -169,15 +179,19 @@ def delete_feature_flags():
             split_idx = int(split_idx_input) - 1
             split_name = splits[split_idx]
 
+            # Warn if other feature flags depend on this one
+            print_references("feature flag", split_name, ws_name)
+
             # Confirm deletion
             confirm = input(f"Are you sure you want to delete '{split_name}'? (yes/no): ")
             if confirm.lower() in ["yes", "y"]:
-                ws = client.workspaces.find(ws_name)
-                deleted = ws.delete_split(split_name)
+                ws = index_utils.find_workspace(ws_name)
+                deleted = client.splits.delete(split_name, ws["id"])
                 if deleted:
                     print(f"'{split_name}' has been deleted.")
                     print(f"Refreshing cache")
                     cache.cache_data["splits"] = None
+                    cache_utils.mark_dirty("splits")
                     all_splits = data_utils.get_splits()
                 else:
                     print(f"Failed to delete '{split_name}'.")
@@ -227,8 +241,8 @@ def delete_environments():
         if deleted:
             print(f"Environment '{selected_env_name}' deleted successfully.")
             # Update cache after successful deletion
-            cache.cache_data["environments"] = None
-            cache.cache_data["environments_data"] = None
+            cache.cache_data["topology"] = None
+            cache_utils.mark_dirty("topology")
         else:
             print(f"Failed to delete environment '{selected_env_name}'.")
 
@@ -468,7 +482,7 @@ def copy_segment_definitions():
                         source_segment_name = source_segments[source_segment_idx]
                         source_segment_key = f"{source_segment_name}.{source_env_id}.{source_ws_id}"
                         selected_segment_definition = all_segments_definitions[source_segment_key]
-                        segment_keys = selected_segment_definition["keys"]
+                        segment_keys = data_utils.get_segment_keys(source_segment_name, source_env_id, source_ws_id)
 
                         print("")
                         print(f"Keys for the selected source segment '{source_segment_name}':")
@@ -533,10 +547,14 @@ def copy_segment_definitions():
                                     # Copy segment definitions
                                     target_segment_def = client.segment_definitions.find(target_segment_name, target_env_id, target_ws_id)
 
-                                    keys = client.segment_definitions.find(source_segment_name, source_env_id, source_ws_id).get_keys()
-                                    update_check = target_segment_def.import_keys_from_json("false", {"keys": keys, "comment": "copy keys from segment"})
+                                    # Sent in batches the size the API accepts, so only one batch is ever held as a list
+                                    update_check = all([
+                                        target_segment_def.import_keys_from_json("false", {"keys": keys, "comment": "copy keys from segment"})
+                                        for keys in segment_keys.chunks(10000)
+                                    ])
 
                                     if update_check:
+                                        cache.cache_data["segment_keys"].pop(f"{target_segment_name}.{target_env_id}.{target_ws_id}", None)
                                         print("")
                                         print(f"Segment keys copied from Segment {source_segment_name} in workspace: {source_ws_name} - environemnt: {source_environment_name} to Segment {target_segment_name} in workspace : '{target_ws_name}' - environment : {target_environment_name}' \n")
                                         updated = True
@@ -613,7 +631,7 @@ def export_segments_keys():
                         source_segment_name = source_segments[source_segment_idx]
                         source_segment_key = f"{source_segment_name}.{source_env_id}.{source_ws_id}"
                         selected_segment_definition = all_segments_definitions[source_segment_key]
-                        segment_keys = selected_segment_definition["keys"]
+                        segment_keys = data_utils.get_segment_keys(source_segment_name, source_env_id, source_ws_id)
 
                         print("")
                         print(f"Keys for the selected source segment '{source_segment_name}':")
@@ -624,8 +642,7 @@ def export_segments_keys():
                         #export_keys_option = input("Do you want to export keys under this segment? (yes/no): ")
                         #if export_keys_option.lower() == "yes" or export_keys_option.lower() == "y":
                         file_name = f"segment-{source_segment_name}.{source_environment_name}.{source_ws_name}"
-                        segDef = client.segment_definitions.find(source_segment_name, source_env_id, source_ws_id)
-                        segDef.export_keys_to_csv(f"{file_name}_keys.csv")
+                        export_utils.export_segment_keys_to_csv(segment_keys, f"{file_name}_keys.csv")
                         print(f"keys are exported to {file_name}_keys.csv")
                         updated = True
                         break
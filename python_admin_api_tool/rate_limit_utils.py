@@ -0,0 +1,260 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+def configure_logging(debug=False):
+    if debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.WARNING)
+
+class RateLimiter:
+    """
+    Schedules Admin API requests so the tool runs at the highest request rate the API accepts.
+
+    Every request takes a token from a token bucket and a slot from an adaptive concurrency limit.
+    When the API answers 429, everyone pauses for the Retry-After delay (or an exponential backoff
+    with jitter when there is none), the request rate drops to 70% of the observed rate and the
+    concurrency is halved. Successful requests then raise them again step by step, up to the
+    configured ceilings.
+
+    The limiter is thread safe and can also be used from asyncio code with acquire_async().
+    """
+
+    def __init__(self, max_rate=None, max_concurrency=None, max_retries=8, base_delay=1.0, max_delay=60.0):
+        """
+        Args:
+            max_rate (float): Ceiling in requests per second, None for no ceiling until the API throttles.
+            max_concurrency (int): Ceiling of requests in flight, None for no ceiling until the API throttles.
+            max_retries (int): How many times a throttled request is retried before its 429 is returned.
+            base_delay (float): First backoff delay in seconds when a 429 has no Retry-After.
+            max_delay (float): Longest backoff delay in seconds.
+        """
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rate = max_rate
+        self._concurrency = max_concurrency
+        self._tokens = float(max_rate or 1)
+        self._refilled = time.monotonic()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._recent = deque()
+        self._cond = threading.Condition()
+        self.requests = 0
+        self.throttled = 0
+
+    def _try_acquire(self):
+        """
+        Takes a token and a slot if both are available. Returns None when acquired, otherwise the number
+        of seconds to wait before trying again (0 means wait until a request in flight completes).
+        """
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._concurrency is not None and self._in_flight >= int(self._concurrency):
+            return 0
+        if self._rate is not None:
+            self._tokens = min(max(self._rate, 1.0), self._tokens + (now - self._refilled) * self._rate)
+            self._refilled = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self._rate
+            self._tokens -= 1
+        self._in_flight += 1
+        self.requests += 1
+        self._recent.append(now)
+        while self._recent and self._recent[0] < now - 1.0:
+            self._recent.popleft()
+        return None
+
+    def acquire(self):
+        """
+        Blocks until the request can be sent.
+        """
+        with self._cond:
+            while True:
+                wait = self._try_acquire()
+                if wait is None:
+                    return
+                self._cond.wait(wait or None)
+
+    async def acquire_async(self):
+        """
+        Waits, without blocking the event loop, until the request can be sent.
+        """
+        while True:
+            with self._cond:
+                wait = self._try_acquire()
+            if wait is None:
+                return
+            await asyncio.sleep(wait or 0.01)
+
+    def release(self, status=None, retry_after=None, attempt=0):
+        """
+        Records the outcome of a request acquired with acquire().
+
+        Args:
+            status (int): The HTTP status code, None if the request failed without a response.
+            retry_after (str): The Retry-After header of a throttled response.
+            attempt (int): How many times this request has been throttled already.
+
+        Returns:
+            The number of seconds the caller should wait before retrying, or None if it was not throttled.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._in_flight -= 1
+            if status != 429:
+                self._increase()
+                self._cond.notify_all()
+                return None
+            self.throttled += 1
+            delay = self.retry_delay(retry_after, attempt)
+            self._paused_until = max(self._paused_until, now + delay)
+            # Several requests in flight usually get throttled at once, only back off once per pause.
+            if now >= self._last_decrease + delay:
+                self._decrease()
+                self._last_decrease = now
+            self._cond.notify_all()
+            return delay
+
+    def _increase(self):
+        if self._rate is not None and (self.max_rate is None or self._rate < self.max_rate):
+            # About 10% more per second (at least one more request per second)
+            self._rate += max(1.0, 0.1 * self._rate) / self._rate
+            if self.max_rate is not None:
+                self._rate = min(self._rate, self.max_rate)
+            elif self._rate > 10 * len(self._recent) + 10:
+                # Not the bottleneck any more, stop limiting the rate until the next 429.
+                self._rate = None
+        if self._concurrency is not None and (self.max_concurrency is None or self._concurrency < self.max_concurrency):
+            self._concurrency += 1 / self._concurrency
+            if self.max_concurrency is not None:
+                self._concurrency = min(self._concurrency, self.max_concurrency)
+
+    def _decrease(self):
+        observed = len(self._recent) or 1
+        self._rate = max(1.0, min(self._rate or observed, observed) * 0.7)
+        self._tokens = min(self._tokens, 1.0)
+        self._concurrency = max(1.0, min(self._concurrency or self._in_flight + 1, self._in_flight + 1) / 2)
+        logger.warning(f"Throttled by the Admin API, slowing down to {self._rate:.1f} requests/s "
+                       f"and {int(self._concurrency)} concurrent requests")
+
+    def retry_delay(self, retry_after, attempt):
+        """
+        Returns how long to wait after a 429: the Retry-After delay (in seconds or as an HTTP date) plus a
+        little jitter, or an exponential backoff with jitter when there is no usable Retry-After.
+        """
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return max(0.0, delay) + random.uniform(0, 0.1 * max(delay, 1.0))
+        return min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def send(self, request):
+        """
+        Sends a request through the limiter, retrying it while the API answers 429.
+
+        Args:
+            request (function): Sends the request and returns a requests.Response.
+
+        Returns:
+            The response. It's still a 429 only if the request was throttled more than max_retries times.
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                response = request()
+            except Exception:
+                self.release()
+                raise
+            delay = self.release(response.status_code, response.headers.get("Retry-After"), attempt)
+            if delay is None or attempt >= self.max_retries:
+                return response
+            logger.debug(f"RESPONSE CODE: 429, retrying in {delay:.1f} seconds")
+            attempt += 1
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "rate": self._rate,
+            "concurrency": None if self._concurrency is None else int(self._concurrency),
+        }
+
+def _float_env(name):
+    try:
+        value = float(os.environ.get(name) or 0)
+    except ValueError:
+        logger.warning(f"Invalid {name} value, ignoring it")
+        return None
+    return value if value > 0 else None
+
+_limiter = None
+
+def get_limiter():
+    """
+    Returns the limiter shared by all Admin API traffic. Its ceilings come from the ADMIN_API_RATE_LIMIT
+    (requests per second) and ADMIN_API_MAX_CONCURRENCY environment variables, by default there is none
+    and the limiter only slows down when the API throttles.
+    """
+    global _limiter
+    if _limiter is None:
+        concurrency = _float_env("ADMIN_API_MAX_CONCURRENCY")
+        _limiter = RateLimiter(_float_env("ADMIN_API_RATE_LIMIT"), int(concurrency) if concurrency else None)
+    return _limiter
+
+def set_rate_limit(max_rate):
+    """
+    Override the request rate ceiling (requests per second) of the shared limiter, None or 0 for no ceiling.
+    """
+    limiter = get_limiter()
+    limiter.max_rate = max_rate or None
+    limiter._rate = limiter.max_rate
+
+def install(client, limiter=None):
+    """
+    Routes every request of a splitapiclient client (and of the resources it returns) through a limiter.
+
+    The client's own 429 handling (a fixed 5 seconds retry) only kicks in once the limiter has
+    given up on a request.
+
+    Args:
+        client: A client from splitapiclient.main.get_client().
+        limiter (RateLimiter): Defaults to the shared limiter.
+    """
+    limiter = limiter or get_limiter()
+    http_clients = {
+        id(microclient._http_client): microclient._http_client
+        for microclient in vars(client).values()
+        if hasattr(microclient, "_http_client")
+    }
+    for http_client in http_clients.values():
+        if getattr(http_client, "_rate_limiter", None) is limiter:
+            continue
+        setup_method = type(http_client).setup_method.__get__(http_client)
+
+        def limited_setup_method(method, body=None, setup_method=setup_method):
+            send = setup_method(method, body)
+            return lambda url, **kwargs: limiter.send(lambda: send(url, **kwargs))
+
+        http_client.setup_method = limited_setup_method
+        http_client._rate_limiter = limiter
+    return client
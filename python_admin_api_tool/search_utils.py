@@ -1,18 +1,11 @@
 import data_utils
 import menu_utils
 import export_utils
+import index_utils
 import pprint
-import os
 import logging
-from dotenv import load_dotenv
-from splitapiclient.main import get_client
 
-load_dotenv()
-# Load API key from .env file
-API_KEY = os.environ.get("ADMIN_API_KEY")
-# Initialize the client connection
-
-client = get_client({'apikey': API_KEY})
+client = data_utils.client
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +15,146 @@ def configure_logging(debug=False):
     else:
         logger.setLevel(logging.WARNING)
 
+def describe_match(item):
+    """
+    Returns a one line description of an entity found by index_utils.fuzzy_search().
+    """
+    if item["type"] == "user":
+        return f"user {item['name']} <{item['data'].get('Email')}>"
+    return f"{item['type']} {item['name']} (workspace {item['workspace']})"
+
+def print_suggestions(query, entity_type):
+    """
+    Prints the entities of a type whose name is close to a name that wasn't found.
+    """
+    matches = index_utils.fuzzy_search(query, {entity_type}, limit=5)
+    if matches:
+        print("Did you mean:")
+        for item, score in matches:
+            print(f"  - {describe_match(item)}")
+
+def search_all():
+    """
+    Search feature flags, segments, users and environments by part of their name (or description, tags
+    or email), tolerating typos, and print the best matches. A match can then be chosen to see its details.
+
+    Returns:
+        Output to stdout
+    """
+    while True:
+        print("-------------------------------------------\n")
+        query = input("Enter a (partial) name, description, tag or email to search or 1 to go back to previous menu: ")
+        if query == "1":
+            menu_utils.search()
+            break
+        matches = index_utils.fuzzy_search(query)
+        if not matches:
+            print(f"Nothing found matching {query}")
+            continue
+        print("-------------------------------------------")
+        for index, (item, score) in enumerate(matches, 1):
+            print(f"{index}. {describe_match(item)} - score {score:.2f}")
+        print("-------------------------------------------\n")
+        choice = input("Enter a result number to see its details, or press enter to search again: ")
+        if choice.isdigit() and 1 <= int(choice) <= len(matches):
+            print("-------------------------------------------")
+            pprint.pprint(matches[int(choice) - 1][0]["data"])
+            print("-------------------------------------------\n")
+
+def search_key():
+    """
+    Search which segments contain a key (e.g. a user ID), and which feature flag treatments target it
+    individually, across all workspaces and environments. The keys of the segments that are not cached
+    yet are fetched first.
+
+    Returns:
+        Output to stdout
+    """
+    key_index = index_utils.update_key_index()
+    while True:
+        print("-------------------------------------------\n")
+        key = input("Enter the key to search or 1 to go back to previous menu: ")
+        if key == "1":
+            menu_utils.search()
+            break
+        memberships = key_index.lookup(key)
+        if not memberships:
+            print(f"The key {key} is not in any segment and not targeted individually by any feature flag")
+            continue
+        segments = sorted(ref for ref in memberships if ref[0] == "segment")
+        flags = sorted(ref for ref in memberships if ref[0] == "feature flag")
+        print("-------------------------------------------")
+        if segments:
+            print(f"Segments containing the key {key}:")
+            for _, name, workspace_name, environment_name, _ in segments:
+                print(f"  - {name} in workspace {workspace_name}, environment {environment_name}")
+        if flags:
+            print(f"Feature flags targeting the key {key} individually:")
+            for _, name, workspace_name, environment_name, treatment in flags:
+                print(f"  - {name} (treatment {treatment}) in workspace {workspace_name}, environment {environment_name}")
+        print("-------------------------------------------\n")
+
+def search_references():
+    """
+    Search which feature flag definitions reference a segment (in their rules or individual targets) or
+    depend on a feature flag, across all workspaces and environments.
+
+    Returns:
+        Output to stdout
+    """
+    while True:
+        print("-------------------------------------------\n")
+        name = input("Enter the segment or feature flag name to search or 1 to go back to previous menu: ")
+        if name == "1":
+            menu_utils.search()
+            break
+        found = False
+        for entity_type in ["segment", "feature flag"]:
+            refs = index_utils.references(entity_type, name)
+            if refs:
+                found = True
+                print("-------------------------------------------")
+                print(f"Feature flags referencing the {entity_type} {name}:")
+                for workspace_name, environment_name, flag_name, how in sorted(refs):
+                    print(f"  - {flag_name} in workspace {workspace_name}, environment {environment_name} ({how})")
+        if found:
+            print("-------------------------------------------\n")
+        else:
+            print(f"No feature flag references a segment or feature flag named {name}")
+
+def search_rules():
+    """
+    Search which feature flag targeting rules use an attribute, compare with a value (e.g. a string in a list)
+    or use a type of matcher, across all workspaces and environments.
+
+    Returns:
+        Output to stdout
+    """
+    kinds = ("attribute", "value", "matcher")
+    while True:
+        print("-------------------------------------------\n")
+        text = input("Enter the attribute, value or matcher type to search or 1 to go back to previous menu: ")
+        if text == "1":
+            menu_utils.search()
+            break
+        matches = index_utils.rule_matches(text)
+        kind, _, rest = text.partition(":")
+        if rest and kind.strip().lower() in kinds:
+            text = rest.strip()
+        if not matches:
+            print(f"No feature flag targeting rule uses {text}")
+            continue
+        print("-------------------------------------------")
+        for kind in kinds:
+            kind_matches = [match for match in matches if match[0] == kind]
+            if kind_matches:
+                print(f"Targeting rules using the {kind} {text}:")
+            for _, workspace_name, environment_name, flag_name, rule_number, matcher_type, attribute, values in kind_matches:
+                on_attribute = f" on attribute {attribute}" if attribute else ""
+                print(f"  - {flag_name} in workspace {workspace_name}, environment {environment_name}: rule {rule_number}, {matcher_type}{on_attribute} {', '.join(values)}")
+        print(f"{len(matches)} matchers in {len({match[1:4] for match in matches})} feature flag definitions")
+        print("-------------------------------------------\n")
+
 def search_workspaces_or_groups():
     """
     Search for a workspace or Split group by name, and print information on the one found.
@@ -36,21 +169,20 @@ def search_workspaces_or_groups():
             menu_utils.search()
             break
         else:
-            ws = client.workspaces.find(ws_or_gr_name)
+            ws = index_utils.find_workspace(ws_or_gr_name)
             if ws:
                 print(f"The workspace is found:")
                 print("-------------------------------------------\n")
-                pprint.pprint(ws.to_dict())
+                pprint.pprint(ws)
                 print("-------------------------------------------\n")
             else:
-                gr = client.groups.find(ws_or_gr_name)
+                gr = index_utils.find_group(ws_or_gr_name)
                 if not gr:
                     print(f"The workspace or group you entered does not exist. Please double check the name and try again")
                 else:
-                    groups_data = data_utils.get_groups_users()
-                    user_list = groups_data.get(ws_or_gr_name, {}).get('Users', [])
+                    user_list = index_utils.group_users(gr["id"])
                     print("-------------------------------------------\n")
-                    print(f"The group id is {gr._id} and name is {gr._name}")
+                    print(f"The group id is {gr['id']} and name is {gr['name']}")
                     print(f"The users in this group are:")
                     pprint.pprint(user_list)
                     print("-------------------------------------------\n")
@@ -70,12 +202,7 @@ def search_environments():
             menu_utils.search()
             break
         else:
-            found_envs = []
-            all_envs = data_utils.get_environments_data()
-            for ws_id, ws_envs in all_envs.items():
-                for ename, env in ws_envs.items():
-                    if ename == env_name:
-                        found_envs.append(env)
+            found_envs = index_utils.find_environments(env_name)
             if found_envs:
                 print("-------------------------------------------\n")
                 print(f"Environment(s) found with name: {env_name}")
@@ -86,6 +213,7 @@ def search_environments():
                 print("-------------------------------------------\n")
             else:
                 print(f"Environment not found with name {env_name}")
+                print_suggestions(env_name, "environment")
 
 def search_users():
     """
@@ -102,38 +230,36 @@ def search_users():
             menu_utils.search()
             break
         else:
-            user = client.users.find(email)
+            user = index_utils.find_user(email)
             if user:
                 print("-------------------------------------------\n")
                 print(f"User found with email {email}")
-                print(f"ID: {user.id}")
-                print(f"Name: {user._name}")
-                print(f"Email: {user.email}")
-                print(f"Status: {user._status}")
-                print(f"Type: {user._type}")
-                groupnames = []
-                user_groups = data_utils.get_groups()
-                for group in user._groups:
-                    if group["id"] in user_groups:
-                        groupnames.append(user_groups[group["id"]])
-                print(f"The user {user._name} is in groups:")
+                print(f"ID: {user['ID']}")
+                print(f"Name: {user['Name']}")
+                print(f"Email: {user['Email']}")
+                print(f"Status: {user['Status']}")
+                print(f"Type: {user['Type']}")
+                groupnames = [group["Name"] for group in user["Groups"]]
+                print(f"The user {user['Name']} is in groups:")
                 pprint.pprint(groupnames)
                 print("-------------------------------------------\n")
             else:
                 print(f"User not found with email {email}")
+                print_suggestions(email, "user")
 
 def get_segment_definitions_by_name(segment_name):
-    all_definitions = data_utils.get_all_segments_definitions()
-    definitions = {}
+    """
+    Returns a dictionary containing the segment definitions (across all workspaces and environments)
+    of the segment with exactly the given name, looked up in the name index.
 
-    for key in all_definitions.keys():
-        if key.startswith(segment_name):
-            segment_name, environment_id, workspace_id = key.split('.')
-            if segment_name not in definitions:
-                definitions[segment_name] = []
-            definitions[segment_name].append(all_definitions[key])
+    Args:
+        segment_name (str): The name of the segment.
 
-    return definitions
+    Returns:
+        A dictionary with the segment name as key and the list of its definitions as value, empty if not found.
+    """
+    definitions = index_utils.segments_definitions_by_name().get(segment_name)
+    return {segment_name: definitions} if definitions else {}
 
 def search_segments():
     """
@@ -164,14 +290,14 @@ def search_segments():
                 print(f"Workspace: {workspace_name}")
                 pprint.pprint(segment_data)
             print("-------------------------------------------\n")
-            segment_definitions = data_utils.get_all_segments_definitions()
+            segment_definitions = get_segment_definitions_by_name(segment_name).get(segment_name, [])
 
             while True:
                 print("-------------------------------------------\n")
                 see_segment_definitions = input("Do you want to see the segment definitions for this segment? (yes/no): ")
                 if see_segment_definitions.lower() == "yes" or see_segment_definitions.lower() == "y":
                     
-                    workspaces = {definition_data["workspace"]["name"]: definition_data["workspace"]["id"] for definition_key, definition_data in segment_definitions.items() if definition_data['name'] == segment_name}
+                    workspaces = {definition_data["workspace"]["name"]: definition_data["workspace"]["id"] for definition_data in segment_definitions}
                     if not workspaces:
                         print("No workspaces containing the segment found.")
                         break
@@ -184,7 +310,7 @@ def search_segments():
                     chosen_workspace = int(input("Choose a workspace by entering its number: "))
                     chosen_workspace_name = list(workspaces)[chosen_workspace-1]
 
-                    environments = {definition_data["environment"]["name"]: definition_data["environment"]["id"] for definition_key, definition_data in segment_definitions.items() if definition_data['name'] == segment_name and definition_data["workspace"]["name"] == chosen_workspace_name}
+                    environments = {definition_data["environment"]["name"]: definition_data["environment"]["id"] for definition_data in segment_definitions if definition_data["workspace"]["name"] == chosen_workspace_name}
                     if not environments:
                         print("No environments containing the segment's definitions found.")
                         break
@@ -200,11 +326,15 @@ def search_segments():
                     chosen_workspace_id = workspaces[chosen_workspace_name]
                     chosen_environment_id = environments[chosen_environment_name]
 
-                    for definition_key, definition_data in segment_definitions.items():
-                        if definition_data['name'] == segment_name and definition_data["workspace"]["name"] == chosen_workspace_name and definition_data["environment"]["name"] == chosen_environment_name:
+                    for definition_data in segment_definitions:
+                        if definition_data["workspace"]["name"] == chosen_workspace_name and definition_data["environment"]["name"] == chosen_environment_name:
                             print("-------------------------------------------")
                             print(f"Segment definition for Segment {segment_name} in environment {chosen_environment_name} and workspace {chosen_workspace_name}:")
                             pprint.pprint(definition_data)
+                            print(f"Keys in this Segment:")
+                            segment_keys = data_utils.get_segment_keys(segment_name, chosen_environment_id, chosen_workspace_id)
+                            for key in segment_keys:
+                                print(key)
                             #export_option = input("Do you want to export this segment definition? (yes/no): ")
                             #if export_option.lower() == "yes" or export_option.lower() == "y":
                             #    export_utils.export_specific_segment_definition(definition_data)
@@ -212,19 +342,20 @@ def search_segments():
                             export_keys_option = input("Do you want to export keys under this segment? (yes/no): ")
                             if export_keys_option.lower() == "yes" or export_keys_option.lower() == "y":
                                 file_name = f"{segment_name}.{chosen_environment_name}.{chosen_workspace_name}"
-                                segDef = client.segment_definitions.find(segment_name, chosen_environment_id, chosen_workspace_id)
-                                segDef.export_keys_to_csv(f"{file_name}.csv")
+                                export_utils.export_segment_keys_to_csv(segment_keys, f"{file_name}.csv")
                                 print(f"The keys have been exported to {file_name}")
                             break
                 else:
                     break
         else:
             print("Segment not found")
+            print_suggestions(segment_name, "segment")
 
 def get_split_definitions_by_name(split_name):
     """
     Returns a dictionary containing information on all Split definitions for a given split name,
     where the keys are the split names and the values are a list of split definitions.
+    Only the Split with exactly this name matches, it's looked up in the name index.
 
     Args:
         split_name (str): The name of the Split definition to retrieve.
@@ -232,18 +363,8 @@ def get_split_definitions_by_name(split_name):
     Returns:
         A dictionary containing information on all Split definitions for the given split name.
     """
-    all_definitions = data_utils.get_all_splits_definitions()
-    definitions = {}
-    
-    for key in all_definitions.keys():
-        if key.startswith(split_name):
-            #split_name, environment_id, workspace_id = key.split('.')
-            split_name, environment_id, workspace_id = key.rsplit('.', 2)
-            if split_name not in definitions:
-                definitions[split_name] = []
-            definitions[split_name].append(all_definitions[key])
-    
-    return definitions
+    definitions = index_utils.splits_definitions_by_name().get(split_name)
+    return {split_name: definitions} if definitions else {}
 
 def search_feature_flags():
     """
@@ -268,6 +389,9 @@ def search_feature_flags():
                 pprint.pprint(split_data)
             print("-------------------------------------------\n")
             split_definitions = get_split_definitions_by_name(split_name)
+            if not split_definitions:
+                print("No definitions found for this feature flag.")
+                continue
             workspaces = {definition_data["workspace"] for definition_data in split_definitions[split_name]}
             exported = False
             while not exported:
@@ -326,3 +450,4 @@ def search_feature_flags():
                     break
         else:
             print("feature flag not found")
+            print_suggestions(split_name, "feature flag")
@@ -0,0 +1,428 @@
+import io
+import re
+import gzip
+import json
+import zlib
+import queue
+import logging
+import threading
+from collections.abc import Mapping, Set
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+def configure_logging(debug=False):
+    if debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.WARNING)
+
+# Size of the write buffer of the exported files, in bytes
+WRITE_BUFFER_SIZE = 1024 * 1024
+# Characters read at once from the JSON files being read
+READ_SIZE = 1024 * 1024
+ENCODERS = ["json", "orjson"]
+_encoder = None
+# Compression of the exported files: codec -> file name suffix
+COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+_compression = "none"
+_compression_level = None
+# Chunks waiting to be compressed by the background thread, at most
+COMPRESSION_QUEUE_SIZE = 8
+
+def set_encoder(encoder):
+    """
+    Sets the JSON encoder: "json" (the standard library, the default) or "orjson" (faster, requires orjson).
+    orjson indents with 2 spaces instead of 4 and doesn't escape non-ASCII characters, so the exports differ.
+    """
+    global _encoder
+    if encoder not in ENCODERS:
+        raise ValueError(f"Unknown JSON encoder {encoder}, expected one of: {', '.join(ENCODERS)}")
+    if encoder == "orjson" and orjson is None:
+        raise ImportError("The orjson encoder requires orjson, install it with: pip install orjson")
+    _encoder = encoder
+
+def get_encoder():
+    return _encoder or "json"
+
+def set_compression(compression, level=None):
+    """
+    Sets the compression of the exported files: "none", "gzip" or "zstd" (requires zstandard), and its level
+    (1 to 9 for gzip, 1 to 22 for zstd, by default 6 and 3). The compressed files get a .gz or .zst suffix.
+    """
+    global _compression, _compression_level
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression}, expected one of: {', '.join(COMPRESSIONS)}")
+    if compression == "zstd" and zstandard is None:
+        raise ImportError("The zstd compression requires zstandard, install it with: pip install zstandard")
+    _compression = compression
+    _compression_level = level
+
+def get_compression():
+    return _compression
+
+def get_compression_level():
+    return _compression_level
+
+def _default(value):
+    # Sets (e.g. the KeySet of segment keys) are exported as lists, anything else unknown as a string
+    if isinstance(value, Set):
+        return list(value)
+    return str(value)
+
+class _JSONEncoder(json.JSONEncoder):
+    def default(self, value):
+        return _default(value)
+
+def _indent(indent):
+    # orjson only indents with 2 spaces
+    return 2 if indent and get_encoder() == "orjson" else indent
+
+def iter_encode(value, indent=None, level=0):
+    """
+    Encodes a value to JSON, in chunks with the standard library encoder so a large value is never held
+    as one string.
+
+    Args:
+        value: The value to encode.
+        indent (int): The indentation, None for a single line.
+        level (int): The nesting level of the value in the document, to indent its lines.
+
+    Yields:
+        str: The chunks of the JSON text.
+    """
+    indent = _indent(indent)
+    if get_encoder() == "orjson":
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            chunks = [orjson.dumps(value, default=_default, option=option).decode("utf-8")]
+        except orjson.JSONEncodeError as e:
+            # e.g. integers over 64 bits, which the standard library encodes
+            logger.debug(f"orjson failed, encoding with json: {e}")
+            chunks = _JSONEncoder(indent=indent).iterencode(value)
+    else:
+        chunks = _JSONEncoder(indent=indent).iterencode(value)
+    if indent and level:
+        prefix = "\n" + " " * (indent * level)
+        chunks = (chunk.replace("\n", prefix) for chunk in chunks)
+    yield from chunks
+
+def _encode_key(key):
+    # Dictionary keys are converted to strings the way json.dumps does
+    if isinstance(key, bool) or key is None:
+        key = json.dumps(key)
+    elif not isinstance(key, str):
+        key = str(key)
+    return json.dumps(key)
+
+class Items:
+    """
+    Key and value pairs, e.g. from a generator, written like the entries of a dictionary without building it.
+    """
+
+    def __init__(self, pairs):
+        self._pairs = pairs
+
+    def items(self):
+        return self._pairs
+
+def _is_sequence(data):
+    return not isinstance(data, (str, bytes, Mapping)) and hasattr(data, "__iter__")
+
+def write_json(data, file, indent=4):
+    """
+    Writes data to a file as a JSON document, one entry (of a dictionary) or item (of a list or any other
+    iterable) at a time, so nothing bigger than an entry is encoded in memory, and the output starts right away.
+
+    Args:
+        data: The data, usually a dictionary (or Items) or a list.
+        file: A text file open for writing.
+        indent (int): The indentation, None for a single line.
+
+    Returns:
+        int: The number of entries or items written.
+    """
+    indent = _indent(indent)
+    newline = "\n" + " " * indent if indent else ""
+    separator = "," + newline if indent else ", "
+    if isinstance(data, (Mapping, Items)):
+        opening, closing = "{", "}"
+        entries = (([_encode_key(key), ": "], value) for key, value in data.items())
+    elif _is_sequence(data):
+        opening, closing = "[", "]"
+        entries = (([], item) for item in data)
+    else:
+        file.writelines(iter_encode(data, indent))
+        return 1
+    count = 0
+    file.write(opening)
+    for prefix, value in entries:
+        file.write((separator if count else newline))
+        file.writelines(prefix)
+        file.writelines(iter_encode(value, indent, level=1))
+        count += 1
+    if count and indent:
+        file.write("\n")
+    file.write(closing)
+    return count
+
+def write_json_lines(data, file):
+    """
+    Writes data to a file as JSON Lines: one JSON object per entry of a dictionary, as {"key": ..., "value": ...},
+    or one JSON value per item of a list or any other iterable.
+
+    Args:
+        data: The data, usually a dictionary or a list.
+        file: A text file open for writing.
+
+    Returns:
+        int: The number of lines written.
+    """
+    if isinstance(data, (Mapping, Items)):
+        items = ({"key": key, "value": value} for key, value in data.items())
+    elif _is_sequence(data):
+        items = data
+    else:
+        items = [data]
+    count = 0
+    for item in items:
+        file.writelines(iter_encode(item))
+        file.write("\n")
+        count += 1
+    return count
+
+class _CompressedWriter(io.RawIOBase):
+    """
+    A binary file that compresses what is written to it on a background thread, so the compression overlaps
+    with encoding the data. Both zlib and zstandard release the GIL while compressing.
+    """
+
+    def __init__(self, file_name, compression, level=None):
+        self._file = open(file_name, "wb")
+        if compression == "gzip":
+            # wbits 31 writes the gzip header and trailer
+            compressor = zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 31)
+            self._compress, self._finish = compressor.compress, compressor.flush
+        else:
+            compressor = zstandard.ZstdCompressor(level=3 if level is None else level).compressobj()
+            self._compress, self._finish = compressor.compress, compressor.flush
+        self._queue = queue.Queue(COMPRESSION_QUEUE_SIZE)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="export-compression", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                data = self._queue.get()
+                if data is None:
+                    self._file.write(self._finish())
+                    return
+                self._file.write(self._compress(data))
+        except Exception as e:
+            self._error = e
+            # Keep draining so the writer isn't blocked on a full queue
+            while self._queue.get() is not None:
+                pass
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self._error is not None:
+            raise self._error
+        # The buffer may be reused by the caller once write returns
+        self._queue.put(bytes(data))
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._queue.put(None)
+            self._thread.join()
+        finally:
+            self._file.close()
+            super().close()
+        if self._error is not None:
+            raise self._error
+
+def output_name(file_name):
+    """
+    Returns the name of the file written for file_name, with the suffix of the compression if any.
+    """
+    return file_name + COMPRESSIONS[_compression]
+
+def open_output(file_name, newline=None):
+    """
+    Opens a file to export data to (text, UTF-8), with a large write buffer, compressed if a compression is set
+    (see output_name() for the name of the file).
+    """
+    if _compression == "none":
+        return open(file_name, "w", encoding="utf-8", newline=newline, buffering=WRITE_BUFFER_SIZE)
+    raw = _CompressedWriter(output_name(file_name), _compression, _compression_level)
+    return io.TextIOWrapper(io.BufferedWriter(raw, WRITE_BUFFER_SIZE), encoding="utf-8", newline=newline)
+
+def export_json(data, file_name, json_lines=False, indent=4):
+    """
+    Exports data to a JSON (or JSON Lines) file, streaming it entry by entry, compressed if a compression is set.
+
+    Args:
+        data: The data, usually a dictionary or a list.
+        file_name (str): The file to write.
+        json_lines (bool): Write JSON Lines instead of a JSON document.
+        indent (int): The indentation of the JSON document.
+
+    Returns:
+        int: The number of entries written.
+    """
+    with open_output(file_name) as file:
+        if json_lines:
+            return write_json_lines(data, file)
+        return write_json(data, file, indent)
+
+_WHITESPACE = re.compile(r"\s*")
+_decoder = json.JSONDecoder()
+# Characters at the end of the buffer within which a decoding error may only mean that the value goes on in
+# the next chunk (a literal, number or escape sequence cut in two)
+_LOOKAHEAD = 16
+
+class _JSONReader:
+    """
+    Reads the values of a JSON document one at a time from a file, holding only the value being
+    decoded (and the chunk of the file around it) in memory.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.buffer = ""
+        self.position = 0
+
+    def _fill(self):
+        # The more a value spans, the more is read at once, so decoding a large value isn't quadratic
+        chunk = self.file.read(max(READ_SIZE, len(self.buffer) - self.position))
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """
+        Returns the next character that is not whitespace, "" at the end of the file.
+        """
+        while True:
+            self.position = _WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ""
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f"Invalid JSON: expected one of {characters!r}, found {character!r}")
+        self.position += 1
+        return character
+
+    def value(self):
+        """
+        Decodes the next value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as e:
+                # The value may go on in the next chunk if it failed at the end of the buffer, or in a string
+                # running to it. Anywhere else the document is invalid, whatever follows.
+                if e.pos < len(self.buffer) - _LOOKAHEAD and not e.msg.startswith("Unterminated string"):
+                    raise
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the chunk may continue in the next one
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.position = end
+            return value
+
+def iter_entries(file):
+    """
+    Reads the entries of a JSON document one at a time: the (key, value) pairs of a top level object,
+    or (None, item) for the items of a top level array.
+    """
+    reader = _JSONReader(file)
+    character = reader.peek()
+    if not character or character not in "{[":
+        yield None, reader.value()
+        return
+    closing = "}" if reader.expect("{[") == "{" else "]"
+    if reader.peek() == closing:
+        reader.expect(closing)
+    else:
+        while True:
+            key = None
+            if closing == "}":
+                key = reader.value()
+                reader.expect(":")
+            yield key, reader.value()
+            if reader.expect("," + closing) == closing:
+                break
+    if reader.peek():
+        raise ValueError(f"Invalid JSON: extra data after the document, found {reader.peek()!r}")
+
+def iter_json_lines_entries(file):
+    """
+    Reads the entries of a JSON Lines file: (key, value) for the {"key": ..., "value": ...} lines written by
+    the tool's exports, (None, line value) for any other line.
+    """
+    for line in file:
+        if not line.strip():
+            continue
+        value = json.loads(line)
+        if isinstance(value, dict) and value.keys() == {"key", "value"}:
+            yield value["key"], value["value"]
+        else:
+            yield None, value
+
+def input_name(file_name):
+    """
+    Returns the name of an exported file without the suffix of its compression.
+    """
+    for suffix in COMPRESSIONS.values():
+        if suffix and file_name.endswith(suffix):
+            return file_name[:-len(suffix)]
+    return file_name
+
+def open_input(file_name):
+    """
+    Opens an exported file for reading (text, UTF-8), decompressing it if its name ends with .gz or .zst.
+    """
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "rt", encoding="utf-8")
+    if file_name.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError("Reading zstd files requires zstandard, install it with: pip install zstandard")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(file_name, "rb"), closefd=True), encoding="utf-8")
+    return open(file_name, "r", encoding="utf-8")
+
+def read_entries(file_name):
+    """
+    Reads the entries of an exported JSON or JSON Lines file (possibly compressed) one at a time, see
+    iter_entries() and iter_json_lines_entries().
+    """
+    with open_input(file_name) as file:
+        if input_name(file_name).endswith(".jsonl"):
+            yield from iter_json_lines_entries(file)
+        else:
+            yield from iter_entries(file)
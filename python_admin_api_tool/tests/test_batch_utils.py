@@ -0,0 +1,55 @@
+import io
+import os
+import sys
+import json
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import batch_utils
+
+@pytest.mark.parametrize("line, expected", [
+    ('{"type": "flag", "query": " checkout "}', ("flag", "checkout")),
+    ('{"type": "Split", "query": "checkout"}', ("flag", "checkout")),
+    ('{"type": "email"}', ("user", "")),
+    ('{"query": "checkout"}', ("", "checkout")),
+    ('{"type": null, "query": null}', ("", "")),
+    ("flag checkout", ("flag", "checkout")),
+    ("FEATURE_FLAG new checkout", ("flag", "new checkout")),
+    ("flag\tcheckout", ("flag", "checkout")),
+    ("env\tProduction EU", ("environment", "Production EU")),
+    ("workspace", ("workspace", "")),
+])
+def test_parse_query(line, expected):
+    assert batch_utils.parse_query(line) == expected
+
+@pytest.mark.parametrize("line", [
+    '{"type": "flag", "query": 5}',
+    '{"type": 5, "query": "checkout"}',
+    '{"type": ["flag"], "query": "checkout"}',
+    '{"type": "flag", "query": {"name": "checkout"}}',
+    '{"type": "flag", "query": true}',
+    '{"type": "flag", "query": "checkout"',
+])
+def test_parse_query_rejects_invalid_lines(line):
+    with pytest.raises(ValueError):
+        batch_utils.parse_query(line)
+
+def test_run_batch_goes_on_after_invalid_lines(monkeypatch):
+    monkeypatch.setitem(batch_utils.QUERIES, "flag", lambda query: {"name": query} if query == "checkout" else None)
+    lines = [
+        '{"type": "flag", "query": 5}',
+        "# a comment",
+        "",
+        '{"type": ["flag"]}',
+        "nothing here",
+        "flag missing",
+        '{"type": "flag", "query": "checkout"}',
+    ]
+    output = io.StringIO()
+    assert batch_utils.run_batch(io.StringIO("\n".join(lines)), output) == 5
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert results[0] == {"query": lines[0], "error": 'Invalid query: "query" must be a string, not int'}
+    assert results[1]["error"].startswith('Invalid query: "type" must be a string')
+    assert results[2]["error"].startswith("Unknown query type")
+    assert results[3] == {"type": "flag", "query": "missing", "found": False, "result": None}
+    assert results[4] == {"type": "flag", "query": "checkout", "found": True, "result": {"name": "checkout"}}
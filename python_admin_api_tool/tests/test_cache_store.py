@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cache
+import cache_store
+
+def test_failed_write_is_saved_again(tmp_path, monkeypatch):
+    store = cache_store.CacheStore(str(tmp_path / "cache.db"))
+    data = cache.default_cache_data()
+    data["groups"] = {"group-0": "Group 0", "group-1": "Group 1"}
+    data["segment_keys"] = {"segment_0.env.ws": ["a", "b"]}
+
+    write = store._write
+    def fail(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(store, "_write", fail)
+    store.save(data)
+    monkeypatch.setattr(store, "_write", write)
+
+    # Only the users changed since, the groups and segment keys that failed are written anyway
+    data["users"] = {}
+    store.save(data, sections=["users"])
+    store.close()
+
+    loaded = cache_store.CacheStore(str(tmp_path / "cache.db")).load()
+    assert loaded["groups"] == data["groups"]
+    assert list(loaded["segment_keys"]["segment_0.env.ws"]) == ["a", "b"]
@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import export_utils
+
+def segment(workspace, workspace_id, environment, environment_id, name):
+    return {
+        "workspace": {"id": workspace_id, "name": workspace},
+        "environment": {"id": environment_id, "name": environment},
+        "name": name,
+    }
+
+def test_partition_names_are_unique():
+    names = export_utils._PartitionNames(reserved=[export_utils.SEGMENT_KEYS_INDEX])
+    segments = [
+        segment("Workspace 2", "ws-1", "Production", "env-1", "seg/a"),
+        segment("Workspace 2", "ws-1", "Production", "env-1", "seg_a"),
+        segment("Workspace 2", "ws-1", "Production", "env-1", "SEG_A"),
+        segment("Workspace_2", "ws-2", "Production", "env-2", "seg_a"),
+        segment("index.csv", "ws-3", "Production", "env-3", "seg_a"),
+    ]
+    paths = [names.path(definition) for definition in segments]
+    assert len({path.lower() for path in paths}) == len(paths)
+    assert paths[0] == os.path.join("Workspace_2", "Production", "seg_a.csv")
+    assert paths[3] == os.path.join("Workspace_2_ws-2", "Production", "seg_a.csv")
+    assert not paths[4].startswith(export_utils.SEGMENT_KEYS_INDEX + os.sep)
+    # The same segment always gets the same path
+    assert names.path(segments[1]) == paths[1]
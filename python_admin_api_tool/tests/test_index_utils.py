@@ -0,0 +1,55 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import index_utils
+
+SEGMENT = ("segment", "beta_users", "Default", "Production", None)
+FLAG_ON = ("feature flag", "checkout", "Default", "Production", "on")
+FLAG_OFF = ("feature flag", "checkout", "Default", "Production", "off")
+
+def lookup(index, key):
+    return sorted(index.lookup(key), key=str)
+
+def test_update_merge_lookup():
+    index = index_utils.KeyMembershipIndex()
+    index.update({
+        ("segment", "beta_users"): (1, [(SEGMENT, ["alice", "bob"])]),
+        ("feature flag", "checkout"): ((1, 1), [(FLAG_ON, ["bob", "carol"]), (FLAG_OFF, [])]),
+    })
+    # Still in the delta
+    assert index._delta
+    assert lookup(index, "bob") == sorted([SEGMENT, FLAG_ON], key=str)
+    assert lookup(index, "dave") == []
+
+    index.merge()
+    assert not index._delta
+    assert lookup(index, "bob") == sorted([SEGMENT, FLAG_ON], key=str)
+    assert lookup(index, "carol") == [FLAG_ON]
+
+    # The segment changes and the flag is removed: the delta hides the dead references of the main index
+    index.update({("segment", "beta_users"): (2, [(SEGMENT, ["carol"])])}, removed=[("feature flag", "checkout")])
+    assert index._delta
+    assert lookup(index, "bob") == []
+    assert lookup(index, "carol") == [SEGMENT]
+    assert index.versions() == {("segment", "beta_users"): 2}
+
+    index.merge()
+    assert lookup(index, "alice") == []
+    assert lookup(index, "carol") == [SEGMENT]
+    assert index._refs == [SEGMENT]
+    assert index._sources == {("segment", "beta_users"): (2, [0])}
+
+def test_merge_compacts_references():
+    index = index_utils.KeyMembershipIndex(max_delta_sets=3)
+    flags = {("feature flag", f"flag_{number}"): number for number in range(3)}
+    for version in range(50):
+        index.update({
+            source: (version, [(("feature flag", source[1], "Default", "Production", "on"), [f"key-{number}", "shared"])])
+            for source, number in flags.items()
+        })
+        assert len(index._refs) <= 2 * len(flags)
+    index.merge()
+    assert len(index._refs) == len(flags)
+    assert sorted(ref[1] for ref in index.lookup("shared")) == ["flag_0", "flag_1", "flag_2"]
+    assert [ref[1] for ref in index.lookup("key-1")] == ["flag_1"]
@@ -0,0 +1,78 @@
+import os
+import sys
+import importlib
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mock_admin_api
+
+# 90 segments of 250 keys, far beyond both limits
+MEMORY_LIMIT = 300
+DISK_LIMIT = 1000
+
+@pytest.fixture(scope="module")
+def server():
+    server = mock_admin_api.make_server(mock_admin_api.MockOrg(), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def tool(server, tmp_path, monkeypatch):
+    # The Admin API client is created when data_utils is loaded
+    monkeypatch.setenv("ADMIN_API_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}{mock_admin_api.API_PREFIX}")
+    monkeypatch.setenv("ADMIN_API_KEY", "test")
+    monkeypatch.setenv("CACHE_SEGMENT_KEYS_MEMORY_LIMIT", str(MEMORY_LIMIT))
+    monkeypatch.setenv("CACHE_SEGMENT_KEYS_DISK_LIMIT", str(DISK_LIMIT))
+    monkeypatch.chdir(tmp_path)
+    cache, cache_utils, data_utils, index_utils, menu_utils = (
+        importlib.import_module(name) for name in ["cache", "cache_utils", "data_utils", "index_utils", "menu_utils"]
+    )
+    # Created for the mock even if another test imported data_utils first
+    importlib.reload(data_utils)
+    monkeypatch.setattr(cache_utils, "FLUSH_INTERVAL", 0)
+    cache.cache_data = cache.default_cache_data()
+    cache_utils.store = None
+    cache_utils.load_cache(*menu_utils.cache_loaders)
+    yield cache, cache_utils, data_utils, index_utils
+    cache_utils.store.close()
+    cache_utils.store = None
+
+def stored_keys(cache_utils):
+    with cache_utils.store._lock:
+        return cache_utils.store._conn.execute("SELECT COALESCE(SUM(count), 0) FROM segment_keys").fetchone()[0]
+
+def test_limits_from_environment(tool):
+    _, cache_utils, _, _ = tool
+    assert cache_utils.store.segment_keys_memory_limit == MEMORY_LIMIT
+    assert cache_utils.store.segment_keys_disk_limit == DISK_LIMIT
+
+def test_segment_keys_beyond_limits(tool):
+    cache, cache_utils, data_utils, index_utils = tool
+    segments_definitions = data_utils.get_all_segments_definitions()
+    segments_keys = dict(data_utils.get_segments_keys(segments_definitions))
+    assert len(segments_keys) == len(segments_definitions) == 90
+    assert all(len(keys) == 250 for keys in segments_keys.values())
+
+    # The segments used by the operation are not evicted until it ends
+    cache_utils.save_cache()
+    for segment_key in segments_definitions:
+        assert len(cache.cache_data["segment_keys"][segment_key]) == 250
+    assert {ref[1] for ref in index_utils.update_key_index().lookup("key-3-7")} == {"segment_3"}
+
+    cache_utils.unpin_segment_keys()
+    cache_utils.save_cache()
+    assert stored_keys(cache_utils) <= DISK_LIMIT
+
+def test_key_index_not_refetched_after_eviction(server, tool):
+    cache, cache_utils, data_utils, index_utils = tool
+    index_utils.update_key_index()
+    cache_utils.unpin_segment_keys()
+    cache_utils.save_cache()
+    assert stored_keys(cache_utils) <= DISK_LIMIT
+
+    # The index keeps its own keys, the evicted segments are only fetched again once expired
+    requests = server.requests
+    assert {ref[1] for ref in index_utils.update_key_index().lookup("key-3-7")} == {"segment_3"}
+    assert server.requests == requests
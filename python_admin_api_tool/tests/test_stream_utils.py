@@ -0,0 +1,42 @@
+import io
+import os
+import sys
+import json
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import stream_utils
+
+DATA = {
+    "segment_0": ["key-0", "key-1", "café"],
+    "flag_1": [{"name": "on", "size": 50, "ratio": 1.5e-3, "killed": False, "tags": None}],
+    "empty": {},
+}
+
+@pytest.fixture
+def small_reads(monkeypatch):
+    # Values span several chunks
+    monkeypatch.setattr(stream_utils, "READ_SIZE", 7)
+
+def test_write_json_matches_json_dumps():
+    file = io.StringIO()
+    stream_utils.write_json(DATA, file)
+    assert file.getvalue() == json.dumps(DATA, indent=4)
+
+def test_iter_entries_round_trip(small_reads):
+    for indent in [None, 4]:
+        entries = list(stream_utils.iter_entries(io.StringIO(json.dumps(DATA, indent=indent))))
+        assert entries == list(DATA.items())
+    assert list(stream_utils.iter_entries(io.StringIO("[1, 23, 456]"))) == [(None, 1), (None, 23), (None, 456)]
+
+def test_invalid_json_fails_without_reading_the_rest():
+    document = '{"a": [1, 2,, 3], "b": [' + ", ".join(['"key"'] * 1_000_000) + "]}"
+    file = io.StringIO(document)
+    with pytest.raises(ValueError):
+        list(stream_utils.iter_entries(file))
+    assert file.tell() <= 2 * stream_utils.READ_SIZE
+
+@pytest.mark.parametrize("document", ['{"a": [1, 2', '{"a": "unterminated', '{"a": 1} {"b": 2}', '{"a": tru'])
+def test_truncated_or_trailing_json_fails(small_reads, document):
+    with pytest.raises(ValueError):
+        list(stream_utils.iter_entries(io.StringIO(document)))